@@ -0,0 +1,12 @@
+#!/usr/bin/env bash
+set -euo pipefail
+cd "$(dirname "$0")/.."
+
+# shellcheck disable=SC1091
+source ./env.sh
+
+echo "== ASR autotune =="
+echo "  (compute type x cpu_threads を短いクリップで計測し、ホストプロファイルへ保存)"
+"$PYTHON" tools/autotune_asr.py "$@"
+
+echo "== Done =="
@@ -30,4 +30,13 @@ m = tok.tokenize("こんにちは、ね です よね。", t.Tokenizer.SplitMode
 print("Sudachi OK:", [(w.surface(), w.part_of_speech()) for w in m])
 PY
 
+echo "== ASR host profile =="
+# transcribe と同じ解決（tools/autotune_asr.py の profile_path。CFG_HOST_PROFILE・ホスト名の扱いも同じ）
+HOST_PROFILE="$(PYTHONPATH="$PWD/tools" "$PWD/.venv/bin/python" -c 'from autotune_asr import profile_path; print(profile_path())')"
+if [ -f "$HOST_PROFILE" ]; then
+  echo "  $HOST_PROFILE exists"
+else
+  echo "  未作成 ($HOST_PROFILE): bash bin/autotune.sh で計測すると transcribe が自動で使用します"
+fi
+
 echo "== Done =="
@@ -5,6 +5,8 @@ set -euo pipefail
 usage() {
   cat <<USAGE
 Usage: $0 -i INPUT.wav [-p PROMPT] [-b BASENAME] [--date YYYYMMDD] [--take NN]
+          [--stage all|asr|post] [--audio PREFETCHED.npy]
+  --stage asr  … 手順 1（ASR + アライン）まで / post … 手順 2 以降だけ（Inbox のパイプライン実行用）
 USAGE
 }
 
@@ -14,6 +16,8 @@ PROMPT=""
 BASENAME=""
 DATE_TAG=""
 TAKE_TAG=""
+STAGE="all"
+AUDIO_NPY=""
 
 while [[ $# -gt 0 ]]; do
   case "$1" in
@@ -22,11 +26,14 @@ while [[ $# -gt 0 ]]; do
     -b) BASENAME="${2:-}"; shift 2 ;;
     --date) DATE_TAG="${2:-}"; shift 2 ;;
     --take) TAKE_TAG="${2:-}"; shift 2 ;;
+    --stage) STAGE="${2:-}"; shift 2 ;;
+    --audio) AUDIO_NPY="${2:-}"; shift 2 ;;
     *) usage; exit 1 ;;
   esac
 done
 
 [[ -f "$INPUT" ]] || { echo "INPUT not found: $INPUT" >&2; exit 1; }
+case "$STAGE" in all|asr|post) ;; *) usage; exit 1 ;; esac
 
 # --- パス/環境 ---
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
@@ -47,45 +54,125 @@ if [[ -n "$TAKE_TAG" ]]; then SLUG="${SLUG}_$(printf "%02d" "$TAKE_TAG")"; fi
 RUN_DIR="${WORKSPACE_ROOT}/Runs/${SLUG}"
 mkdir -p "${RUN_DIR}/"{input,asr,srt_ja,chunks_ja,srt_en,final,logs}
 
+T_START="$(date +%s)"  # 各層の time-to-output の起点
+
 # --- ログ tee ---
 LOG="${RUN_DIR}/logs/pipeline.log"
 exec > >(tee -a "$LOG") 2>&1
 
 echo "[pipeline] SLUG=${SLUG}"
 echo "[pipeline] RUN_DIR=${RUN_DIR}"
-cp -f "$INPUT" "${RUN_DIR}/input/"
+[[ "$STAGE" == "all" ]] || echo "[pipeline] STAGE=${STAGE}"
+
+# --- Run カタログ（tools/run_catalog.py。登録に失敗しても処理は続ける）---
+CATALOG=("$PYTHON" "${ROOT_DIR}/tools/run_catalog.py")
+RUN_ID=""
+catalog_begin() {
+  RUN_ID="$("${CATALOG[@]}" begin --slug "$SLUG" --run-dir "$RUN_DIR" --tool full_pipeline \
+    --input "${RUN_DIR}/input/$(basename "$INPUT")" "$@" || true)"
+}
+catalog_stage() { [[ -z "$RUN_ID" ]] || "${CATALOG[@]}" stage "$RUN_ID" "$1" || true; }
+catalog_exit() {
+  local rc=$?
+  [[ -n "$RUN_ID" ]] || return 0
+  if [[ $rc -ne 0 ]]; then
+    "${CATALOG[@]}" finish "$RUN_ID" --status failed --error "exit ${rc}" || true
+  elif [[ "$STAGE" == "asr" ]]; then
+    catalog_stage -   # post 段が同じ行を引き継ぐ
+  else
+    "${CATALOG[@]}" finish "$RUN_ID" --status done || true
+  fi
+}
+trap catalog_exit EXIT
+
+if [[ "$STAGE" != "post" ]]; then
+# 入力はブロブストア（Workspace/Blobs）の実体へのリンクとして置く。再処理時は中間物のリンクを解く
+"$PYTHON" "${ROOT_DIR}/tools/blob_store.py" detach "$RUN_DIR"
+"$PYTHON" "${ROOT_DIR}/tools/blob_store.py" put "$INPUT" "${RUN_DIR}/input/$(basename "$INPUT")" \
+  || cp -f "$INPUT" "${RUN_DIR}/input/"
+catalog_begin
 
 # --- 進捗開始 ---
 progress_start "開始…"
 notify "開始: $(basename "$INPUT")" "${SLUG}" "Whisper Pipeline"
 
+# 0.5) プレビュー層: 小モデル greedy の下書きを final/ へ（本番の結果で後から置き換える。tools/preview_tier.py）
+SHARED_NPY=""
+if [[ "${CFG_PREVIEW:-0}" == "1" ]]; then
+  catalog_stage preview
+  if [[ -z "$AUDIO_NPY" ]]; then  # 両層で同じ 16k 音声を使う（デコードは1回）
+    SHARED_NPY="${RUN_DIR}/asr/.audio16k.npy"
+    "$PYTHON" "${ROOT_DIR}/tools/audio_prefetch.py" "$INPUT" "$SHARED_NPY" && AUDIO_NPY="$SHARED_NPY"
+  fi
+  PREVIEW_OPTS=()
+  [[ -n "$AUDIO_NPY" ]] && PREVIEW_OPTS+=(--audio "$AUDIO_NPY")
+  if "$PYTHON" "${ROOT_DIR}/tools/preview_tier.py" run --input "$INPUT" --run-dir "$RUN_DIR" --slug "$SLUG" \
+       --t0 "$T_START" ${PREVIEW_OPTS[@]+"${PREVIEW_OPTS[@]}"}; then
+    notify "下書き字幕 (${CFG_PREVIEW_MODEL:-base}) を出力しました" "Runs/${SLUG}/final" "Whisper Pipeline"
+  else
+    echo "[pipeline] warn: preview failed（本番はそのまま続行）"
+  fi
+else
+  rm -f "${RUN_DIR}/preview/tiers.json"  # 前回の下書き情報で final/ を退避しないように
+fi
+
 # 1) ASR + アライン（WhisperX, CPU固定）
+catalog_stage asr
 progress_update 5 "ASR 準備中"
+TRANSCRIBE_OPTS=()
+[[ -n "$AUDIO_NPY" ]] && TRANSCRIBE_OPTS+=(--audio "$AUDIO_NPY")  # 先読み済みの 16k 音声
 "$PYTHON" "${ROOT_DIR}/tools/transcribe_from_wav.py" \
   --input "$INPUT" \
   --run-dir "$RUN_DIR" \
-  --slug "$SLUG"
+  --slug "$SLUG" ${TRANSCRIBE_OPTS[@]+"${TRANSCRIBE_OPTS[@]}"}
+[[ -n "$SHARED_NPY" ]] && rm -f "$SHARED_NPY"
 progress_update 40 "アライン完了"
+if [[ "$STAGE" == "asr" ]]; then
+  echo "[pipeline] asr stage done"
+  exit 0
+fi
+fi  # STAGE != post
+if [[ "$STAGE" == "post" ]]; then catalog_begin --attach; fi
+
+catalog_stage segment
 
 # 2) 日本語セグメント生成（高精度版）
 ALIGNED_JSON="${RUN_DIR}/asr/aligned.json"  # transcribe で作る固定名シンボリックリンク
+SEG_OPTS=()
+[[ "${JA_MORPH_INDEX:-0}" == "1" ]] && SEG_OPTS+=(--morph-index)
+[[ -n "${JA_SEG_PROFILE:-}" ]] && SEG_OPTS+=(--profile "$JA_SEG_PROFILE")
 "$PYTHON" "${ROOT_DIR}/tools/segment_ja.py" \
   "$ALIGNED_JSON" \
-  -o "${RUN_DIR}/srt_ja/${SLUG}_ja-JP_seg.srt"
+  -o "${RUN_DIR}/srt_ja/${SLUG}_ja-JP_seg.srt" ${SEG_OPTS[@]+"${SEG_OPTS[@]}"}
 
+catalog_stage repair
 # 2.5) 構造修復（フラグメント救済・短尺補正／用語置換なし）
 "$PYTHON" "${ROOT_DIR}/tools/srt_repair_fragments_ja.py" \
   "${RUN_DIR}/srt_ja/${SLUG}_ja-JP_seg.srt" \
   -o "${RUN_DIR}/srt_ja/${SLUG}_ja-JP_seg.srt"
 progress_update 60 "フラグメント修復"
 
+catalog_stage polish
 # 3) 整形（丸め・オーバーラップ解消・リードイン/アウト・折返し）
-"$PYTHON" "${ROOT_DIR}/tools/srt_lint_polish.py" \
-  "${RUN_DIR}/srt_ja/${SLUG}_ja-JP_seg.srt" \
-  -o "${RUN_DIR}/srt_ja/${SLUG}_ja_clean.srt"
-cp -f "${RUN_DIR}/srt_ja/${SLUG}_ja_clean.srt" "${RUN_DIR}/final/${SLUG}_ja.srt"
+POLISH_OPTS=()
+[[ -f "${RUN_DIR}/asr/energy.npz" ]] && POLISH_OPTS+=(--energy "${RUN_DIR}/asr/energy.npz")
+if [[ "${CFG_SHARD_POST:-0}" == "1" ]]; then
+  # 長いファイルは文末の十分なポーズで分割して並列に（逐次と同じ結果）
+  "$PYTHON" "${ROOT_DIR}/tools/srt_shard_post.py" --chain polish \
+    "${RUN_DIR}/srt_ja/${SLUG}_ja-JP_seg.srt" \
+    -o "${RUN_DIR}/srt_ja/${SLUG}_ja_clean.srt" ${POLISH_OPTS[@]+"${POLISH_OPTS[@]}"}
+else
+  "$PYTHON" "${ROOT_DIR}/tools/srt_lint_polish.py" \
+    "${RUN_DIR}/srt_ja/${SLUG}_ja-JP_seg.srt" \
+    -o "${RUN_DIR}/srt_ja/${SLUG}_ja_clean.srt" ${POLISH_OPTS[@]+"${POLISH_OPTS[@]}"}
+fi
+# プレビューの下書きがあれば原子的に置き換え（編集済みの下書きは退避）
+"$PYTHON" "${ROOT_DIR}/tools/preview_tier.py" install \
+  "${RUN_DIR}/srt_ja/${SLUG}_ja_clean.srt" "${RUN_DIR}/final/${SLUG}_ja.srt" --run-dir "$RUN_DIR"
+cp -f "${RUN_DIR}/final/${SLUG}_ja.srt" "${RUN_DIR}/final/.${SLUG}_ja.srt.base"  # whx fix の差分元
 progress_update 75 "JA 整形"
 
+catalog_stage chunk
 # 4) チャンク分割（翻訳用 JA_*.srt）
 "$PYTHON" "${ROOT_DIR}/tools/srt_chunker.py" \
   --in "${RUN_DIR}/final/${SLUG}_ja.srt" \
@@ -93,13 +180,29 @@ progress_update 75 "JA 整形"
   --chunk-size "${CFG_CHUNK_SIZE}"
 progress_update 85 "翻訳チャンク生成"
 
-# 4.5) 翻訳依頼の通知
-notify "ChatGPT で JA_*.srt → EN_*.srt に翻訳し、同フォルダへ保存してください" "Runs/${SLUG}/chunks_ja" "Whisper Pipeline"
-
+# 4.2) 翻訳メモリで事前充填（完全一致/正規化一致。全行ヒットのチャンクは EN_*.srt まで作成）
+if [[ -n "${CFG_TM_DB:-}" ]]; then
+  "$PYTHON" "${ROOT_DIR}/tools/srt_tm.py" --db "${CFG_TM_DB}" \
+    pretranslate --dir "${RUN_DIR}/chunks_ja" || echo "[pipeline] warn: tm pretranslate failed"
+fi
+
+catalog_stage translate
+# 4.5) 翻訳（自動バックエンドが無効/失敗なら手動翻訳を依頼）
+if [[ "${CFG_TRANSLATE_BACKEND:-none}" != "none" ]] && \
+   "$PYTHON" "${ROOT_DIR}/tools/srt_translate.py" run --dir "${RUN_DIR}/chunks_ja"; then
+  progress_update 90 "自動翻訳"
+else
+  notify "ChatGPT で JA_*.srt → EN_*.srt に翻訳し、同フォルダへ保存してください" "Runs/${SLUG}/chunks_ja" "Whisper Pipeline"
+fi
+
+catalog_stage join
 # 5) EN 結合・チェック（JA 時刻を正とする）
 bash "${ROOT_DIR}/bin/join_check_en.sh" -r "${RUN_DIR}" -s "${SLUG}"
 progress_update 95 "EN 結合"
 
+# 大きな中間物（asr/ の JSON 等）をブロブストアへ
+"$PYTHON" "${ROOT_DIR}/tools/blob_store.py" adopt "$RUN_DIR" || echo "[pipeline] warn: blob adopt failed"
+
 # 完了
 progress_end
 echo "[pipeline] done"
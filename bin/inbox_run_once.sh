@@ -27,6 +27,13 @@ unset IFS
 
 notify "Inbox の WAV を処理開始（${#WAVS[@]} 本）" "" "Whisper Inbox"
 
+# パイプライン実行: 次ファイルの先読み・ASR・前ファイルの後処理を重ねる（tools/inbox_pipeline.py）
+if [[ "${CFG_INBOX_PIPELINE:-0}" == "1" ]] && ((${#WAVS[@]} > 1)); then
+  "$PYTHON" tools/inbox_pipeline.py "${WAVS[@]}"
+  notify "Inbox の処理が完了しました" "" "Whisper Inbox"
+  exit 0
+fi
+
 for wav in "${WAVS[@]}"; do
   echo "[inbox] processing: ${wav}"
   if bash bin/full_pipeline.sh -i "${wav}"; then
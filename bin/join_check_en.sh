@@ -21,10 +21,14 @@ ROOT_DIR="$(cd "$(dirname "$0")/.." && pwd)"
 # shellcheck disable=SC1091
 source "${ROOT_DIR}/env.sh"
 
+TM_OPT=()
+if [[ -n "${CFG_TM_DB:-}" ]]; then TM_OPT=(--tm "${CFG_TM_DB}"); fi
+
 "$PYTHON" "${ROOT_DIR}/tools/srt_join_and_check.py" \
   --ja "${RUN_DIR}/final/${SLUG}_ja.srt" \
   --en-dir "${RUN_DIR}/chunks_ja" \
   --report "${RUN_DIR}/srt_en/${SLUG}_join_report.txt" \
-  --out "${RUN_DIR}/final/${SLUG}_en.srt"
+  --out "${RUN_DIR}/final/${SLUG}_en.srt" \
+  ${TM_OPT[@]+"${TM_OPT[@]}"}
 
 echo "[join_check_en] out=${RUN_DIR}/final/${SLUG}_en.srt"
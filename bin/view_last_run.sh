@@ -8,7 +8,9 @@ source "${ROOT_DIR}/env.sh"
 LINES="${1:-100}"
 FOLLOW="${2:-}"
 
-LAST_RUN="$(ls -td "${WORKSPACE_ROOT}/Runs"/* 2>/dev/null | head -n1 || true)"
+# Run カタログ（tools/run_catalog.py）から引く。未登録（カタログ導入前）ならディレクトリの更新順
+LAST_RUN="$("$PYTHON" "${ROOT_DIR}/tools/run_catalog.py" latest --path 2>/dev/null || true)"
+[[ -n "$LAST_RUN" && -d "$LAST_RUN" ]] || LAST_RUN="$(ls -td "${WORKSPACE_ROOT}/Runs"/* 2>/dev/null | head -n1 || true)"
 [[ -n "$LAST_RUN" ]] || { echo "Runs が空です"; exit 1; }
 
 LOG="${LAST_RUN}/logs/pipeline.log"
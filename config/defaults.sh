@@ -4,8 +4,23 @@
 # --- モデル / 実行 ---
 export CFG_MODEL="large-v2"          # 最高狙いは large-v3 可
 export CFG_DEVICE_ASR="cpu"          # ASR デバイス
-export CFG_CT2_COMPUTE="int8"        # faster-whisper compute type
+export CFG_CT2_COMPUTE="${CFG_CT2_COMPUTE:-}"  # faster-whisper compute type（空=ホストプロファイル、無ければ int8。明示すればプロファイルより優先）
+export CFG_BEAM_SIZE=5               # ビーム幅
+export CFG_BEAM_MODE=fixed           # fixed | adaptive（greedy → 低信頼の窓だけビームで再デコード）
+export CFG_HOST_PROFILE=""           # 空=config/host_profiles/<host>.json を自動使用 / off=無効 / パス指定
 export CFG_DEVICE_ALIGN="cpu"        # **必ず CPU (重要)**
+export CFG_STREAM_MODEL="small"      # ライブ字幕 (tools/stream_ja.py) のモデル
+export CFG_PREVIEW="${CFG_PREVIEW:-0}"  # 1=小モデル greedy の下書きを先に final/ へ出し、本番の結果で置き換える (tools/preview_tier.py)
+export CFG_PREVIEW_MODEL="base"      # プレビュー層のモデル（tiny / base）
+export CFG_ASR_BACKEND="${CFG_ASR_BACKEND:-faster-whisper}"  # faster-whisper | fake（モデル無しのベンチ用。環境変数で上書き可）
+export CFG_FAKE_RTF="${CFG_FAKE_RTF:-0.05}"  # fake バックエンドの処理秒/音声秒
+export CFG_ALIGN="${CFG_ALIGN:-whisperx}"  # whisperx | none（faster-whisper の語タイムスタンプで代用しアラインを省略）| ctc（emission をキャッシュ、tools/ctc_align.py realign で部分再アライン）
+export CFG_RESUME_OVERLAP=2.0        # 中断再開時に最後の確定セグメント終端から戻って再デコードする秒数
+export CFG_ALIGN_WINDOW=300          # アラインのチェックポイント窓 (sec)
+export CFG_LOOP_FIX=1               # 1=反復ループ（幻覚）を検出し該当窓だけ再デコード（asr/loops.json）
+export CFG_ASR_CACHE=0              # 1=テイク間で一致する発話チャンクの ASR 結果を再利用（tools/asr_chunk_cache.py）
+export CFG_VAD_TRIM=1                # 1=長い無音を ASR/アライン前にスキップ（時刻は元に戻す）
+export CFG_VAD_MIN_SILENCE=1.0       # スキップ対象とする無音の最小長 (sec)
 
 # --- 分割/可読性 ---
 export JA_MAX_CHARS=40               # 1行あたり最大文字数の目安
@@ -16,10 +31,37 @@ export JA_PAUSE_STRONG=0.35          # 強ポーズ閾値 (sec)
 export JA_PAUSE_WEAK=0.25            # 弱ポーズ閾値 (sec)
 export JA_HYSTERESIS=0.02            # オーバーラップ解消のヒステリシス (sec)
 export JA_LEAD_MIN=0.20              # リードイン/アウト最小 (sec 推奨)
+export JA_SEG_PROFILE=""              # segment_sweep.py のプロファイル JSON（空=未使用）
+export JA_MORPH_INDEX=0              # 1=Sudachi 形態素境界で禁則判定（asr/aligned.morph.json にキャッシュ）
+export CFG_SHARD_POST="${CFG_SHARD_POST:-0}"  # 1=整形（whx は polish → refine → polish）をファイル内で分割して並列実行（tools/srt_shard_post.py）
+export CFG_SHARD_JOBS=0              # その並列数（0=コア数）
 
 # --- チャンク ---
 export CFG_CHUNK_SIZE=200            # 行/チャンク
 
+# --- ブロブストア / 保持 (tools/blob_store.py) ---
+export CFG_BLOB_MIN_MB=1             # adopt でストアへ移す最小サイズ (MB)
+export CFG_RETAIN_DAYS=0             # gc: これより古い Run の中間物を削除（0=無効、final/・logs/ は残す）
+export CFG_RETAIN_GB=0               # gc: Runs+Blobs の容量上限（超過分を古い順に削除、0=無効）
+
+# --- 翻訳メモリ ---
+export CFG_TM_DB="${WORKSPACE_ROOT:-.}/tm.sqlite"  # 空にすると TM 無効
+export CFG_SEARCH_DB="${WORKSPACE_ROOT:-.}/search.sqlite"  # 全文検索索引 (tools/transcript_search.py)
+export CFG_RUN_DB="${WORKSPACE_ROOT:-.}/runs.sqlite"  # Run カタログ (tools/run_catalog.py)
+
+# --- 自動翻訳 (JA_*.srt -> EN_*.srt) ---
+export CFG_TRANSLATE_BACKEND="none"  # none=手動(通知のみ) / http / echo
+export CFG_TRANSLATE_ENDPOINT="http://127.0.0.1:8765/v1/chat/completions"
+export CFG_TRANSLATE_MODEL=""
+export CFG_TRANSLATE_CONCURRENCY=4   # 同時リクエスト数
+export CFG_TRANSLATE_RPM=60          # 1分あたり上限 (0=無制限)
+export CFG_TRANSLATE_RETRIES=3
+export CFG_TRANSLATE_LOCK="${WORKSPACE_ROOT:-.}/translate.lock"  # 翻訳プロセスを直列化（並列の後処理でも RPM を共有。空で無効）
+# CFG_TRANSLATE_API_KEY は env.sh 側で export（リポジトリに置かない）
+
 # --- バッチ ---
 export CFG_KEEP_ON_FAIL=1            # 失敗時に Inbox に残す (1)
 export CFG_BATCH_SLEEP=0             # 多数投入時のスリープ (秒)
+export CFG_INBOX_PIPELINE=0          # 1=Inbox を先読み・ASR・後処理の重ね合わせで実行（tools/inbox_pipeline.py）
+export CFG_PREFETCH_MB=2048          # 先読みした 16k 音声バッファの合計上限 (MB)
+export CFG_POST_JOBS=0               # 後処理（分割・整形）の並列数（0=コア数/4）
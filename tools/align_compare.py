@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+アライン方式の比較レポート（CFG_ALIGN=whisperx と CFG_ALIGN=none）。
+
+同じ音声を両方式で処理した2つの Run を受け取り、
+- 語境界の時刻差: none 側（faster-whisper の語）の開始/終了と、同じ文字位置の whisperx 側の時刻の差
+- 所要時間: asr/timing.json の ASR・アライン時間と、none にしたときの短縮量
+を表示する。テキストが違う場合は文字列の一致部分だけを比較する。
+
+使い方:
+  CFG_ALIGN=whisperx bin/full_pipeline.sh a.wav   # → Runs/<A>
+  CFG_ALIGN=none     bin/full_pipeline.sh a.wav   # → Runs/<B>
+  python tools/align_compare.py Workspace/Runs/<A> Workspace/Runs/<B> [--json report.json]
+引数は Run ディレクトリ / asr ディレクトリ / aligned.json のいずれでもよい（順不同。aligned.json の align で判別）。
+CFG_ALIGN=ctc（tools/ctc_align.py）の Run と whisperx の Run の比較にも使える（whisperx 側が基準）。
+"""
+import os, json, bisect, argparse
+from difflib import SequenceMatcher
+import numpy as np
+
+def resolve(path):
+    """(aligned.json, timing.json or None)"""
+    if os.path.isfile(path):
+        aj = path
+    elif os.path.exists(os.path.join(path, "asr", "aligned.json")):
+        aj = os.path.join(path, "asr", "aligned.json")
+    else:
+        aj = os.path.join(path, "aligned.json")
+    if not os.path.exists(aj):
+        raise SystemExit(f"[align_compare] aligned.json がありません: {path}")
+    tj = os.path.join(os.path.dirname(aj), "timing.json")
+    return aj, (tj if os.path.exists(tj) else None)
+
+def load_words(path):
+    """[(text, start, end)]（時刻の無い語は捨てる）と align 方式"""
+    with open(path, "r", encoding="utf-8") as f:
+        js = json.load(f)
+    words = []
+    for seg in js.get("segments", []):
+        for w in seg.get("words", []) or []:
+            if isinstance(w.get("start"), (int, float)) and isinstance(w.get("end"), (int, float)) and w.get("word"):
+                words.append((str(w["word"]), float(w["start"]), float(w["end"])))
+    words.sort(key=lambda x: x[1])
+    return words, js.get("align", "whisperx")
+
+def offsets(words):
+    """各語の (開始文字位置, 終了文字位置) と連結テキスト"""
+    st = []; en = []; pos = 0
+    for t, _, _ in words:
+        st.append(pos); pos += len(t); en.append(pos)
+    return "".join(t for t, _, _ in words), st, en
+
+def boundary_deltas(ref, hyp):
+    """hyp の語境界ごとに、ref で同じ文字位置にある境界との時刻差（hyp - ref）"""
+    rt, rst, ren = offsets(ref)
+    ht, hst, hen = offsets(hyp)
+    # hyp の文字位置 → ref の文字位置（一致ブロックのみ）
+    if rt == ht:
+        blocks = [(0, 0, len(rt))]
+    else:
+        blocks = [(b.b, b.a, b.size) for b in SequenceMatcher(None, ht, rt, autojunk=False).get_matching_blocks() if b.size]
+    heads = [hb for hb, _, _ in blocks]
+    def map_pos(p, is_end):
+        # 終了位置は直前の文字が一致ブロック内にあるかで判定
+        k = bisect.bisect_right(heads, p - is_end) - 1
+        if k < 0:
+            return None
+        hb, rb, n = blocks[k]
+        return rb + (p - hb) if p - is_end < hb + n else None
+    ref_start = {o: ref[k][1] for k, o in enumerate(rst)}
+    ref_end = {o: ref[k][2] for k, o in enumerate(ren)}
+    d_st = []; d_en = []
+    for k, (_, s, e) in enumerate(hyp):
+        p = map_pos(hst[k], 0)
+        if p is not None and p in ref_start:
+            d_st.append(s - ref_start[p])
+        p = map_pos(hen[k], 1)
+        if p is not None and p in ref_end:
+            d_en.append(e - ref_end[p])
+    return np.array(d_st), np.array(d_en)
+
+def stats(d):
+    if len(d) == 0:
+        return {"n": 0}
+    a = np.abs(d)
+    return {"n": int(len(d)), "mean": round(float(d.mean()), 3), "abs_p50": round(float(np.percentile(a, 50)), 3),
+            "abs_p90": round(float(np.percentile(a, 90)), 3), "abs_max": round(float(a.max()), 3),
+            "within_100ms": round(float((a <= 0.1).mean()), 3), "within_200ms": round(float((a <= 0.2).mean()), 3)}
+
+def load_timing(path):
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("a")
+    ap.add_argument("b")
+    ap.add_argument("--json", default=None, help="レポート JSON 出力先")
+    args = ap.parse_args()
+
+    runs = []
+    for p in (args.a, args.b):
+        aj, tj = resolve(p)
+        words, mode = load_words(aj)
+        runs.append({"path": aj, "words": words, "align": mode, "timing": load_timing(tj)})
+    runs.sort(key=lambda r: r["align"] != "whisperx")  # ref = whisperx を先に
+    ref, hyp = runs
+    if ref["align"] == hyp["align"]:
+        print(f"[align_compare] 注意: 両方とも align={ref['align']}（1つ目を基準に比較）")
+
+    d_st, d_en = boundary_deltas(ref["words"], hyp["words"])
+    rep = {"ref": {"path": ref["path"], "align": ref["align"], "words": len(ref["words"])},
+           "hyp": {"path": hyp["path"], "align": hyp["align"], "words": len(hyp["words"])},
+           "start_delta": stats(d_st), "end_delta": stats(d_en)}
+
+    tr, th = ref["timing"], hyp["timing"]
+    if tr and th:
+        saved = tr["total_sec"] - th["total_sec"]
+        rep["runtime"] = {
+            "ref_asr_sec": tr["asr_sec"], "ref_align_sec": tr["align_sec"], "ref_total_sec": tr["total_sec"],
+            "hyp_asr_sec": th["asr_sec"], "hyp_align_sec": th["align_sec"], "hyp_total_sec": th["total_sec"],
+            "asr_overhead_sec": round(th["asr_sec"] - tr["asr_sec"], 3),  # word_timestamps の追加コスト
+            "saved_sec": round(saved, 3),
+            "saved_ratio": round(saved / max(1e-6, tr["total_sec"]), 3),
+            "saved_per_audio_hour_sec": round(saved / max(1e-6, tr["audio_sec"]) * 3600, 1),
+        }
+
+    print(f"[align_compare] ref={ref['align']} ({len(ref['words'])} words)  hyp={hyp['align']} ({len(hyp['words'])} words)")
+    for name in ("start_delta", "end_delta"):
+        s = rep[name]
+        if s["n"] == 0:
+            print(f"  {name:11s} 比較できる境界なし"); continue
+        print(f"  {name:11s} n={s['n']} mean={s['mean']:+.3f}s |d| p50={s['abs_p50']:.3f} p90={s['abs_p90']:.3f} "
+              f"max={s['abs_max']:.3f}  <=100ms {s['within_100ms']:.1%}  <=200ms {s['within_200ms']:.1%}")
+    if "runtime" in rep:
+        r = rep["runtime"]
+        print(f"  runtime     ref asr {r['ref_asr_sec']:.1f}s + align {r['ref_align_sec']:.1f}s = {r['ref_total_sec']:.1f}s"
+              f" / hyp asr {r['hyp_asr_sec']:.1f}s + align {r['hyp_align_sec']:.1f}s = {r['hyp_total_sec']:.1f}s")
+        print(f"  saved       {r['saved_sec']:.1f}s ({r['saved_ratio']:.1%}), "
+              f"{r['saved_per_audio_hour_sec']:.0f}s / 音声1時間, word_timestamps overhead {r['asr_overhead_sec']:+.1f}s")
+    else:
+        print("  runtime     timing.json が無いため省略")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+信頼度適応のビーム探索（CFG_BEAM_MODE=adaptive。transcribe_from_wav.py から使う）。
+
+- 1回目は greedy（beam_size=1）で全体をデコード
+- 各セグメントの avg_logprob / compression_ratio / no_speech_prob（バックエンドが "conf" に入れる）で
+  低信頼のものを選び、前後 pad 付きの窓にまとめて、その窓だけ本来の beam_size で再デコードして差し替える
+- 統計: 再デコードした音声の割合と、常時ビームとの比較（窓の再デコードで測ったビームの rtf × 全体 で見積り。
+  短い窓もエンコーダは 30 秒分動くので、ビームの rtf はやや大きめに出る）
+
+確認用（aligned.json / segments の conf から低信頼窓を表示）:
+  python tools/asr_adaptive.py Runs/<slug>/asr/segments.jsonl
+"""
+import sys, json, time
+
+LOGPROB_MIN = -0.8     # これより低い avg_logprob は低信頼
+RATIO_MAX = 2.2        # これより高い compression_ratio は反復気味
+NO_SPEECH_MAX = 0.5    # 文字が出ているのに無音確率が高い
+
+def low_confidence(seg, logprob_min=LOGPROB_MIN, ratio_max=RATIO_MAX, no_speech_max=NO_SPEECH_MAX):
+    c = seg.get("conf")
+    if not c:
+        return False
+    return (c["avg_logprob"] < logprob_min or c["compression_ratio"] > ratio_max
+            or c["no_speech_prob"] > no_speech_max)
+
+def windows(segments, total, pad=0.5, join_gap=1.0):
+    """低信頼セグメントを [(t0, t1)]（秒）の窓にまとめる"""
+    out = []
+    for s in segments:
+        if not low_confidence(s):
+            continue
+        t0, t1 = max(0.0, s["start"] - pad), min(total, s["end"] + pad)
+        if out and t0 - out[-1][1] <= join_gap:
+            out[-1] = (out[-1][0], max(out[-1][1], t1))
+        else:
+            out.append((t0, t1))
+    return out
+
+def refine(backend, audio, segments, beam_size, word_timestamps=False, sr=16000):
+    """低信頼窓だけ beam_size で再デコードして差し替えた segments と統計を返す"""
+    total = len(audio) / sr
+    wins = windows(segments, total)
+    st = {"segments": len(segments), "low_conf": sum(low_confidence(s) for s in segments), "windows": len(wins),
+          "redecoded_sec": 0.0, "audio_sec": round(total, 3), "beam_sec": 0.0}
+    out = []; k = 0
+    t_beam = 0.0
+    for t0, t1 in wins:
+        # 窓に中点が入るセグメントを置き換える
+        while k < len(segments) and (segments[k]["start"] + segments[k]["end"]) / 2 < t0:
+            out.append(segments[k]); k += 1
+        old = []
+        while k < len(segments) and (segments[k]["start"] + segments[k]["end"]) / 2 < t1:
+            old.append(segments[k]); k += 1
+        if not old:
+            continue
+        t0 = min(t0, old[0]["start"]); t1 = max(t1, old[-1]["end"])
+        c = time.time()
+        new = [s for s in backend.transcribe(audio[int(t0 * sr):int(t1 * sr)], beam_size=beam_size,
+                                             word_timestamps=word_timestamps) if s["text"]]
+        t_beam += time.time() - c
+        for s in new:
+            s["start"] += t0; s["end"] += t0
+            for w in s.get("words") or []:
+                w["start"] += t0; w["end"] += t0
+        # 前後の確定セグメントに食い込まない（範囲に収まる）ものだけ差し替える（asr_repeat と同じ）。
+        # 1つも残らなければ元のセグメントのまま
+        lo = out[-1]["end"] if out else 0.0
+        hi = segments[k]["start"] if k < len(segments) else total
+        new = [s for s in new if s["start"] >= lo - 0.05 and s["end"] <= hi + 0.05]
+        out.extend(new or old)
+        st["redecoded_sec"] += t1 - t0
+    out.extend(segments[k:])
+    st["redecoded_sec"] = round(st["redecoded_sec"], 3)
+    st["redecoded_ratio"] = round(st["redecoded_sec"] / max(1e-6, total), 4)
+    st["beam_sec"] = round(t_beam, 3)
+    return out, st
+
+def summarize(st, t_greedy):
+    """常時ビームとの比較を st に追記（ビームの rtf は再デコード窓の実測。窓が無ければ見積れない）"""
+    st["greedy_sec"] = round(t_greedy, 3)
+    spent = t_greedy + st["beam_sec"]
+    if st["redecoded_sec"] > 0 and st["beam_sec"] > 0:
+        beam_rtf = st["beam_sec"] / st["redecoded_sec"]
+        est = beam_rtf * st["audio_sec"]
+        st["beam_rtf"] = round(beam_rtf, 4)
+        st["always_beam_est_sec"] = round(est, 3)
+        st["speedup_vs_beam"] = round(est / max(1e-6, spent), 2)
+    else:
+        st["beam_rtf"] = st["always_beam_est_sec"] = st["speedup_vs_beam"] = None
+    return st
+
+def main():
+    path = sys.argv[1]
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            segs = [js["seg"] for js in map(json.loads, f) if js.get("type") == "seg"]
+        else:
+            segs = json.load(f).get("segments", [])
+    total = max((s["end"] for s in segs), default=0.0)
+    wins = windows(segs, total)
+    n = sum(low_confidence(s) for s in segs)
+    print(f"[adaptive] segments={len(segs)} low_conf={n} windows={len(wins)} "
+          f"sec={sum(b - a for a, b in wins):.1f}/{total:.1f}")
+    for a, b in wins:
+        print(f"  {a:9.2f}-{b:9.2f}")
+
+if __name__ == "__main__":
+    main()
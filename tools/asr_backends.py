@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ASR / アラインのバックエンド（CFG_ASR_BACKEND で選択。transcribe_from_wav.py が使う）。
+
+  AsrBackend.transcribe(audio, **opts) -> segments   … 音声先頭からの秒（start/end/text、word_timestamps 時は words）
+  AsrBackend.align(segments, audio)    -> segments   … words（word/start/end/score）付き
+  AsrBackend.emissions(audio)          -> [T, V]     … アラインモデル（wav2vec2）のフレームごとの log 確率（CFG_ALIGN=ctc）
+  AsrBackend.vocab()                   -> (辞書, blank id)
+
+- faster-whisper … 本番。faster_whisper はバックエンド生成時、whisperx は最初の align で import
+- fake           … 決定的な偽物。VAD の発話区間に合わせて日本語の文をそれらしい長さで並べ、
+                   1文字1語のタイムスタンプと信頼度（conf）を付ける。CFG_FAKE_RTF（large・greedy の処理秒/音声秒。
+                   ビーム幅・モデルの大きさに応じて増減）だけ sleep して速度を再現。
+                   数 GB のモデル無しで Inbox・スケジューラ・後処理のスループットを測る用
+
+使い方（ベンチ。合成音声 → ASR(fake) → 分割 → 修復 → 整形 → チャンク分割）:
+  python tools/asr_backends.py synth OUT.wav [--minutes 10] [--seed 0]
+  python tools/asr_backends.py bench [--files 4] [--minutes 10] [--rtf 0.05] [--keep DIR]
+"""
+import os, sys, time, zlib, shutil, argparse, tempfile, subprocess
+from typing import Iterable, Protocol
+import numpy as np
+from audio_vad import speech_regions
+
+SR = 16000
+
+class AsrBackend(Protocol):
+    name: str
+    def transcribe(self, audio, **opts) -> Iterable[dict]: ...
+    def align(self, segments, audio) -> list: ...
+    def emissions(self, audio): ...
+    def vocab(self) -> tuple: ...
+
+# ---------------- faster-whisper + whisperx ----------------
+
+def seg_dict(seg, base, words):
+    """faster-whisper のセグメント → dict（words=True なら語タイムスタンプ付き）"""
+    d = {"start": base + float(seg.start), "end": base + float(seg.end), "text": seg.text.strip(),
+         "conf": {"avg_logprob": round(float(seg.avg_logprob), 4), "compression_ratio": round(float(seg.compression_ratio), 4),
+                  "no_speech_prob": round(float(seg.no_speech_prob), 4)}}
+    if words:
+        d["words"] = [{"word": w.word.strip(), "start": base + float(w.start), "end": base + float(w.end),
+                       "score": float(w.probability)} for w in (seg.words or []) if w.word.strip()]
+    return d
+
+class FasterWhisperBackend:
+    name = "faster-whisper"
+
+    def __init__(self, model="large-v2", device="cpu", compute_type="int8", cpu_threads=0, num_workers=1,
+                 align_device="cpu"):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model, device=device, compute_type=compute_type,
+                                  cpu_threads=cpu_threads, num_workers=num_workers)
+        self.align_device = align_device
+        self._align = None
+
+    def transcribe(self, audio, word_timestamps=False, **opts):
+        segs, _ = self.model.transcribe(audio, language="ja", task="transcribe",
+                                        word_timestamps=word_timestamps, **opts)
+        for seg in segs:  # ジェネレータのまま（逐次 journal に書けるように）
+            yield seg_dict(seg, 0.0, word_timestamps)
+
+    def _align_model(self):
+        import whisperx
+        if self._align is None:
+            print("[transcribe] load align model (ja, cpu)")
+            self._align = whisperx.load_align_model(language_code="ja", device=self.align_device)
+        return self._align
+
+    def align(self, segments, audio):
+        import whisperx
+        model, metadata = self._align_model()
+        res = whisperx.align(segments, model, metadata, audio, device=self.align_device, return_char_alignments=False)
+        return res.get("segments", [])
+
+    def vocab(self):
+        _, metadata = self._align_model()
+        d = {c.lower(): i for c, i in metadata["dictionary"].items()}
+        blank = next((i for c, i in d.items() if c in ("[pad]", "<pad>")), 0)  # whisperx と同じ決め方
+        return d, blank
+
+    def emissions(self, audio):
+        import torch
+        model, metadata = self._align_model()
+        x = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32)).unsqueeze(0)
+        if x.shape[-1] < 400:  # wav2vec2 の最小入力長
+            x = torch.nn.functional.pad(x, (0, 400 - x.shape[-1]))
+        with torch.inference_mode():
+            x = x.to(self.align_device)
+            e = model(x)[0] if metadata["type"] == "torchaudio" else model(x).logits
+            e = torch.log_softmax(e, dim=-1)
+        return e[0].float().cpu().numpy()
+
+# ---------------- fake ----------------
+
+# 文は「話題 + 数 + 述部」の組み合わせで作る（同じ文の繰り返しが asr_repeat のループ判定に掛からない程度にばらす）。
+# 話題は (テンプレート, {n} の上限)。月は 1〜12 など、実際にありうる範囲だけ出す
+TOPICS = [("第{n}期の納付", 4), ("申告書の{n}ページ", 12), ("{n}月分の予算", 12), ("窓口の受付時間", 0),
+          ("電子申請の手順", 0), ("前回の会議の議事録", 0), ("来年度の計画", 0), ("提出書類の一覧", 0),
+          ("{n}件目のご質問", 10), ("担当部署の連絡先", 0), ("資料の{n}番", 20), ("今回の変更点", 0)]
+PREDICATES = ["についてご説明いたします。", "をご確認ください。", "は来週までに見直します。", "が少し変わりました。",
+              "を後ほど共有します。", "について補足があります。", "はお手元の資料のとおりです。", "に誤りがありました。",
+              "を先にお話しします。", "は担当から報告します。", "の扱いが決まりました。", "について意見をいただきました。",
+              "はまだ検討中です。", "を一緒に見ていきましょう。", "は前回と同じです。", "で問題ないと思います。",
+              "に一点だけ追加があります。", "は今月中に確定させます。", "をもう一度整理します。", "の締め切りが近づいています。"]
+FILLERS = ["はい。", "そうですね。", "えーと、", "それでは、", "なるほど。", "ありがとうございます。"]
+CPS = 7.5         # 話速（文字/秒）
+BEAM_COST = 0.25  # fake: ビーム幅 1 増えるごとの処理時間の増分（greedy 比）
+MODEL_COST = {"tiny": 0.06, "base": 0.1, "small": 0.25, "medium": 0.55}  # fake: large 比の処理時間（既定 1.0）
+LOW_CONF = {1: 0.08}  # fake: 低信頼セグメントの割合（ビーム幅別。既定 0.02）
+
+class FakeBackend:
+    """音声から決定的に文と時刻を作る。同じ音声なら同じ結果"""
+    name = "fake"
+
+    def __init__(self, rtf=0.0, model="large-v2", **_):
+        self.rtf = rtf * MODEL_COST.get(model.split(".")[0], 1.0)
+
+    def _rng(self, audio):
+        head = np.ascontiguousarray(audio[:SR]).tobytes()
+        return np.random.default_rng(zlib.crc32(head) ^ len(audio))
+
+    def transcribe(self, audio, word_timestamps=False, beam_size=5, **opts):
+        rng = self._rng(audio)
+        p_low = LOW_CONF.get(beam_size, 0.02)
+        out = []; recent = []
+        for a, b in speech_regions(audio, min_silence=0.5):
+            t, end = float(a / SR), float(b / SR)
+            while end - t > 0.3:
+                text, cuts = self._sentence(rng, recent)
+                dur = min(end - t, len(text) / CPS * float(rng.uniform(0.85, 1.15)))
+                # 区間に収まらない分は文節の切れ目で落とす（1文節も入らなければ最初の文節だけ）
+                n = max([c for c in cuts if c <= int(round(dur * CPS))] or cuts[:1])
+                d = {"start": round(t, 3), "end": round(t + dur, 3), "text": text[:n]}
+                low = rng.random() < p_low
+                d["conf"] = {"avg_logprob": round(float(rng.uniform(-1.4, -0.9) if low else rng.uniform(-0.5, -0.1)), 4),
+                             "compression_ratio": round(float(rng.uniform(1.2, 1.9)), 4),
+                             "no_speech_prob": round(float(rng.uniform(0.0, 0.1)), 4)}
+                if word_timestamps:
+                    d["words"] = self._chars(d, rng)
+                out.append(d)
+                t += dur + float(rng.uniform(0.05, 0.3))
+        time.sleep(self.rtf * (1 + BEAM_COST * (beam_size - 1)) * len(audio) / SR)
+        return out
+
+    def _sentence(self, rng, recent):
+        """recent（直近の話題・述部）を避けて1文作る。戻り値は (文, 文節の切れ目の文字位置)"""
+        if rng.random() < 0.15:
+            f = FILLERS[int(rng.integers(len(FILLERS)))]
+            return f, [len(f)]
+        t, p = recent[-1] if recent else (-1, -1)
+        while (t, p) == (-1, -1) or any(t == a or p == b for a, b in recent):
+            t, p = int(rng.integers(len(TOPICS))), int(rng.integers(len(PREDICATES)))
+        recent.append((t, p)); del recent[:-4]
+        tmpl, hi = TOPICS[t]
+        topic = tmpl.format(n=int(rng.integers(1, hi + 1))) if hi else tmpl
+        text = topic + PREDICATES[p]
+        # 切れ目: 話題の「の」の後・話題の後・読点の後・文末
+        cuts = {k + 1 for k, c in enumerate(topic) if c == "の"} | {len(topic), len(text)}
+        cuts |= {k + 1 for k, c in enumerate(text) if c == "、"}
+        return text, sorted(cuts)
+
+    def _chars(self, seg, rng):
+        chars = list(seg["text"])
+        w = rng.uniform(0.6, 1.4, len(chars))
+        edges = seg["start"] + np.concatenate(([0.0], np.cumsum(w) / w.sum())) * (seg["end"] - seg["start"])
+        return [{"word": c, "start": round(float(edges[k]), 3), "end": round(float(edges[k+1]), 3),
+                 "score": round(float(rng.uniform(0.6, 0.99)), 3)} for k, c in enumerate(chars)]
+
+    def vocab(self):
+        chars = sorted(set("".join([t for t, _ in TOPICS] + PREDICATES + FILLERS).replace("{n}", "") + "0123456789"))
+        d = {c: i + 1 for i, c in enumerate(chars)}
+        d["<pad>"] = 0
+        return d, 0
+
+    def emissions(self, audio):
+        """20ms ごとの log 確率。blank が優勢で、ところどころ文字のピーク（アラインの経路は付く）"""
+        time.sleep(self.rtf * 0.25 * len(audio) / SR)
+        V = len(self.vocab()[0])
+        rng = self._rng(audio)
+        x = rng.normal(0.0, 1.0, (max(1, len(audio) // 320), V)).astype(np.float32)
+        x[:, 0] += 3.0
+        x -= x.max(axis=1, keepdims=True)
+        return x - np.log(np.exp(x).sum(axis=1, keepdims=True))
+
+    def align(self, segments, audio):
+        time.sleep(self.rtf * 0.3 * sum(s["end"] - s["start"] for s in segments))
+        out = []
+        for s in segments:
+            d = dict(s)
+            d["words"] = self._chars(s, np.random.default_rng(zlib.crc32(s["text"].encode("utf-8")) ^ int(s["start"] * 1000)))
+            out.append(d)
+        return out
+
+BACKENDS = {"faster-whisper": FasterWhisperBackend, "fake": FakeBackend}
+
+def load_backend(name, **cfg):
+    if name not in BACKENDS:
+        raise SystemExit(f"[transcribe] CFG_ASR_BACKEND={name} は未対応（{'|'.join(BACKENDS)}）")
+    if name == "fake":
+        cfg = {"rtf": float(os.environ.get("CFG_FAKE_RTF", "0.05")), "model": cfg.get("model", "large-v2")}
+    return BACKENDS[name](**cfg)
+
+# ---------------- 合成音声・ベンチ ----------------
+
+def synth(minutes, seed=0):
+    """発話風（倍音＋音節の包絡）と無音が交互に続く 16k 音声"""
+    rng = np.random.default_rng(seed)
+    parts = []; total = 0
+    while total < minutes * 60 * SR:
+        dur = float(rng.uniform(1.5, 8.0)); n = int(dur * SR)
+        t = np.arange(n) / SR
+        f0 = rng.uniform(100, 240) + 25 * np.sin(2 * np.pi * rng.uniform(0.3, 2) * t)
+        ph = 2 * np.pi * np.cumsum(f0) / SR
+        x = sum(np.sin(k * ph) * rng.uniform(0.1, 1) / k for k in range(1, 10))
+        env = np.abs(np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+        gap = np.zeros(int(rng.uniform(0.3, 2.5) * SR), dtype=np.float32)
+        parts += [(0.25 * x * env).astype(np.float32), gap]
+        total += n + len(gap)
+    return (np.concatenate(parts) + 0.001 * rng.standard_normal(total)).astype(np.float32)
+
+def bench(args):
+    import soundfile as sf
+    tools = os.path.dirname(os.path.abspath(__file__))
+    work = args.keep or tempfile.mkdtemp(prefix="asr_bench_")
+    env = dict(os.environ, CFG_ASR_BACKEND="fake", CFG_FAKE_RTF=str(args.rtf), WORKSPACE_ROOT=work,
+               CFG_ASR_CACHE="0", CFG_TM_DB="")
+    py = sys.executable
+    stages = {"asr": 0.0, "segment": 0.0, "repair": 0.0, "polish": 0.0, "chunk": 0.0}
+    audio_sec = 0.0
+    t_all = time.perf_counter()
+    for i in range(args.files):
+        slug = f"bench_{i:02d}"
+        run = os.path.join(work, "Runs", slug)
+        for d in ("input", "asr", "srt_ja", "chunks_ja", "final", "logs"):
+            os.makedirs(os.path.join(run, d), exist_ok=True)
+        wav = os.path.join(run, "input", f"{slug}.wav")
+        a = synth(args.minutes, seed=i)
+        sf.write(wav, a, SR); audio_sec += len(a) / SR
+        seg = os.path.join(run, "srt_ja", f"{slug}_seg.srt")
+        clean = os.path.join(run, "final", f"{slug}_ja.srt")
+        steps = [
+            ("asr", [py, f"{tools}/transcribe_from_wav.py", "--input", wav, "--run-dir", run, "--slug", slug]),
+            ("segment", [py, f"{tools}/segment_ja.py", f"{run}/asr/aligned.json", "-o", seg]),
+            ("repair", [py, f"{tools}/srt_repair_fragments_ja.py", seg, "-o", seg]),
+            ("polish", [py, f"{tools}/srt_lint_polish.py", seg, "-o", clean, "--energy", f"{run}/asr/energy.npz"]),
+            ("chunk", [py, f"{tools}/srt_chunker.py", "--in", clean, "--dir", f"{run}/chunks_ja",
+                       "--chunk-size", os.environ.get("CFG_CHUNK_SIZE", "80")]),
+        ]
+        for name, cmd in steps:
+            t0 = time.perf_counter()
+            r = subprocess.run(cmd, env=env, capture_output=True, text=True)
+            stages[name] += time.perf_counter() - t0
+            if r.returncode != 0:
+                raise SystemExit(f"[bench] {slug} {name} failed:\n{r.stdout[-2000:]}{r.stderr[-2000:]}")
+    wall = time.perf_counter() - t_all
+    print(f"[bench] files={args.files} audio={audio_sec/60:.1f}min wall={wall:.1f}s "
+          f"x{audio_sec / max(1e-9, wall):.1f} realtime (fake rtf={args.rtf})")
+    for k, v in stages.items():
+        print(f"[bench]   {k:8s} {v:7.2f}s  {v / max(1e-9, wall):5.1%}  x{audio_sec / max(1e-9, v):.0f} realtime")
+    if not args.keep:
+        shutil.rmtree(work, ignore_errors=True)
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("synth"); s.add_argument("out"); s.add_argument("--minutes", type=float, default=10)
+    s.add_argument("--seed", type=int, default=0)
+    b = sub.add_parser("bench")
+    b.add_argument("--files", type=int, default=4)
+    b.add_argument("--minutes", type=float, default=10)
+    b.add_argument("--rtf", type=float, default=0.05, help="fake ASR の処理秒/音声秒")
+    b.add_argument("--keep", default=None, help="作業ディレクトリを残す場所（既定: 一時ディレクトリを削除）")
+    args = ap.parse_args()
+    if args.cmd == "synth":
+        import soundfile as sf
+        sf.write(args.out, synth(args.minutes, args.seed), SR)
+        print(f"[synth] {args.out}")
+    else:
+        bench(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+テイク間で ASR 結果を使い回すチャンク単位の音声指紋キャッシュ（SQLite）。
+
+- チャンク: ASR 音声を VAD の無音（0.5 秒以上）で区切った発話。CHUNK_SEC 未満の発話は次とまとめる。
+  テイク間でポーズ長が違っても対応が崩れないよう細かく取る。デコード範囲は無音の中点まで、
+  指紋と時刻の基準は発話の先頭〜末尾。連続して外れたチャンクはまとめて1回でデコードする
+- 指紋: 64ms 窓 / 32ms ホップの帯域エネルギー（300–3000Hz を 17 帯域）の
+  周波数方向・時間方向の差分の符号 → 1フレーム 16bit（Haitsma–Kalker 方式。音量差・軽い雑音に強い）
+- 照合: 発話長の差が DUR_TOL 以内の候補と ±MAX_SHIFT フレームずらしてビット誤り率（BER）を比べ、
+  BER_MAX 以下で最良のものを採用。セグメントは発話先頭からの相対時刻で保存し、新しいテイクの位置へずらす
+- 登録: まとめてデコードした結果を中点でチャンクへ振り分けて登録する。セグメント（語）が境界をまたいだら
+  またがれたチャンクを連結した単位で登録し（最大 MAX_GROUP。超えたら登録しない）、切り詰めた写しは作らない。
+  照合は 1 チャンク → 連結 2 チャンク … の順
+- キーはモデル・compute・beam・語タイムスタンプ有無（設定が違えば使い回さない）
+
+transcribe_from_wav.py から CFG_ASR_CACHE=1 で使う。確認用:
+  python tools/asr_chunk_cache.py stats
+  python tools/asr_chunk_cache.py match A.wav B.wav     # 2つの音声のチャンク対応と BER
+  python tools/asr_chunk_cache.py check A.wav [BACKEND] # ヒット時の出力が元のデコードと同じか（既定 fake）
+"""
+import os, sys, json, time, sqlite3
+from pathlib import Path
+import numpy as np
+from audio_vad import speech_regions
+
+SR = 16000
+CHUNK_SEC = 2.0      # チャンクの最短長（これに満たない発話は次の発話とまとめる）
+FP_FRAME = 1024      # 64ms
+FP_HOP = 512         # 32ms
+FP_BANDS = 17
+BER_MAX = 0.25       # 一致とみなすビット誤り率の上限
+DUR_TOL = 0.04       # 発話長の許容差（比率。最低 0.3 秒）
+MAX_SHIFT = 8        # 照合時のずらし幅（フレーム、約 ±0.26 秒）
+MAX_GROUP = 12       # 境界をまたぐセグメントでまとめて登録するチャンク数の上限（30 秒窓ぶん程度）
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks(
+  id      INTEGER PRIMARY KEY,
+  key     TEXT NOT NULL,
+  dur     REAL NOT NULL,
+  fp      BLOB NOT NULL,
+  segs    TEXT NOT NULL,
+  hits    INTEGER NOT NULL DEFAULT 0,
+  created REAL
+);
+CREATE INDEX IF NOT EXISTS chunks_key_dur ON chunks(key, dur);
+"""
+
+def default_db():
+    db = os.environ.get("CFG_ASR_CACHE_DB")
+    if db:
+        return db
+    root = os.environ.get("WORKSPACE_ROOT", str(Path(__file__).resolve().parents[1] / "Workspace"))
+    return os.path.join(root, "asr_cache.sqlite")
+
+# ---------------- 指紋 ----------------
+
+_EDGES = None
+
+def _band_edges():
+    global _EDGES
+    if _EDGES is None:
+        freqs = np.fft.rfftfreq(FP_FRAME, 1.0 / SR)
+        hz = np.geomspace(300.0, 3000.0, FP_BANDS + 1)
+        _EDGES = np.searchsorted(freqs, hz)
+    return _EDGES
+
+def fingerprint(audio):
+    """16bit/フレームの指紋（uint16 配列）"""
+    if len(audio) < FP_FRAME * 2:
+        return np.zeros(0, dtype=np.uint16)
+    x = np.lib.stride_tricks.sliding_window_view(audio.astype(np.float32), FP_FRAME)[::FP_HOP]
+    spec = np.abs(np.fft.rfft(x * np.hanning(FP_FRAME).astype(np.float32), axis=1)) ** 2
+    e = np.add.reduceat(spec, _band_edges()[:-1], axis=1)[:, :FP_BANDS]
+    d = e[:, :-1] - e[:, 1:]             # 周波数方向の差
+    bits = (d[1:] - d[:-1]) > 0          # 時間方向の差の符号
+    w = (1 << np.arange(FP_BANDS - 1, dtype=np.uint32))
+    return (bits.astype(np.uint32) * w).sum(axis=1).astype(np.uint16)
+
+_POP = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+
+def ber(a, b, max_shift=MAX_SHIFT):
+    """ずらし込みの最小ビット誤り率（重なりが短い方の 90% 未満なら 1.0）"""
+    n = min(len(a), len(b))
+    if n == 0:
+        return 1.0
+    best = 1.0
+    for s in range(-max_shift, max_shift + 1):
+        x = a[max(0, s):]; y = b[max(0, -s):]
+        m = min(len(x), len(y))
+        if m < 0.9 * n:
+            continue
+        best = min(best, float(_POP[x[:m] ^ y[:m]].sum()) / (m * 16))
+    return best
+
+# ---------------- チャンク ----------------
+
+def chunks(audio, target=CHUNK_SEC, min_silence=0.5):
+    """
+    [(a, b, s0, s1)]（サンプル）: a..b がデコード範囲（全体を隙間なく覆う）、s0..s1 が発話の範囲
+    """
+    n = len(audio)
+    regions = speech_regions(audio, min_silence=min_silence, pad=0.1)
+    if not regions:
+        return [(0, n, 0, n)] if n else []
+    out = []
+    cur = [regions[0][0], regions[0][1]]  # 発話範囲
+    a = 0
+    for (s, e) in regions[1:]:
+        if (cur[1] - cur[0]) / SR >= target:
+            cut = (cur[1] + s) // 2   # 無音の中点
+            out.append((a, cut, cur[0], cur[1]))
+            a = cut; cur = [s, e]
+        else:
+            cur[1] = e
+    out.append((a, n, cur[0], cur[1]))
+    return out
+
+# ---------------- キャッシュ ----------------
+
+class ChunkCache:
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.con = sqlite3.connect(path)
+        self.con.executescript(SCHEMA)
+
+    def has(self, key, dur):
+        """長さの合う候補があるか（指紋を作る前の足切り）"""
+        tol = max(0.3, DUR_TOL * dur)
+        return self.con.execute("SELECT 1 FROM chunks WHERE key=? AND dur BETWEEN ? AND ? LIMIT 1",
+                                (key, dur - tol, dur + tol)).fetchone() is not None
+
+    def lookup(self, key, fp, dur):
+        """(segs, ber) or (None, best_ber)"""
+        tol = max(0.3, DUR_TOL * dur)
+        best = (None, 1.0, None)
+        for cid, blob, segs in self.con.execute(
+                "SELECT id, fp, segs FROM chunks WHERE key=? AND dur BETWEEN ? AND ?", (key, dur - tol, dur + tol)):
+            b = ber(fp, np.frombuffer(blob, dtype=np.uint16))
+            if b < best[1]:
+                best = (segs, b, cid)
+        if best[0] is None or best[1] > BER_MAX:
+            return None, best[1]
+        with self.con:
+            self.con.execute("UPDATE chunks SET hits=hits+1 WHERE id=?", (best[2],))
+        return json.loads(best[0]), best[1]
+
+    def put(self, key, fp, dur, segs):
+        with self.con:
+            self.con.execute("INSERT INTO chunks(key, dur, fp, segs, created) VALUES(?,?,?,?,?)",
+                             (key, dur, fp.tobytes(), json.dumps(segs, ensure_ascii=False), time.time()))
+
+def shift(segs, dt):
+    out = []
+    for sg in segs:
+        d = dict(sg, start=round(sg["start"] + dt, 3), end=round(sg["end"] + dt, 3))
+        if sg.get("words"):
+            d["words"] = [dict(w, start=round(w["start"] + dt, 3), end=round(w["end"] + dt, 3)) for w in sg["words"]]
+        out.append(d)
+    return out
+
+def _clip(sg, a, b):
+    """セグメント（と語）を [a, b] 秒に収める"""
+    if sg["start"] >= a and sg["end"] <= b:
+        return sg
+    d = dict(sg, start=max(sg["start"], a), end=min(sg["end"], b))
+    if sg.get("words"):
+        d["words"] = [dict(w, start=max(w["start"], a), end=min(w["end"], b))
+                      for w in sg["words"] if w["end"] > a and w["start"] < b]
+    return d
+
+def _split(segs, bounds, eps=0.01):
+    """
+    ASR 時間軸の segments をチャンク範囲 [(a, b)]（秒）へ中点で振り分ける。
+    戻り値は (振り分け, joins)。joins は境界をまたぐセグメント（語を含む）があった継ぎ目 k（チャンク k と k+1）の集合
+    """
+    out = [[] for _ in bounds]
+    joins = set()
+    k = 0
+    for sg in segs:
+        mid = (sg["start"] + sg["end"]) / 2
+        while k + 1 < len(bounds) and mid >= bounds[k][1]:
+            k += 1
+        out[k].append(sg)
+        lo = min([sg["start"]] + [w["start"] for w in sg.get("words") or []])
+        hi = max([sg["end"]] + [w["end"] for w in sg.get("words") or []])
+        hit = [j for j, (a, b) in enumerate(bounds) if a < hi - eps and b > lo + eps] or [k]
+        joins.update(range(min(hit), max(hit)))
+    return out, joins
+
+def transcribe_chunks(audio, decode, cache, key, emit, resume_t=0.0, on_hit=None):
+    """
+    チャンクごとにキャッシュを引き、外れたチャンクだけ decode(部分音声) → 部分音声先頭からの segments。
+    連続する外れチャンクはまとめて1回でデコードし（文脈と 30 秒窓を無駄にしない）、チャンクへ振り分けて登録。
+    境界をまたぐセグメントがあれば、またがれたチャンクを1つの単位（最大 MAX_GROUP チャンク）として登録する
+    （切り詰めた写しは登録しない）。照合は1チャンク → 2チャンク … の順に試す。
+    emit(segs) に ASR 時間軸の segments を順に渡す。resume_t より前に始まるチャンクは済みとして飛ばす。
+    on_hit(a, b, segs) はヒットした単位ごとに呼ぶ（check 用）。
+    戻り値は統計 dict（reuse_ratio = 再利用した音声秒 / 処理した音声秒）
+    """
+    st = {"chunks": 0, "reused": 0, "decoded": 0, "skipped": 0, "uncached": 0, "reused_sec": 0.0, "decoded_sec": 0.0}
+    pending = []  # 外れチャンク [(a, b, s0, s1, fp)]
+
+    def flush():
+        if not pending:
+            return
+        a0, b0 = pending[0][0], pending[-1][1]
+        segs = shift(decode(audio[a0:b0]), a0 / SR)
+        parts, joins = _split(segs, [(a / SR, b / SR) for a, b, *_ in pending])
+        i = 0
+        while i < len(pending):
+            j = i
+            while j in joins:
+                j += 1
+            s0, s1 = pending[i][2], pending[j][3]
+            fp = pending[i][4] if i == j else fingerprint(audio[s0:s1])
+            if j - i >= MAX_GROUP:
+                st["uncached"] += j - i + 1
+            elif len(fp):
+                cache.put(key, fp, (s1 - s0) / SR, shift([sg for q in parts[i:j + 1] for sg in q], -s0 / SR))
+            i = j + 1
+        st["decoded"] += len(pending); st["decoded_sec"] += (b0 - a0) / SR
+        emit(segs)
+        pending.clear()
+
+    cl = chunks(audio)
+    i = 0
+    while i < len(cl):
+        a, b, s0, s1 = cl[i]
+        if resume_t > 0 and a / SR < resume_t:
+            st["chunks"] += 1; st["skipped"] += 1; i += 1
+            continue
+        fp = fingerprint(audio[s0:s1])
+        rel = None
+        for g in range(1, min(MAX_GROUP, len(cl) - i) + 1):
+            e1 = cl[i + g - 1][3]
+            if g > 1 and not cache.has(key, (e1 - s0) / SR):
+                continue
+            gfp = fp if g == 1 else fingerprint(audio[s0:e1])
+            rel, _ = cache.lookup(key, gfp, (e1 - s0) / SR) if len(gfp) else (None, 1.0)
+            if rel is not None:
+                break
+        if rel is None:
+            pending.append((a, b, s0, s1, fp))
+            st["chunks"] += 1; i += 1
+            continue
+        flush()
+        b = cl[i + g - 1][1]
+        # 登録時は単位内に収まっていたもの。ポーズ長が違うテイクで範囲外に出た分だけ収める
+        segs = [_clip(sg, a / SR, b / SR) for sg in shift(rel, s0 / SR)]
+        if on_hit:
+            on_hit(a, b, segs)
+        emit(segs)
+        st["chunks"] += g; st["reused"] += g; st["reused_sec"] += (b - a) / SR; i += g
+    flush()
+    total = st["reused_sec"] + st["decoded_sec"]
+    st["reused_sec"] = round(float(st["reused_sec"]), 3); st["decoded_sec"] = round(float(st["decoded_sec"]), 3)
+    st["reuse_ratio"] = round(float(st["reused_sec"] / total), 4) if total else 0.0
+    return st
+
+def _same(x, y, tol=0.0015):
+    """セグメント列が同じか（時刻は shift の丸め分だけ許す）"""
+    if len(x) != len(y):
+        return False
+    for p, q in zip(x, y):
+        if p["text"] != q["text"] or abs(p["start"] - q["start"]) > tol or abs(p["end"] - q["end"]) > tol:
+            return False
+        pw, qw = p.get("words") or [], q.get("words") or []
+        if len(pw) != len(qw) or any(u["word"] != v["word"] or abs(u["start"] - v["start"]) > tol
+                                     or abs(u["end"] - v["end"]) > tol for u, v in zip(pw, qw)):
+            return False
+    return True
+
+def check(path, backend_name):
+    """同じ音声を空のキャッシュで2回処理し、2回目にヒットしたチャンクの出力が1回目のデコードと同じか確かめる"""
+    import tempfile
+    from asr_backends import load_backend
+    audio = _read(path)
+    backend = load_backend(backend_name)
+    decode = lambda part: list(backend.transcribe(part, beam_size=5, word_timestamps=True))
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ChunkCache(os.path.join(tmp, "check.sqlite"))
+        orig = []
+        st1 = transcribe_chunks(audio, decode, cache, "check", orig.extend)
+        bad = []
+
+        def on_hit(a, b, segs):
+            want = [sg for sg in orig if a / SR <= (sg["start"] + sg["end"]) / 2 < b / SR]
+            if not _same(segs, want):
+                bad.append((a / SR, b / SR))
+        st2 = transcribe_chunks(audio, decode, cache, "check", lambda segs: None, on_hit=on_hit)
+    print(f"[asr-cache] check {Path(path).name}: chunks={st1['chunks']} uncached={st1['uncached']} "
+          f"hits={st2['reused']}/{st2['chunks']} mismatches={len(bad)}")
+    for a, b in bad[:10]:
+        print(f"  mismatch {a:8.2f}s - {b:8.2f}s")
+    return 1 if bad else 0
+
+def _read(path):
+    import soundfile as sf
+    data, sr = sf.read(path, dtype="float32", always_2d=False)
+    if data.ndim == 2:
+        data = data.mean(axis=1)
+    if sr != SR:
+        raise SystemExit(f"[asr-cache] {path}: 16kHz の音声を指定してください（{sr}Hz）")
+    return data
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "stats":
+        con = sqlite3.connect(default_db()); con.executescript(SCHEMA)
+        n, sec, hits = con.execute("SELECT COUNT(*), COALESCE(SUM(dur),0), COALESCE(SUM(hits),0) FROM chunks").fetchone()
+        keys = con.execute("SELECT COUNT(DISTINCT key) FROM chunks").fetchone()[0]
+        print(f"[asr-cache] chunks={n} speech={sec/60:.1f}min hits={hits} keys={keys} db={default_db()}")
+    elif len(sys.argv) in (3, 4) and sys.argv[1] == "check":
+        sys.exit(check(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else os.environ.get("CFG_ASR_BACKEND", "fake")))
+    elif len(sys.argv) == 4 and sys.argv[1] == "match":
+        A, B = _read(sys.argv[2]), _read(sys.argv[3])
+        ca = [(fingerprint(A[s0:s1]), (s1 - s0) / SR, s0 / SR) for _, _, s0, s1 in chunks(A)]
+        for _, _, s0, s1 in chunks(B):
+            fp = fingerprint(B[s0:s1]); dur = (s1 - s0) / SR
+            cands = [(ber(fp, f), t) for f, d, t in ca if abs(d - dur) <= max(0.3, DUR_TOL * dur)]
+            b, t = min(cands) if cands else (1.0, None)
+            tag = "HIT " if b <= BER_MAX else "miss"
+            print(f"{tag} B@{s0/SR:8.2f}s dur={dur:6.2f}s ber={b:.3f}" + (f" ~ A@{t:.2f}s" if t is not None else ""))
+    else:
+        raise SystemExit(__doc__)
+
+if __name__ == "__main__":
+    main()
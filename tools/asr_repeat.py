@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ASR の繰り返しループ（無音・音楽上の幻覚）の検出と、該当窓だけの再デコード。
+
+- 検出: セグメント列の連結テキストに対し、文字 n-gram のローリングハッシュ（Rabin-Karp）で
+  直近 window 文字以内に同じ n-gram が3回以上出た位置を「反復」とし、反復率の高いセグメントを
+  時間的に連続する領域へまとめる（ハッシュ一致時は文字列も照合）
+- 修正: 領域の音声（前後 pad 付き）だけを temperature フォールバック・
+  condition_on_previous_text=False で再デコードして差し替える。再デコードでも反復する場合は
+  幻覚とみなして捨てる
+- ログ: 再デコードした音声秒数と ASR 音声全体に対する比、差し替え/破棄セグメント数（asr/loops.json）
+
+使い方（確認用。再デコードは transcribe_from_wav.py から）:
+  python tools/asr_repeat.py Runs/<slug>/asr/aligned.json
+"""
+import sys, json
+
+MOD = (1 << 61) - 1
+BASE = 1_000_003
+
+def repeated_positions(text, n=6, window=120, min_count=3):
+    """
+    text[i:i+n] が直前 window 文字以内に合わせて min_count 回以上出ていれば、それらの出現位置を rep=True にする
+    （定型句が2回出る程度は通常の発話。ループは同じ句が3回以上続く）
+    """
+    L = len(text)
+    rep = [False] * L
+    if L < n:
+        return rep
+    pw = pow(BASE, n - 1, MOD)
+    h = 0
+    for c in text[:n]:
+        h = (h * BASE + ord(c)) % MOD
+    seen = {}  # hash -> 直近の出現位置
+    for i in range(L - n + 1):
+        if i:
+            h = ((h - ord(text[i-1]) * pw) * BASE + ord(text[i+n-1])) % MOD
+        occ = [j for j in seen.get(h, ()) if i - j <= window and text[j:j+n] == text[i:i+n]]
+        occ.append(i)
+        if len(occ) >= min_count:
+            for j in occ:
+                for k in range(j, j + n):
+                    rep[k] = True
+        seen[h] = occ
+    return rep
+
+def find_loops(segments, n=6, window=120, min_ratio=0.6, min_chars=12, join_gap=2.0):
+    """反復率の高いセグメントを [(seg_lo, seg_hi)]（半開区間）の領域にまとめて返す"""
+    texts = [s["text"] for s in segments]
+    stream = "".join(texts)
+    rep = repeated_positions(stream, n, window)
+    flagged = []
+    pos = 0
+    for k, t in enumerate(texts):
+        m = len(t)
+        r = sum(rep[pos:pos+m]) / m if m else 0.0
+        # 単独の短い相槌の一致は除外（十分な長さがある or 直前も反復）
+        if r >= min_ratio and (m >= min_chars or (flagged and flagged[-1] == k - 1)):
+            flagged.append(k)
+        pos += m
+    regions = []
+    for k in flagged:
+        if regions and (k == regions[-1][1] or segments[k]["start"] - segments[regions[-1][1] - 1]["end"] <= join_gap):
+            regions[-1] = (regions[-1][0], k + 1)
+        else:
+            regions.append((k, k + 1))
+    return regions
+
+def _decode(backend, audio, base, beam_size, word_timestamps):
+    segs = backend.transcribe(audio, beam_size=beam_size, temperature=(0.2, 0.4, 0.6, 0.8, 1.0),
+                              compression_ratio_threshold=2.0, condition_on_previous_text=False,
+                              word_timestamps=word_timestamps)
+    out = []
+    for d in segs:
+        if not d["text"]:
+            continue
+        d = dict(d, start=base + d["start"], end=base + d["end"])
+        if d.get("words"):
+            d["words"] = [dict(w, start=base + w["start"], end=base + w["end"]) for w in d["words"]]
+        out.append(d)
+    return out
+
+def repair_loops(backend, audio, segments, beam_size=5, word_timestamps=False, sr=16000, pad=1.0, **kw):
+    """ループ領域だけ再デコード（backend は tools/asr_backends.py）して差し替えた segments と統計を返す"""
+    regions = find_loops(segments, **kw)
+    total = len(audio) / sr
+    stats = {"regions": [], "redecoded_sec": 0.0, "audio_sec": round(total, 3), "replaced": 0, "dropped": 0,
+             "redecoded_ratio": 0.0}
+    if not regions:
+        return segments, stats
+    out = []; pos = 0
+    for lo, hi in regions:
+        out.extend(segments[pos:lo]); pos = hi
+        t0 = max(0.0, segments[lo]["start"] - pad)
+        t1 = min(total, segments[hi-1]["end"] + pad)
+        # 前後の確定セグメントに食い込まない範囲だけ差し替える
+        keep_lo = out[-1]["end"] if out else 0.0
+        keep_hi = segments[hi]["start"] if hi < len(segments) else total
+        new = _decode(backend, audio[int(t0 * sr):int(t1 * sr)], t0, beam_size, word_timestamps)
+        new = [s for s in new if s["start"] >= keep_lo - 0.05 and s["end"] <= keep_hi + 0.05]
+        still = find_loops(new, **kw)
+        bad = {k for a, b in still for k in range(a, b)}
+        new = [s for k, s in enumerate(new) if k not in bad]
+        out.extend(new)
+        stats["redecoded_sec"] += t1 - t0
+        stats["replaced"] += hi - lo
+        stats["dropped"] += len(bad)
+        stats["regions"].append({"start": round(t0, 3), "end": round(t1, 3),
+                                 "before": " / ".join(s["text"] for s in segments[lo:hi])[:200],
+                                 "after": " / ".join(s["text"] for s in new)[:200]})
+    out.extend(segments[pos:])
+    stats["redecoded_sec"] = round(stats["redecoded_sec"], 3)
+    stats["redecoded_ratio"] = round(stats["redecoded_sec"] / max(1e-6, total), 4)
+    return out, stats
+
+def main():
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        segs = json.load(f).get("segments", [])
+    for lo, hi in find_loops(segs):
+        print(f"{segs[lo]['start']:9.2f}-{segs[hi-1]['end']:9.2f}  " + " / ".join(s["text"] for s in segs[lo:hi])[:120])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音声のデコード + 16k リサンプルだけを先に行い .npy に保存する（transcribe_from_wav.py --audio で読む）。
+Inbox のパイプライン実行（tools/inbox_pipeline.py）が、前のファイルの ASR 中に次のファイルへ使う。
+
+使い方:
+  python tools/audio_prefetch.py IN.wav OUT.npy
+  python tools/audio_prefetch.py --size IN.wav      # 16k float32 にしたときのバイト数（見積り）
+"""
+import os, sys
+import numpy as np
+import soundfile as sf
+
+def prefetched_bytes(path):
+    info = sf.info(path)
+    return int(info.frames * 16000 / max(1, info.samplerate)) * 4
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--size":
+        print(prefetched_bytes(sys.argv[2]))
+        return
+    if len(sys.argv) != 3:
+        raise SystemExit(__doc__)
+    from transcribe_from_wav import read_and_normalize
+    src, out = sys.argv[1], sys.argv[2]
+    audio = read_and_normalize(src)
+    tmp = out + ".tmp.npy"
+    np.save(tmp, audio)
+    os.replace(tmp, out)
+    print(f"[prefetch] {os.path.basename(src)}: {len(audio)/16000:.1f}s -> {out}")
+
+if __name__ == "__main__":
+    main()
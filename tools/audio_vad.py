@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CPU エネルギー VAD と keep-map（ASR 前の無音スキップ）。
+
+- speech_regions(): フレーム RMS(dB) を雑音床から相対しきい値で判定し、
+  短い無音は埋め・短い発話は捨て・前後に pad を付けた発話区間（サンプル単位）を返す
+- KeepMap: 発話区間だけを連結した音声と元の時間軸の対応表
+    to_orig(t, side) で連結後の秒 → 元の秒へ正確に戻す（区間継ぎ目では start は後側、end は前側）
+    map_segments() で segments / words の start・end を一括で元の時間軸へ
+- エネルギー包絡: save_energy() で 10ms ごとの dB を asr/energy.npz に保存し、
+  snap_to_valleys() で字幕の開始/終了時刻を近傍の低エネルギーの谷へ一括スナップ
+
+使い方（確認用）:
+  python tools/audio_vad.py input.wav
+  python tools/audio_vad.py input.wav --energy Runs/<slug>/asr/energy.npz   # 既存 Run 用に包絡を作る
+"""
+import sys, json, bisect
+import numpy as np
+
+SR = 16000
+
+def frame_db(audio: np.ndarray, sr=SR, frame=0.03, hop=0.01, block=2048):
+    """フレーム RMS を dBFS で返す（hop 秒刻み）。
+    二乗の累積和の差で窓ごとの平均を取り、block フレームずつ処理する（作業領域は音声長によらず 10MB 程度）"""
+    n_fr = int(frame * sr); n_hop = int(hop * sr)
+    if len(audio) < n_fr:
+        return np.full(1, -120.0, dtype=np.float32)
+    n_out = (len(audio) - n_fr) // n_hop + 1
+    out = np.empty(n_out, dtype=np.float32)
+    for i0 in range(0, n_out, block):
+        i1 = min(n_out, i0 + block)
+        a = audio[i0 * n_hop:(i1 - 1) * n_hop + n_fr].astype(np.float64)
+        c = np.concatenate(([0.0], np.cumsum(a * a)))
+        pos = np.arange(i1 - i0) * n_hop
+        ms = np.maximum(c[pos + n_fr] - c[pos], 0.0) / n_fr
+        out[i0:i1] = 20.0 * np.log10(np.maximum(np.sqrt(ms), 1e-6))
+    return out
+
+def speech_regions(audio, sr=SR, min_silence=1.0, min_speech=0.25, pad=0.3,
+                   rel_db=12.0, abs_db=-50.0, hop=0.01, db=None):
+    """発話区間 [(start_sample, end_sample), ...] を返す。db は計算済みの frame_db（30ms 窓・hop 刻み）"""
+    if db is None:
+        db = frame_db(audio, sr=sr, hop=hop)
+    floor = float(np.percentile(db, 10))
+    thr = max(floor + rel_db, abs_db)
+    act = db > thr
+    if not act.any():
+        return []
+    # 立ち上がり/立ち下がりを差分で検出
+    edges = np.diff(np.concatenate(([0], act.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1); ends = np.flatnonzero(edges == -1)
+    # 短い無音は埋める
+    gap_fr = int(round(min_silence / hop))
+    keep = np.concatenate(([True], (starts[1:] - ends[:-1]) >= gap_fr))
+    starts = starts[keep]
+    ends = np.concatenate((ends[:-1][keep[1:]], ends[-1:]))
+    # 短すぎる発話は捨てる
+    ok = (ends - starts) * hop >= min_speech
+    starts, ends = starts[ok], ends[ok]
+    out = []
+    n = len(audio); p = int(pad * sr); hs = int(hop * sr)
+    for s, e in zip(starts, ends):
+        a = max(0, s * hs - p); b = min(n, e * hs + int(0.03 * sr) + p)
+        if out and a <= out[-1][1]:
+            out[-1] = (out[-1][0], max(out[-1][1], b))
+        else:
+            out.append((a, b))
+    return out
+
+ENERGY_HOP = 0.01    # 包絡のフレーム間隔 (sec)
+ENERGY_FRAME = 0.03  # 包絡の窓長 (sec)
+
+def save_energy(path, audio, sr=SR):
+    """フレーム dB 包絡（float16、1時間で約 700KB）を保存"""
+    db = frame_db(audio, sr=sr, frame=ENERGY_FRAME, hop=ENERGY_HOP)
+    np.savez_compressed(path, db=db.astype(np.float16), hop=ENERGY_HOP, frame=ENERGY_FRAME)
+    return db
+
+def load_energy(path):
+    """(db: float32 配列, hop, frame)"""
+    z = np.load(path)
+    return z["db"].astype(np.float32), float(z["hop"]), float(z["frame"])
+
+def snap_to_valleys(times, db, hop=ENERGY_HOP, frame=ENERGY_FRAME, tol=0.15, side="start", rel_db=6.0):
+    """
+    各時刻を ±tol 秒内で最も近い低エネルギー（雑音床 + rel_db 以下）のフレーム中心へ寄せる（全時刻を一括で計算）。
+    発話を削らないよう、start は前側・end は後側の谷を優先。既に低エネルギーなら動かさず、
+    窓内に谷が無い時刻もそのまま。
+    """
+    t = np.asarray(times, dtype=np.float64)
+    if len(t) == 0 or len(db) == 0:
+        return t
+    r = max(0, int(round(tol / hop)))
+    offs = np.arange(-r, r + 1)
+    c = np.clip(np.rint((t - frame / 2) / hop).astype(np.int64), 0, len(db) - 1)
+    idx = np.clip(c[:, None] + offs[None, :], 0, len(db) - 1)
+    thr = float(np.percentile(db, 10)) + rel_db
+    quiet = db[idx] <= thr
+    wrong = (offs > 0) if side == "start" else (offs < 0)
+    cost = np.where(quiet, np.abs(offs)[None, :] + wrong[None, :] * (r + 1), np.iinfo(np.int64).max)
+    k = np.argmin(cost, axis=1)
+    rows = np.arange(len(t))
+    moved = quiet[rows, k] & ~quiet[rows, r]  # 元の位置が谷なら動かさない
+    return np.where(moved, idx[rows, k] * hop + frame / 2, t)
+
+class KeepMap:
+    """連結音声（ASR 時間軸）と元音声の対応"""
+    def __init__(self, regions, total_samples, sr=SR):
+        self.sr = sr
+        self.total = int(total_samples)
+        self.regions = [(int(a), int(b)) for a, b in regions]
+        self.cum = [0]  # 各区間の連結後開始サンプル
+        for a, b in self.regions:
+            self.cum.append(self.cum[-1] + (b - a))
+
+    @classmethod
+    def identity(cls, total_samples, sr=SR):
+        return cls([(0, int(total_samples))], total_samples, sr)
+
+    @property
+    def kept_sec(self): return self.cum[-1] / self.sr
+    @property
+    def total_sec(self): return self.total / self.sr
+    @property
+    def skipped_sec(self): return self.total_sec - self.kept_sec
+
+    def apply(self, audio):
+        if len(self.regions) == 1 and self.regions[0] == (0, len(audio)):
+            return audio
+        if not self.regions:
+            return audio[:0]
+        return np.concatenate([audio[a:b] for a, b in self.regions])
+
+    def to_orig(self, t: float, side: str = "start") -> float:
+        """連結後の秒 → 元の秒。継ぎ目上の start は次区間、end は前区間に寄せる"""
+        if not self.regions:
+            return t
+        x = t * self.sr
+        k = (bisect.bisect_right(self.cum, x) if side == "start" else bisect.bisect_left(self.cum, x)) - 1
+        k = min(max(k, 0), len(self.regions) - 1)
+        return (self.regions[k][0] + (x - self.cum[k])) / self.sr
+
+    def to_kept(self, t: float) -> float:
+        """元の秒 → 連結後の秒（スキップした無音の中は直前の区間の末尾へ）"""
+        if not self.regions:
+            return t
+        x = t * self.sr
+        k = bisect.bisect_right([a for a, _ in self.regions], x) - 1
+        if k < 0:
+            return 0.0
+        a, b = self.regions[k]
+        return (self.cum[k] + min(x - a, b - a)) / self.sr
+
+    def map_segments(self, segments):
+        """segments（dict）と words の start/end を元の時間軸へ（in-place）"""
+        for seg in segments:
+            if isinstance(seg.get("start"), (int, float)): seg["start"] = self.to_orig(seg["start"], "start")
+            if isinstance(seg.get("end"), (int, float)):   seg["end"] = self.to_orig(seg["end"], "end")
+            for w in seg.get("words", []) or []:
+                if isinstance(w.get("start"), (int, float)): w["start"] = self.to_orig(w["start"], "start")
+                if isinstance(w.get("end"), (int, float)):   w["end"] = self.to_orig(w["end"], "end")
+        return segments
+
+    def to_json(self):
+        return {"sr": self.sr, "total": self.total, "regions": self.regions}
+
+    @classmethod
+    def from_json(cls, js):
+        return cls(js["regions"], js["total"], js.get("sr", SR))
+
+def main():
+    import soundfile as sf
+    data, sr = sf.read(sys.argv[1], dtype="float32", always_2d=False)
+    if data.ndim == 2:
+        data = data.mean(axis=1)
+    if len(sys.argv) >= 4 and sys.argv[2] == "--energy":
+        db = save_energy(sys.argv[3], data, sr=sr)
+        print(f"[energy] frames={len(db)} hop={ENERGY_HOP}s -> {sys.argv[3]}")
+        return
+    km = KeepMap(speech_regions(data, sr=sr), len(data), sr)
+    print(json.dumps({"kept_sec": round(km.kept_sec, 3), "skipped_sec": round(km.skipped_sec, 3),
+                      "regions_sec": [(round(a/sr, 3), round(b/sr, 3)) for a, b in km.regions]},
+                     ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
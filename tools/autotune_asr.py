@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ホスト向け ASR 設定オートチューナ。
+compute_type × cpu_threads（＋アライン用 torch スレッド数）を短いクリップで計測し、
+実時間係数 (RTF) とピークメモリを記録、最良設定をホストプロファイルへ書き出す。
+transcribe_from_wav.py は config/host_profiles/<hostname>.json を自動で読む（CFG_HOST_PROFILE=off で無効）。
+プロファイルはモデルごと（--model で計測したモデルにだけ適用。CFG_CT2_COMPUTE を明示した場合は compute はそちら）。
+
+使い方:
+  python tools/autotune_asr.py [--clip WAV] [--seconds 30] [--align]
+クリップ未指定時は Workspace/Done の先頭 WAV、それも無ければ合成音声（トーンバースト）を使う。
+各設定は別プロセスで実行する（ピークメモリを設定ごとに正しく測るため）。
+num_workers は計測しない（transcribe は1本のストリームを逐次デコードするので、並列呼び出しでしか効かない）。
+"""
+import os, sys, glob, json, time, socket, argparse, resource, subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SR = 16000
+
+def profile_path(host=None):
+    p = os.environ.get("CFG_HOST_PROFILE", "")
+    if p and p != "off":
+        return Path(p)
+    host = (host or socket.gethostname()).split(".")[0]
+    return ROOT / "config" / "host_profiles" / f"{host}.json"
+
+def read_profiles(p):
+    """{model: 計測結果}。1モデルだけの旧形式も読む"""
+    with open(p, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if "models" in data:
+        return data["models"]
+    return {data["model"]: data} if data.get("model") else {}
+
+def load_host_profile(model):
+    """transcribe 側から呼ぶ。model で計測した best（無効/未作成/未計測なら {}）"""
+    if os.environ.get("CFG_HOST_PROFILE", "") == "off":
+        return {}
+    p = profile_path()
+    if not p.exists():
+        return {}
+    try:
+        models = read_profiles(p)
+    except Exception as e:
+        print(f"[warn] host profile {p}: {e}")
+        return {}
+    if model not in models:
+        print(f"[transcribe] host profile: {model} は未計測（{', '.join(models) or 'なし'}）。"
+              f"bash bin/autotune.sh --model {model} で計測")
+        return {}
+    return models[model].get("best", {})
+
+def peak_rss_mb():
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / (1024 * 1024) if sys.platform == "darwin" else r / 1024  # macOS は bytes, Linux は KB
+
+def synth_clip(seconds):
+    """音声らしい包絡のトーンバースト（実音声が無いホスト用）"""
+    import numpy as np
+    t = np.arange(int(seconds * SR)) / SR
+    env = (np.sin(2 * np.pi * 0.7 * t) > -0.3).astype("float32")
+    f0 = 140 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    x = 0.1 * env * (np.sin(2 * np.pi * f0 * t) + 0.5 * np.sin(4 * np.pi * f0 * t))
+    return x.astype("float32")
+
+def load_clip(path, seconds):
+    if path:
+        from transcribe_from_wav import read_and_normalize
+        return read_and_normalize(path)[: int(seconds * SR)], path
+    done = sorted(glob.glob(os.path.join(os.environ.get("WORKSPACE_ROOT", str(ROOT / "Workspace")), "Done", "*.wav")))
+    if done:
+        from transcribe_from_wav import read_and_normalize
+        return read_and_normalize(done[0])[: int(seconds * SR)], done[0]
+    return synth_clip(seconds), "synthetic"
+
+# ---------------- 子プロセス（1設定の計測） ----------------
+
+def worker(cfg):
+    from faster_whisper import WhisperModel
+    audio, _ = load_clip(cfg["clip"], cfg["seconds"])
+    dur = len(audio) / SR
+    model = WhisperModel(cfg["model"], device="cpu", compute_type=cfg["compute_type"],
+                         cpu_threads=cfg["cpu_threads"])
+
+    def one():
+        segs, _ = model.transcribe(audio, language="ja", beam_size=cfg["beam_size"])
+        for _ in segs:
+            pass
+
+    one()  # ウォームアップ
+    t0 = time.time()
+    one()
+    wall = time.time() - t0
+    res = {"rtf": wall / dur, "wall_sec": wall, "audio_sec": dur}
+
+    if cfg.get("torch_threads"):
+        import torch, whisperx
+        torch.set_num_threads(cfg["torch_threads"])
+        segs, _ = model.transcribe(audio, language="ja", beam_size=cfg["beam_size"])
+        segments = [{"start": s.start, "end": s.end, "text": s.text} for s in segs]
+        am, meta = whisperx.load_align_model(language_code="ja", device="cpu")
+        t1 = time.time()
+        whisperx.align(segments, am, meta, audio, device="cpu", return_char_alignments=False)
+        res["align_rtf"] = (time.time() - t1) / dur
+    res["peak_mb"] = peak_rss_mb()
+    print("RESULT " + json.dumps(res))
+
+def run_one(cfg):
+    p = subprocess.run([sys.executable, __file__, "_worker", json.dumps(cfg)],
+                       capture_output=True, text=True)
+    for line in p.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[7:])
+    return {"error": (p.stderr.strip().splitlines() or ["unknown"])[-1]}
+
+# ---------------- 本体 ----------------
+
+def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == "_worker":
+        worker(json.loads(sys.argv[2]))
+        return
+
+    ncpu = os.cpu_count() or 4
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clip", default=None)
+    ap.add_argument("--seconds", type=float, default=30.0)
+    ap.add_argument("--model", default=os.environ.get("CFG_MODEL", "large-v2"))
+    ap.add_argument("--beam-size", type=int, default=int(os.environ.get("CFG_BEAM_SIZE", "5")))
+    ap.add_argument("--compute-types", default="int8,int8_float32,float32")
+    ap.add_argument("--threads", default=",".join(str(x) for x in sorted({max(1, ncpu // 2), ncpu})))
+    ap.add_argument("--align", action="store_true", help="アライン用 torch スレッド数も計測")
+    ap.add_argument("--max-mem-mb", type=float, default=0.0, help="この値を超える設定は採用しない")
+    ap.add_argument("--out", default=None, help="既定: config/host_profiles/<hostname>.json")
+    args = ap.parse_args()
+
+    import ctranslate2
+    supported = set(ctranslate2.get_supported_compute_types("cpu"))
+    cts = [c for c in args.compute_types.split(",") if c in supported]
+    threads = [int(x) for x in args.threads.split(",")]
+    _, clip_name = load_clip(args.clip, args.seconds)
+    print(f"[autotune] host={socket.gethostname()} cpus={ncpu} model={args.model} clip={clip_name}")
+
+    base = {"clip": args.clip, "seconds": args.seconds, "model": args.model, "beam_size": args.beam_size}
+    results = []
+    for ct in cts:
+        for th in threads:
+            cfg = dict(base, compute_type=ct, cpu_threads=th)
+            r = run_one(cfg)
+            results.append({**cfg, **r})
+            if "error" in r:
+                print(f"[autotune] {ct:14s} threads={th:2d}  ERROR {r['error']}")
+            else:
+                print(f"[autotune] {ct:14s} threads={th:2d}  rtf={r['rtf']:.3f} peak={r['peak_mb']:.0f}MB")
+
+    ok = [r for r in results if "error" not in r and (args.max_mem_mb <= 0 or r["peak_mb"] <= args.max_mem_mb)]
+    if not ok:
+        raise SystemExit("[autotune] 有効な設定がありません")
+    ok.sort(key=lambda r: (r["rtf"], r["peak_mb"]))
+    best = ok[0]
+
+    prof = {"compute_type": best["compute_type"], "cpu_threads": best["cpu_threads"]}
+    if args.align:
+        aligns = []
+        for tt in sorted({1, max(1, ncpu // 2), ncpu}):
+            r = run_one(dict(base, compute_type=best["compute_type"], cpu_threads=best["cpu_threads"], torch_threads=tt))
+            if "error" not in r:
+                print(f"[autotune] align torch_threads={tt:2d} align_rtf={r['align_rtf']:.3f} peak={r['peak_mb']:.0f}MB")
+                aligns.append((r["align_rtf"], tt))
+        if aligns:
+            prof["torch_threads"] = min(aligns)[1]
+
+    out = Path(args.out) if args.out else profile_path()
+    out.parent.mkdir(parents=True, exist_ok=True)
+    models = {}
+    if out.exists():
+        try:
+            models = read_profiles(out)
+        except Exception as e:
+            print(f"[warn] host profile {out}: {e}（作り直します）")
+    models[args.model] = {"beam_size": args.beam_size, "clip": clip_name,
+                          "measured": time.strftime("%Y-%m-%d %H:%M:%S"), "best": prof, "results": results}
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"host": socket.gethostname(), "cpus": ncpu, "models": models}, f, ensure_ascii=False, indent=2)
+    print(f"[autotune] best={prof} rtf={best['rtf']:.3f} -> {out}")
+
+if __name__ == "__main__":
+    main()
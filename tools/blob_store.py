@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Workspace のコンテンツアドレス型ブロブストア（入力・大きな中間物の重複排除）と保持ポリシー。
+
+- 実体は Workspace/Blobs/<sha256 先頭2桁>/<sha256>。Workspace/Inbox のファイルと adopt する Run の中間物は
+  ストアへ移動して元の場所にハードリンクを戻す（Done/ へ mv されても実体は1つ）。それ以外の元ファイルは呼び出し側の
+  持ち物なのでリンクも chmod もせず、リフリンクかコピーで取り込む（コピーになった時は警告を出す）。
+  Run 側はストアの実体へのハードリンク（不可ならリフリンク、最後の手段でコピー）を置き、
+  Run/blobs.json に 相対パス→ハッシュ を記録
+- 実体は読み取り専用。Run を再処理する前に detach でその Run の中間物を通常ファイルへ戻す
+  （入力 input/ は書き換えないのでリンクのまま）
+- gc: 古い Run（--max-age-days）と容量超過分（--max-gb、古い順）から final/・logs/ 以外を削除し、
+  どの Run からも参照されないブロブも消す。実際に空いた容量（他にリンクが無い実体のみ）を報告
+
+使い方:
+  python tools/blob_store.py put SRC RUN_DIR/input/NAME     # 取り込み＋リンク配置（cp -f の代わり）
+  python tools/blob_store.py adopt RUN_DIR [--min-mb 1]     # input/・asr/ の大きなファイルをストアへ
+  python tools/blob_store.py detach RUN_DIR                 # 再処理前: 中間物のリンクを解く
+  python tools/blob_store.py gc [--max-age-days 30] [--max-gb 50] [--dry-run]
+  python tools/blob_store.py stats
+"""
+import os, json, time, shutil, hashlib, argparse, subprocess
+from pathlib import Path
+
+ADOPT_DIRS = ("input", "asr")     # adopt の対象
+KEEP_DIRS = ("final", "logs")     # gc で残す
+MANIFEST = "blobs.json"
+
+def workspace():
+    return Path(os.environ.get("WORKSPACE_ROOT", Path(__file__).resolve().parents[1] / "Workspace"))
+
+def blobs_root():
+    return workspace() / "Blobs"
+
+def runs_root():
+    return workspace() / "Runs"
+
+def sha256_file(path, bufsize=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for b in iter(lambda: f.read(bufsize), b""):
+            h.update(b)
+    return h.hexdigest()
+
+def obj_path(digest):
+    return blobs_root() / digest[:2] / digest
+
+def run_dir_of(path):
+    """Runs/<slug>/... のパスから Run ディレクトリを返す"""
+    p = Path(path).resolve()
+    for a in p.parents:
+        if a.parent.name == "Runs":
+            return a
+    raise SystemExit(f"[blob] Runs/<slug>/ 配下ではありません: {path}")
+
+def load_manifest(run):
+    p = Path(run) / MANIFEST
+    if not p.exists():
+        return {}
+    with open(p, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(run, man):
+    p = Path(run) / MANIFEST
+    tmp = p.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(man, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, p)
+
+def _reflink(src, dst):
+    """コピーオンライトの複製（APFS: cp -c / Btrfs・XFS: cp --reflink=always）"""
+    for cmd in (["cp", "-c", src, dst], ["cp", "--reflink=always", src, dst]):
+        try:
+            if subprocess.run(cmd, capture_output=True).returncode == 0:
+                return True
+        except OSError:
+            pass
+    return False
+
+def _replace_with(dst, fill):
+    """dst と同じディレクトリの一時ファイルに fill(tmp) で実体を作り、rename で置き換える"""
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".blobtmp")
+    if tmp.exists():
+        tmp.unlink()
+    how = fill(tmp)
+    os.replace(tmp, dst)
+    return how
+
+def place(obj, dst):
+    """ストアの実体 obj を dst に置く。戻り値は方式（link / reflink / copy）"""
+    def fill(tmp):
+        try:
+            os.link(obj, tmp)
+            return "link"
+        except OSError:
+            if _reflink(str(obj), str(tmp)):
+                return "reflink"
+            shutil.copy2(obj, tmp)
+            return "copy"
+    return _replace_with(dst, fill)
+
+def inbox_owned(src):
+    """Workspace/Inbox 直下のファイルはパイプラインの持ち物（ストアへ移してよい）"""
+    return Path(src).resolve().parent == (workspace() / "Inbox").resolve()
+
+def store(src, move=False):
+    """src をストアに入れて (digest, 方式) を返す。既存なら実体は増やさない。
+    move=True（Inbox のファイル）は実体をストアへ移し、src にはストアへのハードリンクを戻す。
+    それ以外の src は呼び出し側の持ち物なのでリンクも chmod もしない（リフリンクかコピーで新しい inode を作る）"""
+    digest = sha256_file(src)
+    obj = obj_path(digest)
+    if obj.exists():
+        how = "dedup"
+    else:
+        def fill(tmp):
+            if move:
+                try:
+                    os.rename(src, tmp)
+                    return "move"
+                except OSError:  # 別ボリューム
+                    pass
+            if _reflink(str(src), str(tmp)):
+                return "reflink"
+            shutil.copyfile(src, tmp)
+            return "copy"
+        how = _replace_with(obj, fill)
+        os.chmod(obj, 0o444)
+    if move and (how == "move" or not os.path.samefile(src, obj)):
+        try:
+            _replace_with(src, lambda tmp: os.link(obj, tmp))
+        except OSError:
+            if how == "move":  # リンクを戻せないなら実体を複製して元の場所を保つ
+                _replace_with(src, lambda tmp: shutil.copyfile(obj, tmp))
+    if how == "copy":
+        print(f"[blob] warn: {Path(src).name} はコピーで取り込みました（リフリンク不可。元ファイルと実体が2重になります）")
+    return digest, how
+
+def put(src, dst):
+    src, dst = Path(src), Path(dst)
+    run = run_dir_of(dst)
+    digest, how_in = store(src, move=inbox_owned(src))
+    obj = obj_path(digest)
+    if dst.exists() and os.path.samefile(dst, obj):
+        how = "same"
+    else:
+        how = place(obj, dst)
+        if how == "copy":
+            print(f"[blob] warn: {dst.name} はストアからコピーしました（リンクもリフリンクもできず、実体が2重になります）")
+    man = load_manifest(run)
+    man[str(dst.resolve().relative_to(run))] = digest
+    save_manifest(run, man)
+    print(f"[blob] {dst.name}: {digest[:12]} store={how_in} place={how}")
+    return digest
+
+def adopt(run, min_bytes):
+    run = Path(run).resolve()
+    man = load_manifest(run)
+    n = saved = 0
+    for d in ADOPT_DIRS:
+        for p in sorted((run / d).rglob("*")) if (run / d).exists() else []:
+            if p.is_symlink() or not p.is_file() or p.suffix in (".tmp", ".blobtmp"):
+                continue
+            st = p.stat()
+            if st.st_size < min_bytes:
+                continue
+            rel = str(p.relative_to(run))
+            digest = man.get(rel)
+            if digest and obj_path(digest).exists() and os.path.samefile(p, obj_path(digest)):
+                continue
+            digest, how_in = store(p, move=True)  # Run の中間物はパイプラインの持ち物
+            if not os.path.samefile(p, obj_path(digest)):
+                place(obj_path(digest), p)
+            if how_in == "dedup":
+                saved += st.st_size
+            man[rel] = digest; n += 1
+    save_manifest(run, man)
+    print(f"[blob] adopt {run.name}: {n} files, dedup saved {saved/1e6:.1f}MB")
+
+def detach(run):
+    """input/ 以外のリンクを通常ファイル（書き込み可）に戻し、マニフェストから外す"""
+    run = Path(run).resolve()
+    man = load_manifest(run)
+    n = 0
+    for rel in list(man):
+        if rel.split("/", 1)[0] == "input":
+            continue
+        p = run / rel
+        if p.exists() and not p.is_symlink():
+            tmp = p.with_name(p.name + ".blobtmp")
+            shutil.copyfile(p, tmp)  # 新しい inode（実体は読み取り専用のまま）
+            os.replace(tmp, p); n += 1
+        del man[rel]
+    save_manifest(run, man)
+    if n:
+        print(f"[blob] detach {run.name}: {n} files")
+
+# ---------------- 保持ポリシー / GC ----------------
+
+def _freed_size(path):
+    """削除で実際に空く容量（他にハードリンクがある実体は 0）"""
+    st = path.lstat()
+    return st.st_size if st.st_nlink <= 1 else 0
+
+def run_mtime(run):
+    log = run / "logs" / "pipeline.log"
+    return (log if log.exists() else run).stat().st_mtime
+
+def du_unique(paths, seen):
+    """inode 単位で重複を除いたサイズ"""
+    total = 0
+    for root in paths:
+        for p in ([root] if root.is_file() else root.rglob("*")):
+            if p.is_symlink() or not p.is_file():
+                continue
+            st = p.stat()
+            if (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino)); total += st.st_size
+    return total
+
+def prune_run(run, dry):
+    """final/・logs/ 以外を削除。(削除ファイル数, 解放バイト)"""
+    n = freed = 0
+    for child in run.iterdir():
+        if child.name in KEEP_DIRS or child.name in (MANIFEST, ".pruned"):
+            continue
+        files = [child] if not child.is_dir() else [p for p in child.rglob("*") if p.is_file() or p.is_symlink()]
+        for p in files:
+            n += 1; freed += _freed_size(p)
+        if not dry:
+            if child.is_dir() and not child.is_symlink():
+                shutil.rmtree(child)
+            else:
+                child.unlink()
+    if not dry:
+        (run / ".pruned").write_text(time.strftime("%Y-%m-%d %H:%M:%S") + "\n")
+    return n, freed
+
+def gc(max_age_days, max_gb, dry):
+    runs = sorted((r for r in runs_root().iterdir() if r.is_dir() and not (r / ".pruned").exists()),
+                  key=run_mtime) if runs_root().exists() else []
+    now = time.time()
+    victims = [r for r in runs if max_age_days > 0 and now - run_mtime(r) > max_age_days * 86400]
+    if max_gb > 0:
+        seen = set()
+        total = du_unique([runs_root(), blobs_root()] if blobs_root().exists() else [runs_root()], seen)
+        budget = max_gb * 1e9
+        for r in victims:
+            total -= du_unique([c for c in r.iterdir() if c.name not in KEEP_DIRS], set())
+        for r in runs:  # 古い順
+            if total <= budget:
+                break
+            if r in victims:
+                continue
+            victims.append(r)
+            total -= du_unique([c for c in r.iterdir() if c.name not in KEEP_DIRS], set())
+    n_files = freed = 0
+    for r in victims:
+        n, f = prune_run(r, dry)
+        n_files += n; freed += f
+        print(f"[gc] {'would prune' if dry else 'pruned'} {r.name} ({n} files)")
+
+    # 参照の無いブロブ（削除する Run の中間物からの参照は数えない）
+    live = set()
+    for r in runs_root().iterdir() if runs_root().exists() else []:
+        if r.is_dir():
+            for rel, digest in load_manifest(r).items():
+                if r not in victims or rel.split("/", 1)[0] in KEEP_DIRS:
+                    live.add(digest)
+    # dry-run では Run 側のリンクがまだ残っているので、削除予定分のリンク数を差し引く
+    victim_links = {}
+    if dry:
+        for r in victims:
+            for c in r.iterdir():
+                if c.name in KEEP_DIRS:
+                    continue
+                for q in ([c] if c.is_file() else c.rglob("*")):
+                    if q.is_file() and not q.is_symlink():
+                        st = q.stat(); k = (st.st_dev, st.st_ino)
+                        victim_links[k] = victim_links.get(k, 0) + 1
+    n_obj = 0
+    for obj in list(blobs_root().glob("*/*")) if blobs_root().exists() else []:
+        if obj.name in live:
+            continue
+        st = obj.stat()
+        if st.st_nlink - victim_links.get((st.st_dev, st.st_ino), 0) <= 1:
+            freed += st.st_size
+        n_obj += 1
+        if not dry:
+            obj.unlink()
+    if not dry:
+        for r in victims:
+            if (r / MANIFEST).exists():
+                save_manifest(r, {k: v for k, v in load_manifest(r).items() if k.split("/", 1)[0] in KEEP_DIRS})
+    verb = "would reclaim" if dry else "reclaimed"
+    print(f"[gc] runs={len(victims)} files={n_files} blobs={n_obj} {verb} {freed/1e6:.1f}MB")
+    return freed
+
+def stats():
+    objs = list(blobs_root().glob("*/*")) if blobs_root().exists() else []
+    size = sum(o.stat().st_size for o in objs)
+    refs = sum(max(0, o.stat().st_nlink - 1) for o in objs)
+    seen = set()
+    uniq = du_unique([runs_root()], seen) if runs_root().exists() else 0
+    print(f"[blob] objects={len(objs)} size={size/1e9:.2f}GB extra_links={refs} runs_unique={uniq/1e9:.2f}GB")
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("put"); p.add_argument("src"); p.add_argument("dst")
+    p = sub.add_parser("adopt"); p.add_argument("run"); p.add_argument("--min-mb", type=float,
+                                                                      default=float(os.environ.get("CFG_BLOB_MIN_MB", "1")))
+    p = sub.add_parser("detach"); p.add_argument("run")
+    p = sub.add_parser("gc")
+    p.add_argument("--max-age-days", type=float, default=float(os.environ.get("CFG_RETAIN_DAYS", "0")))
+    p.add_argument("--max-gb", type=float, default=float(os.environ.get("CFG_RETAIN_GB", "0")))
+    p.add_argument("--dry-run", action="store_true")
+    sub.add_parser("stats")
+    args = ap.parse_args()
+    if args.cmd == "put":
+        put(args.src, args.dst)
+    elif args.cmd == "adopt":
+        adopt(args.run, int(args.min_mb * 1e6))
+    elif args.cmd == "detach":
+        detach(args.run)
+    elif args.cmd == "gc":
+        gc(args.max_age_days, args.max_gb, args.dry_run)
+    else:
+        stats()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CTC 強制アラインと emission キャッシュ（CFG_ALIGN=ctc。transcribe_from_wav.py から使う）。
+
+- アライン: whisperx と同じ wav2vec2 を各セグメントの区間で1回だけ前向きに流し（バックエンドの emissions）、
+  log-softmax を CTC の Viterbi（numpy）で文字単位に合わせる。同じ文字の連続も扱い、blank が勝つフレームはポーズとして
+  文字の外に残す（辞書に無い文字は whisperx と同じく時刻なし）
+- キャッシュ: フレームごとの上位 TOPK（blank は必ず含む）と残りの確率の床を float16 で
+  asr/emissions/win_NNNN.npz（アラインの窓ごと）に保存。index.json にセグメント（ASR 時間軸）・辞書・keep-map を置く
+- realign: 修正した asr/ja-JP_raw.srt を index.json のセグメントと突き合わせ、変わったキューだけ
+  保存済みの emission で強制アラインし直して aligned.json を差し替える。wav2vec2 は動かさないので
+  時間は修正量に比例する。キューの時刻を動かした場合も、キャッシュの範囲（セグメント間の隙間は blank 扱い）で合わせる
+
+使い方（修正 → 再アライン → 後段だけやり直し）:
+  python tools/ctc_align.py realign Workspace/Runs/<slug> [--srt 修正版.srt] [--dry-run]
+  bash bin/full_pipeline.sh -i <入力> --stage post
+  python tools/ctc_align.py stats Workspace/Runs/<slug>
+"""
+import os, json, time, argparse
+from difflib import SequenceMatcher
+from pathlib import Path
+import numpy as np
+import srt
+from audio_vad import KeepMap
+from blob_store import load_manifest, save_manifest
+
+SR = 16000
+TOPK = 32          # キャッシュするフレームあたりの候補数
+FLOOR_MIN = -30.0  # 上位に入らなかった文字の log 確率の下限
+TIME_TOL = 0.01    # 時刻の一致判定（SRT はミリ秒丸め）
+
+# ---------------- 強制アライン ----------------
+
+def tokens_of(text, vocab):
+    """[(文字位置, token id)]。辞書に無い文字（記号など）は時刻を付けない"""
+    return [(i, vocab[c.lower()]) for i, c in enumerate(text) if c.lower() in vocab]
+
+def force_align(em, labels=None):
+    """
+    em: [T, 1+N] の log 確率（列0が blank、列 j が j 番目のトークン）。labels は同じ文字の判定用の id 列。
+    CTC の Viterbi（blank を挟んだ 2N+1 状態。同じ文字の連続は間に blank が要る）で、
+    トークンごとの (開始フレーム, 終了フレーム, score) を返す。経路が無ければ None
+    """
+    T, N = em.shape[0], em.shape[1] - 1
+    labels = list(range(1, N + 1)) if labels is None else list(labels)
+    if N == 0:
+        return None
+    S = 2 * N + 1
+    cols = np.zeros(S, dtype=int)
+    cols[1::2] = np.arange(1, N + 1)
+    emx = em[:, cols]
+    skip = np.zeros(S, dtype=bool)  # s-2 → s を許す（blank を飛ばす）状態
+    skip[3::2] = [labels[j] != labels[j - 1] for j in range(1, N)]
+    dp = np.full(S, -np.inf)
+    dp[0] = emx[0, 0]; dp[1] = emx[0, 1]
+    back = np.zeros((T, S), dtype=np.int8)
+    for t in range(1, T):
+        c1 = np.concatenate(([-np.inf], dp[:-1]))
+        c2 = np.where(skip, np.concatenate(([-np.inf, -np.inf], dp[:-2])), -np.inf)
+        cand = np.stack([dp, c1, c2])
+        back[t] = np.argmax(cand, axis=0)
+        dp = cand[back[t], np.arange(S)] + emx[t]
+    s = S - 1 if S == 1 or dp[S - 1] >= dp[S - 2] else S - 2
+    if not np.isfinite(dp[s]):
+        return None
+    path = np.empty(T, dtype=int)
+    for t in range(T - 1, -1, -1):
+        path[t] = s
+        s -= back[t, s]
+    out = []
+    for j in range(N):
+        fr = np.flatnonzero(path == 2 * j + 1)
+        out.append((int(fr[0]), int(fr[-1]) + 1, float(np.exp(em[fr, j + 1]).mean())))
+    return out
+
+def align_text(text, em_cols, t0, t1, vocab, blank):
+    """
+    1キュー分のアライン。em_cols(ids) -> [T, len(ids)] の log 確率（t0..t1 の区間）。
+    戻り値は whisperx と同じ形の segment（words は1文字1語）
+    """
+    toks = tokens_of(text, vocab)
+    em = em_cols([blank] + [tid for _, tid in toks])
+    spans = force_align(em, [tid for _, tid in toks]) if toks else None
+    words = [{"word": c} for c in text]
+    if spans is None:
+        if toks:  # フレーム不足などで合わない → 区間に均等割り
+            step = (t1 - t0) / len(toks)
+            for k, (i, _) in enumerate(toks):
+                words[i].update(start=round(t0 + k * step, 3), end=round(t0 + (k + 1) * step, 3), score=0.0)
+    else:
+        ratio = (t1 - t0) / max(1, em.shape[0])
+        for (i, _), (a, b, sc) in zip(toks, spans):
+            words[i].update(start=round(t0 + a * ratio, 3), end=round(t0 + b * ratio, 3), score=round(sc, 3))
+    words = [w for w in words if w["word"].strip()]
+    timed = [w for w in words if "start" in w]
+    return {"start": timed[0]["start"] if timed else round(t0, 3), "end": timed[-1]["end"] if timed else round(t1, 3),
+            "text": text, "words": words}
+
+# ---------------- キャッシュ ----------------
+
+def compress(logp, blank, k=TOPK):
+    """[T, V] → (idx uint16 [T,k], val float16 [T,k], floor float16 [T])。blank は必ず含める"""
+    k = min(k, logp.shape[1])
+    idx = np.argpartition(-logp, k - 1, axis=1)[:, :k]
+    has_blank = (idx == blank).any(axis=1)
+    idx[~has_blank, -1] = blank
+    val = np.take_along_axis(logp, idx, axis=1)
+    rest = np.clip(1.0 - np.exp(val).sum(axis=1), 1e-12, None) / max(1, logp.shape[1] - k)
+    floor = np.maximum(np.log(rest), FLOOR_MIN)
+    return idx.astype(np.uint16), val.astype(np.float16), floor.astype(np.float16)
+
+def gather(idx, val, floor, ids):
+    """圧縮した emission から列 ids の [T, len(ids)] を復元（上位に無ければ床）"""
+    ids = np.asarray(ids, dtype=np.uint16)
+    hit = idx[:, :, None] == ids[None, None, :]
+    out = np.where(hit, val[:, :, None].astype(np.float32), -np.inf).max(axis=1)
+    return np.where(np.isfinite(out), out, floor[:, None].astype(np.float32))
+
+def align_window(backend, part, audio, out_path):
+    """
+    窓内のセグメントを1つずつ emission → アラインし、emission を out_path（.npz）へ保存。
+    戻り値は aligned segments（入力と1対1）
+    """
+    vocab, blank = backend.vocab()
+    segs, idxs, vals, floors, slices = [], [], [], [], []
+    f0 = 0
+    for sg in part:
+        a, b = int(sg["start"] * SR), int(sg["end"] * SR)
+        t0, t1 = a / SR, b / SR
+        logp = backend.emissions(audio[a:b])
+        # realign と同じ emission（圧縮後）で合わせる。生の logp だと再アラインで時刻がずれる
+        i, v, fl = compress(logp, blank)
+        segs.append(align_text(sg["text"], lambda ids: gather(i, v, fl, ids), t0, t1, vocab, blank))
+        idxs.append(i); vals.append(v); floors.append(fl)
+        slices.append((t0, t1, f0, f0 + len(logp))); f0 += len(logp)
+    tmp = out_path.with_name(out_path.stem + ".tmp.npz")
+    np.savez(tmp, idx=np.concatenate(idxs) if idxs else np.zeros((0, TOPK), np.uint16),
+             val=np.concatenate(vals) if vals else np.zeros((0, TOPK), np.float16),
+             floor=np.concatenate(floors) if floors else np.zeros(0, np.float16),
+             slices=np.array(slices, dtype=np.float64).reshape(-1, 4))
+    os.replace(tmp, out_path)
+    return segs
+
+def write_index(emis_dir, backend, segments, windows, keep):
+    """index.json: 辞書・セグメント（ASR 時間軸、aligned.json と1対1）・窓の時間範囲・keep-map"""
+    vocab, blank = backend.vocab()
+    js = {"vocab": vocab, "blank": blank, "topk": TOPK, "keepmap": keep.to_json(),
+          "segments": [{"start": s["start"], "end": s["end"], "text": s["text"].strip()} for s in segments],
+          "windows": [[segments[lo]["start"], segments[hi - 1]["end"]] for lo, hi in windows]}
+    with open(emis_dir / "index.tmp", "w", encoding="utf-8") as f:
+        json.dump(js, f, ensure_ascii=False)
+    os.replace(emis_dir / "index.tmp", emis_dir / "index.json")
+
+class Store:
+    """窓ごとの .npz を必要な分だけ読む"""
+    def __init__(self, emis_dir, windows):
+        self.dir = Path(emis_dir)
+        self.windows = windows
+        self.cache = {}
+        self.loaded = 0
+
+    def _win(self, w):
+        if w not in self.cache:
+            z = np.load(self.dir / f"win_{w:04d}.npz")
+            self.cache[w] = {k: z[k] for k in ("idx", "val", "floor", "slices")}
+            self.loaded += 1
+        return self.cache[w]
+
+    def frames(self, t0, t1, blank):
+        """t0..t1（ASR 時間軸）のフレーム列 (idx, val, floor)。キャッシュに無いフレームは blank"""
+        parts = [self._win(w) for w, (a, b) in enumerate(self.windows) if a < t1 and b > t0]
+        sl = [(s, p) for p in parts for s in p["slices"]]
+        sl.sort(key=lambda x: x[0][0])
+        for (s0, s1, f0, f1), p in sl:  # 区間がセグメントそのもの → 初回のアラインと同じフレーム列
+            if abs(s0 - t0) <= TIME_TOL and abs(s1 - t1) <= TIME_TOL and f1 > f0:
+                f0, f1 = int(f0), int(f1)
+                return p["idx"][f0:f1], p["val"][f0:f1], p["floor"][f0:f1]
+        fs = next((float((s[1] - s[0]) / max(1, s[3] - s[2])) for s, _ in sl if s[3] > s[2]), 0.02)
+        n = max(1, int(round((t1 - t0) / fs)))
+        tc = t0 + (np.arange(n) + 0.5) * fs
+        idx = np.zeros((n, TOPK), np.uint16); idx[:, 0] = blank
+        val = np.full((n, TOPK), FLOOR_MIN, np.float16); val[:, 0] = 0.0
+        floor = np.full(n, FLOOR_MIN, np.float16)
+        for (s0, s1, f0, f1), p in sl:  # 重なる区間は後に始まるセグメントを優先
+            m = (tc >= s0) & (tc < s1)
+            if not m.any():
+                continue
+            fr = np.minimum(f0 + ((tc[m] - s0) / ((s1 - s0) / max(1, f1 - f0))).astype(int), f1 - 1).astype(int)
+            idx[m] = p["idx"][fr]; val[m] = p["val"][fr]; floor[m] = p["floor"][fr]
+        return idx, val, floor
+
+# ---------------- 再アライン ----------------
+
+def read_srt(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [(s.start.total_seconds(), s.end.total_seconds(), s.content.strip()) for s in srt.parse(f.read())]
+
+def realign(run_dir, srt_path=None, dry_run=False):
+    run_dir = Path(run_dir)
+    asr = run_dir / "asr"
+    emis = asr / "emissions"
+    if not (emis / "index.json").exists():
+        raise SystemExit(f"[realign] emission キャッシュがありません（CFG_ALIGN=ctc で処理した Run が対象）: {emis}")
+    with open(emis / "index.json", "r", encoding="utf-8") as f:
+        index = json.load(f)
+    aligned_path = (asr / "aligned.json").resolve()
+    with open(aligned_path, "r", encoding="utf-8") as f:
+        aligned = json.load(f)
+    old = index["segments"]
+    if aligned.get("align") != "ctc" or len(aligned["segments"]) != len(old):
+        raise SystemExit("[realign] aligned.json が emission キャッシュと対応していません（CFG_ALIGN=ctc で再実行してください）")
+    # 時間対応はキャッシュを作った時の keep-map。asr/keepmap.json（raw SRT の時間軸）と違えば別の処理の結果
+    if "keepmap" not in index:
+        raise SystemExit("[realign] index.json に keep-map がありません（CFG_ALIGN=ctc で再実行してください）")
+    keep = KeepMap.from_json(index["keepmap"])
+    km = None
+    if (asr / "keepmap.json").exists():
+        with open(asr / "keepmap.json", "r", encoding="utf-8") as f:
+            km = KeepMap.from_json(json.load(f)).to_json()
+    if km != keep.to_json():
+        raise SystemExit("[realign] asr/keepmap.json が emission キャッシュの keep-map と一致しません"
+                         "（CFG_ALIGN=ctc で再実行してください）")
+    cues = read_srt(srt_path or asr / "ja-JP_raw.srt")
+    vocab, blank = index["vocab"], index["blank"]
+    store = Store(emis, index["windows"])
+
+    t_start = time.perf_counter()
+    # 文字列で突き合わせ、一致ブロックでも時刻が動いたキューはやり直す
+    sm = SequenceMatcher(None, [s["text"] for s in old], [c[2] for c in cues], autojunk=False)
+    new_index, new_aligned = [], []
+    st = {"cues": len(cues), "kept": 0, "realigned": 0, "removed": 0, "realigned_sec": 0.0}
+
+    def redo(c):
+        a, b = keep.to_kept(c[0]), keep.to_kept(c[1])
+        idx, val, floor = store.frames(a, b, blank)
+        seg = align_text(c[2], lambda ids: gather(idx, val, floor, ids), a, b, vocab, blank)
+        new_index.append({"start": a, "end": b, "text": c[2]})
+        new_aligned.append(keep.map_segments([seg])[0])
+        st["realigned"] += 1; st["realigned_sec"] += b - a
+
+    for op, i1, i2, j1, j2 in sm.get_opcodes():
+        if op == "equal":
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                s, c = old[i], cues[j]
+                if (abs(keep.to_orig(s["start"], "start") - c[0]) <= TIME_TOL
+                        and abs(keep.to_orig(s["end"], "end") - c[1]) <= TIME_TOL):
+                    new_index.append(s); new_aligned.append(aligned["segments"][i]); st["kept"] += 1
+                else:
+                    redo(c)
+            continue
+        st["removed"] += max(0, (i2 - i1) - (j2 - j1))
+        for j in range(j1, j2):
+            redo(cues[j])
+    st["realigned_sec"] = round(st["realigned_sec"], 3)
+    st["windows_loaded"] = store.loaded
+    st["windows"] = len(index["windows"])
+    st["sec"] = round(time.perf_counter() - t_start, 3)
+    if not dry_run and (st["realigned"] or st["removed"]):
+        aligned["segments"] = new_aligned
+        with open(aligned_path.with_suffix(".tmp"), "w", encoding="utf-8") as f:
+            json.dump(aligned, f, ensure_ascii=False, indent=2)
+        os.replace(aligned_path.with_suffix(".tmp"), aligned_path)  # ブロブストアのリンクなら切れて通常ファイルになる
+        man = load_manifest(run_dir)
+        if man.pop(str(aligned_path.relative_to(run_dir.resolve())), None):
+            save_manifest(run_dir, man)
+        index["segments"] = new_index
+        with open(emis / "index.tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(emis / "index.tmp", emis / "index.json")
+    return st
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("realign", help="修正した raw SRT の変更キューだけ再アライン")
+    r.add_argument("run_dir")
+    r.add_argument("--srt", default=None, help="既定: RUN/asr/ja-JP_raw.srt")
+    r.add_argument("--dry-run", action="store_true")
+    s = sub.add_parser("stats")
+    s.add_argument("run_dir")
+    args = ap.parse_args()
+
+    if args.cmd == "realign":
+        st = realign(args.run_dir, args.srt, args.dry_run)
+        print(f"[realign] cues={st['cues']} kept={st['kept']} realigned={st['realigned']} removed={st['removed']} "
+              f"({st['realigned_sec']:.1f}s of audio, {st['windows_loaded']}/{st['windows']} windows loaded) "
+              f"in {st['sec']:.2f}s" + (" [dry-run]" if args.dry_run else ""))
+        if st["realigned"] or st["removed"]:
+            print("[realign] 後段は bin/full_pipeline.sh --stage post で作り直してください")
+    else:
+        emis = Path(args.run_dir) / "asr" / "emissions"
+        with open(emis / "index.json", "r", encoding="utf-8") as f:
+            index = json.load(f)
+        size = sum(p.stat().st_size for p in emis.glob("win_*.npz"))
+        print(f"[realign] segments={len(index['segments'])} windows={len(index['windows'])} "
+              f"vocab={len(index['vocab'])} topk={index['topk']} cache={size / 1e6:.1f}MB")
+
+if __name__ == "__main__":
+    main()
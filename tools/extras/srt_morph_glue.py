@@ -9,9 +9,13 @@
 - 行頭の付属語ヘッドを作らないため、結合時は改行ではなく “直結” します
 """
 
+import os
 import sys
 import srt
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # tools/
+import merge_plan
+
 SUFFIX_HEADS = (
     "ます","です","でした","ません",
     "なります","になります",
@@ -56,44 +60,10 @@ def _compose_join(a: str, b: str) -> str:
     return left + right
 
 
-def glue_once(items):
-    out = []
-    i = 0
-    changed = False
-    n = len(items)
-    while i < n:
-        cur = items[i]
-        if i < n - 1:
-            nxt = items[i + 1]
-            if should_glue(cur.content, nxt.content):
-                merged = srt.Subtitle(
-                    index=cur.index,
-                    start=cur.start,
-                    end=nxt.end,
-                    content=_compose_join(cur.content, nxt.content),
-                    proprietary=cur.proprietary,
-                )
-                # 次項にマージして、その位置で評価を続ける
-                items[i + 1] = merged
-                changed = True
-                i += 1
-                continue
-        out.append(cur)
-        i += 1
-    return out, changed
-
-
 def glue(items):
-    # 収束するまで繰り返し
-    work = list(items)
-    while True:
-        work, changed = glue_once(work)
-        if not changed:
-            break
-    # 連番ふり直し
-    for idx, sub in enumerate(work, start=1):
-        sub.index = idx
-    return work
+    # merge_plan の glue ルールセット：1パスで、旧 glue_once の収束反復と同じ結果
+    groups = merge_plan.plan(merge_plan.spans_from_subs(items), [("glue", {})])
+    return merge_plan.to_subs(groups)
 
 
 def main():
@@ -11,10 +11,11 @@
 - 付属語ヘッド（ます/です/なります…）が新ブロック頭に来ないように禁止。
 - 句読点（。！？…、）や談話標識（まず/そして/それでは/今回は/こちらは/なお/次に/また）を優先分割点に。
 - どうしても候補がない場合のみ、文字比率に応じた時間按分で分割（安全fallback）。
+  energy.npz（第4引数）があれば、按分した分割時刻を近傍の低エネルギーの谷へスナップ。
 - 2行化などの体裁は後段の srt_lint_polish.py に委譲。
 """
 
-import sys, math, re
+import os, sys, math, re
 import srt
 from datetime import timedelta
 
@@ -23,6 +24,8 @@ JA_MAX_DUR = 6.0
 JA_MIN_DUR = 1.0
 TARGET_CPS = 15.0
 CPS_SLACK = 1.3  # TARGET_CPS * 1.3 まで許容
+SNAP_TOL = 0.15  # 分割時刻のスナップ探索幅 (±sec)
+ENERGY = None    # (db, hop, frame)。main で energy.npz を読んだときのみ
 
 SUFFIX_HEADS = (
     "ます","です","でした","ません",
@@ -174,11 +177,21 @@ def split_by_bounds(sub, bounds):
     secs = [x for x in secs if x > 0.0]
     pieces = [p for p,l in zip(pieces, lens) if l>0]
 
+    # 分割時刻（内側の境界）を音声の谷へ寄せる。隣の境界を越えないよう探索幅を制限
+    cuts = []
+    if ENERGY is not None and len(secs) > 1:
+        from audio_vad import snap_to_valleys
+        acc = sub.start.total_seconds()
+        for sec in secs[:-1]:
+            acc += sec; cuts.append(acc)
+        db, hop, frame = ENERGY
+        cuts = list(snap_to_valleys(cuts, db, hop, frame, min(SNAP_TOL, min(secs) / 3), side="end"))
+
     # SRT組み立て
     out = []
     cur = start
-    for p,sec in zip(pieces, secs):
-        end = cur + timedelta(seconds=sec)
+    for k, (p, sec) in enumerate(zip(pieces, secs)):
+        end = timedelta(seconds=float(cuts[k])) if k < len(cuts) else cur + timedelta(seconds=sec)
         out.append(srt.Subtitle(index=0, start=cur, end=end, content=p))
         cur = end
     # 端数調整：最後のendを元のendに合わせる
@@ -223,12 +236,16 @@ def process(subs):
 
 def main():
     if len(sys.argv) < 3:
-        print("Usage: python tools/srt_rebalance_caps.py <in.srt> <out.srt> [max_dur_sec]")
+        print("Usage: python tools/srt_rebalance_caps.py <in.srt> <out.srt> [max_dur_sec] [energy.npz]")
         sys.exit(2)
     src, dst = sys.argv[1], sys.argv[2]
+    global JA_MAX_DUR, ENERGY
     if len(sys.argv) >= 4:
-        global JA_MAX_DUR
         JA_MAX_DUR = float(sys.argv[3])
+    if len(sys.argv) >= 5:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from audio_vad import load_energy
+        ENERGY = load_energy(sys.argv[4])
 
     with open(src, "r", encoding="utf-8") as f:
         txt = f.read()
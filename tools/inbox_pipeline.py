@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inbox のパイプライン実行（bin/inbox_run_once.sh から CFG_INBOX_PIPELINE=1 で呼ばれる）。
+
+  先読み  … ファイル N+1 以降の デコード + 16k リサンプル（tools/audio_prefetch.py → .npy）
+  ASR     … ファイル N の full_pipeline.sh --stage asr（常に1本。ASR エンジンを空けない）
+  後処理  … ファイル N-1 以前の full_pipeline.sh --stage post（分割・整形・翻訳準備）を --post-jobs 並列
+
+- 先読み済みバッファの合計は --prefetch-mb（16k float32 換算）で制限。ただし先頭1本は常に許可
+- 後処理が成功したら Done/ へ、失敗は CFG_KEEP_ON_FAIL に従う（逐次版と同じ）
+- 後処理の翻訳段は CFG_TRANSLATE_LOCK で1本ずつ（並列でも合計が CFG_TRANSLATE_RPM を超えない）
+- 最後に ASR の稼働率（ASR 実行時間 / 全体）と、先読み待ちで ASR が止まった時間を表示
+
+使い方:
+  python tools/inbox_pipeline.py Inbox/*.wav [--prefetch-mb 2048] [--post-jobs 2]
+"""
+import os, sys, time, shutil, argparse, threading, subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from audio_prefetch import prefetched_bytes
+
+ROOT = Path(__file__).resolve().parents[1]
+PYTHON = os.environ.get("PYTHON", sys.executable)
+
+class Budget:
+    """先読みバッファのバイト数上限（使用中が 0 なら上限超えでも1本は通す）"""
+    def __init__(self, cap):
+        self.cap = cap; self.used = 0
+        self.cv = threading.Condition()
+
+    def acquire(self, n):
+        with self.cv:
+            while self.used and self.used + n > self.cap:
+                self.cv.wait()
+            self.used += n
+
+    def release(self, n):
+        with self.cv:
+            self.used -= n
+            self.cv.notify_all()
+
+def workspace():
+    return Path(os.environ.get("WORKSPACE_ROOT", ROOT / "Workspace"))
+
+def run_stage(wav, stage, audio=None):
+    cmd = ["bash", str(ROOT / "bin" / "full_pipeline.sh"), "-i", str(wav), "--stage", stage]
+    if audio:
+        cmd += ["--audio", str(audio)]
+    return subprocess.run(cmd).returncode == 0
+
+def finish(wav, ok):
+    """逐次版（inbox_run_once.sh）と同じ Done/Fail の振り分け"""
+    if ok:
+        dst = workspace() / "Done"
+    elif os.environ.get("CFG_KEEP_ON_FAIL", "1") == "1":
+        print(f"[inbox] keep on fail: {wav}")
+        return
+    else:
+        dst = workspace() / "Fail"
+    dst.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(wav), str(dst / Path(wav).name))
+
+def main():
+    env = os.environ.get
+    ap = argparse.ArgumentParser()
+    ap.add_argument("wavs", nargs="+")
+    ap.add_argument("--prefetch-mb", type=float, default=float(env("CFG_PREFETCH_MB", "2048")))
+    ap.add_argument("--post-jobs", type=int, default=int(env("CFG_POST_JOBS", "0")) or max(1, (os.cpu_count() or 2) // 4))
+    ap.add_argument("--cache-dir", default=None, help="先読み .npy の置き場（既定: Workspace/Cache/prefetch）")
+    args = ap.parse_args()
+
+    wavs = [Path(w) for w in args.wavs]
+    cache = Path(args.cache_dir) if args.cache_dir else workspace() / "Cache" / "prefetch"
+    cache.mkdir(parents=True, exist_ok=True)
+    budget = Budget(int(args.prefetch_mb * 1e6))
+    sizes = []
+    for w in wavs:
+        try:
+            sizes.append(prefetched_bytes(str(w)))
+        except RuntimeError:  # 読めない音声は見積り 0（先読みも失敗し、ASR 段で失敗扱い）
+            sizes.append(0)
+    ready = [threading.Event() for _ in wavs]
+    npys = [None] * len(wavs)
+
+    def prefetcher():
+        for i, w in enumerate(wavs):
+            budget.acquire(sizes[i])
+            out = cache / f"{i:04d}_{w.stem}.npy"
+            r = subprocess.run([PYTHON, str(ROOT / "tools" / "audio_prefetch.py"), str(w), str(out)])
+            if r.returncode == 0:
+                npys[i] = out
+            else:
+                print(f"[inbox] prefetch failed (transcribe がデコードする): {w.name}")
+                budget.release(sizes[i])
+            ready[i].set()
+
+    t_start = time.time()
+    t_asr = t_wait = 0.0
+    pf = threading.Thread(target=prefetcher, daemon=True)
+    pf.start()
+    posts = []
+    with ThreadPoolExecutor(max_workers=args.post_jobs) as pool:
+        def post(w):
+            ok = run_stage(w, "post")
+            finish(w, ok)
+            return ok
+        for i, w in enumerate(wavs):
+            t0 = time.time()
+            ready[i].wait()
+            t_wait += time.time() - t0
+            print(f"[inbox] asr: {w} ({i+1}/{len(wavs)})")
+            t0 = time.time()
+            ok = run_stage(w, "asr", npys[i])
+            t_asr += time.time() - t0
+            if npys[i] is not None:
+                npys[i].unlink(missing_ok=True)
+                budget.release(sizes[i])
+            if ok:
+                posts.append(pool.submit(post, w))
+            else:
+                finish(w, False)
+            time.sleep(float(env("CFG_BATCH_SLEEP", "0")))
+        n_ok = sum(f.result() for f in posts)
+    wall = time.time() - t_start
+    print(f"[inbox] files={len(wavs)} ok={n_ok} wall={wall:.1f}s asr={t_asr:.1f}s "
+          f"busy={t_asr / max(1e-6, wall):.0%} prefetch_wait={t_wait:.1f}s post_jobs={args.post_jobs}")
+
+if __name__ == "__main__":
+    main()
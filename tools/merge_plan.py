@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+隣接ブロック結合のプランナ（repair / refine / glue 共通エンジン）。
+
+- 入力列を1回だけ走査し、結合グループを元インデックスの範囲 [lo, hi) として求める
+- 各ステージの判定はルールセット（ジェネレータ）として実装し、連結すると
+  1パスのパイプラインになる（ルールセット数に依らず O(N)）
+- 途中で Block / srt.Subtitle を作り直さず、出力は最後に1回だけ生成する
+
+ルールセット（既存ステージと同じ意味）:
+  repair  … srt_repair_fragments_ja.repair（断片の右優先結合・左結合の連鎖・短尺拡張）
+  refine  … srt_refine_ja.merge_nonfinal_blocks（非終端の近接結合）
+  glue    … extras/srt_morph_glue.glue（付属語ヘッド縫合。収束まで反復した結果と同じ）
+
+使い方:
+  python tools/merge_plan.py IN.srt -o OUT.srt --rules repair,refine,glue
+  （連結時はステージ間を SRT のミリ秒に丸める＝ファイル経由で順に実行したのと同じ）
+"""
+import argparse
+from datetime import timedelta
+import srt
+
+class Span:
+    """元列の [lo, hi) をまとめた結合グループ。st/en はルールセットの時刻型（float 秒 or timedelta）"""
+    __slots__ = ("lo", "hi", "st", "en", "text", "meta")
+    def __init__(self, lo, hi, st, en, text, meta=None):
+        self.lo = lo; self.hi = hi; self.st = st; self.en = en; self.text = text; self.meta = meta
+    @property
+    def dur(self): return self.en - self.st
+    @property
+    def chars(self): return len(self.text.replace("\n",""))
+    @property
+    def cps(self): return self.chars / max(1e-6, self.dur)
+    def __repr__(self):
+        return f"Span([{self.lo},{self.hi}) {self.st}-{self.en} {self.text!r})"
+
+# ---------------- 入出力アダプタ ----------------
+
+def spans_from_blocks(blocks):
+    return [Span(i, i+1, b.st, b.en, b.text) for i, b in enumerate(blocks)]
+
+def spans_from_subs(subs):
+    return [Span(i, i+1, s.start, s.end, s.content, s.proprietary) for i, s in enumerate(subs)]
+
+def to_blocks(spans, cls):
+    return [cls(i, s.st, s.en, s.text) for i, s in enumerate(spans, 1)]
+
+def to_subs(spans, keep_proprietary=True):
+    return [srt.Subtitle(index=i, start=s.st, end=s.en, content=s.text,
+                         proprietary=(s.meta or "") if keep_proprietary else "")
+            for i, s in enumerate(spans, 1)]
+
+def _td2s(td):
+    """timedelta → 秒（srt_repair_fragments_ja.t2s と同じ丸め）"""
+    ms_total = td // timedelta(milliseconds=1)
+    h, r = divmod(ms_total, 3600000); m, r = divmod(r, 60000); s, ms = divmod(r, 1000)
+    return int(h)*3600 + int(m)*60 + int(s) + int(ms)/1000.0
+
+def _s2td(x):
+    """秒 → timedelta（s2t の書式化と同じミリ秒丸め）"""
+    x = max(0.0, x)
+    h = int(x//3600); x -= h*3600
+    m = int(x//60);   x -= m*60
+    s = int(x);       ms = int(round((x-s)*1000))
+    if ms == 1000: s += 1; ms = 0
+    return timedelta(hours=h, minutes=m, seconds=s, milliseconds=ms)
+
+def as_seconds(spans):
+    for sp in spans:
+        if isinstance(sp.st, timedelta):
+            sp.st = _td2s(sp.st); sp.en = _td2s(sp.en)
+        yield sp
+
+def as_timedelta(spans):
+    for sp in spans:
+        if not isinstance(sp.st, timedelta):
+            sp.st = _s2td(sp.st); sp.en = _s2td(sp.en)
+        yield sp
+
+# ---------------- ルールセット ----------------
+
+def repair_rules(spans, min_dur=1.0, max_dur=6.0, low_chars=6, max_cps=19.0):
+    """
+    srt_repair_fragments_ja.repair と同じ判定。
+    左結合は直前の出力を再オープンし得るため、未確定分だけを out に保持する：
+    strip 後の文字数が断片上限を超えるグループより前は二度と再オープンされないので、そこで確定して流す
+    （結合時の strip で文字数が減り得るため、strip 前の文字数では判定しない）。
+    """
+    from srt_repair_fragments_ja import looks_fragment
+    safe = max(8, low_chars)
+    it = iter(spans)
+    nxt = next(it, None)
+    out = []
+    cur = None
+    while True:
+        if cur is None:
+            if nxt is None:
+                break
+            cur = nxt; nxt = next(it, None)
+        if looks_fragment(cur, low_chars):
+            # 右優先でマージ
+            if nxt is not None:
+                text = (cur.text+"\n"+nxt.text).strip()
+                dur = nxt.en - cur.st
+                if dur <= max_dur and len(text.replace("\n","")) / max(1e-6, dur) <= max_cps:
+                    cur.hi = nxt.hi; cur.en = nxt.en; cur.text = text
+                    nxt = next(it, None)
+                    continue
+            # 右が無理なら左と
+            if out:
+                prv = out[-1]
+                text = (prv.text+"\n"+cur.text).strip()
+                dur = cur.en - prv.st
+                if dur <= max_dur and len(text.replace("\n","")) / max(1e-6, dur) <= max_cps:
+                    out.pop()
+                    prv.hi = cur.hi; prv.en = cur.en; prv.text = text
+                    cur = prv
+                    continue
+            # どちらも無理 → 可能なら僅かに拡張
+            if nxt is not None:
+                gap = max(0.0, nxt.st - cur.en)
+                take = min(gap*0.5, max(0.0, min_dur - cur.dur))
+                if take>0: cur.en += take
+            if out:
+                gap = max(0.0, cur.st - out[-1].en)
+                take = min(gap*0.5, max(0.0, min_dur - cur.dur))
+                if take>0: cur.st -= take
+        if len(cur.text.strip().replace("\n","")) > safe and out:
+            yield from out
+            out.clear()
+        out.append(cur)
+        cur = None
+    yield from out
+
+def refine_rules(spans, merge_pause=0.35, merge_max=2):
+    """srt_refine_ja.merge_nonfinal_blocks と同じ判定（時刻は timedelta）"""
+    from srt_refine_ja import is_eos, begins_with_connective
+    it = iter(spans)
+    nxt = next(it, None)
+    while nxt is not None:
+        cur = nxt; nxt = next(it, None)
+        cur.text = cur.text.strip()
+        merged = 0
+        while (merged < merge_max) and nxt is not None and not is_eos(cur.text):
+            gap = (nxt.st - cur.en).total_seconds()
+            if gap > merge_pause:
+                break
+            if begins_with_connective(nxt.text) or not is_eos(nxt.text):
+                cur.text = (cur.text + "\n" + nxt.text.strip()).strip()
+                cur.hi = nxt.hi; cur.en = nxt.en
+                nxt = next(it, None)
+                merged += 1
+            else:
+                break
+        yield cur
+
+def glue_rules(spans):
+    """
+    extras/srt_morph_glue.glue と同じ判定。旧実装は glue_once を収束まで反復していたが、
+    結合で右グループの先頭が変わったときだけ直前グループと再判定（連鎖）すれば1パスで同じ結果になる。
+    先頭が変わり得るのは strip 後の長さがヘッド最大長未満のグループだけなので、
+    その手前までのグループは確定として流す。
+    """
+    from extras.srt_morph_glue import should_glue, _compose_join, SUFFIX_HEADS, PARTICLE_HEADS
+    head_max = max(len(h) for h in SUFFIX_HEADS + PARTICLE_HEADS)
+    out = []
+    for sp in spans:
+        out.append(sp)
+        while len(out) >= 2 and should_glue(out[-2].text, out[-1].text):
+            _absorb_glue(out[-2], out.pop(), _compose_join)
+        while len(out) >= 2 and len(out[1].text.strip()) >= head_max:
+            yield out.pop(0)
+    yield from out
+
+def _absorb_glue(left, right, join):
+    left.text = join(left.text, right.text)
+    left.hi = right.hi; left.en = right.en
+
+RULES = {
+    "repair": (repair_rules, "seconds"),
+    "refine": (refine_rules, "timedelta"),
+    "glue":   (glue_rules,   "timedelta"),
+}
+
+def plan(spans, stages):
+    """
+    stages: [(name, params_dict), ...]。入力を1パスで流し、最終グループ列を返す。
+    ステージ間の時刻型は必要に応じて変換（ミリ秒丸め）する。
+    """
+    it = iter(spans)
+    for name, params in stages:
+        fn, kind = RULES[name]
+        it = as_seconds(it) if kind == "seconds" else as_timedelta(it)
+        it = fn(it, **(params or {}))
+    return list(it)
+
+# ---------------- CLI ----------------
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("input")
+    ap.add_argument("-o", "--output", required=True)
+    ap.add_argument("--rules", default="repair,refine,glue", help="カンマ区切り（適用順）")
+    ap.add_argument("--min-dur", type=float, default=1.0)
+    ap.add_argument("--max-dur", type=float, default=6.0)
+    ap.add_argument("--low-chars", type=int, default=6)
+    ap.add_argument("--max-cps", type=float, default=19.0)
+    ap.add_argument("--merge-pause", type=float, default=0.35)
+    ap.add_argument("--merge-max", type=int, default=2)
+    args = ap.parse_args()
+
+    params = {
+        "repair": {"min_dur": args.min_dur, "max_dur": args.max_dur, "low_chars": args.low_chars, "max_cps": args.max_cps},
+        "refine": {"merge_pause": args.merge_pause, "merge_max": args.merge_max},
+        "glue": {},
+    }
+    names = [x.strip() for x in args.rules.split(",") if x.strip()]
+    with open(args.input, "r", encoding="utf-8") as f:
+        subs = list(srt.parse(f.read()))
+    groups = plan(spans_from_subs(subs), [(n, params[n]) for n in names])
+    groups = list(as_timedelta(groups))
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(srt.compose(to_subs(groups), reindex=False))
+    multi = sum(1 for g in groups if g.hi - g.lo > 1)
+    print(f"[merge_plan] rules={','.join(names)} blocks: {len(subs)} -> {len(groups)} (merged groups={multi})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+プレビュー層（CFG_PREVIEW=1。bin/full_pipeline.sh から使う）。
+
+- run     … 小さいモデル（CFG_PREVIEW_MODEL、既定 base）を greedy・アライン無しで回し、
+             通常と同じ 分割 → 修復 → 整形 を通した下書きを final/<slug>_ja.srt に置く。
+             作業は Run/preview/ の下（本番の asr/ のジャーナル・チェックポイントとは別）
+- install … 本番（大きいモデル）の結果で final/ を置き換える。同じディレクトリの一時ファイル → rename なので、
+             エディタが書きかけを読むことはない。下書きが編集されていたら <slug>_ja.draft-edited.srt として残す
+- 両層とも同じ 16k 音声（.npy、tools/audio_prefetch.py）を --audio で読む。デコードは1回
+- 各層の出力までの時間（パイプライン開始から）を preview/tiers.json とログに残す
+
+使い方:
+  python tools/preview_tier.py run --input IN.wav --run-dir RUN --slug SLUG --audio A.npy [--t0 EPOCH]
+  python tools/preview_tier.py install SRC.srt DST.srt --run-dir RUN
+"""
+import os, sys, json, time, hashlib, argparse, subprocess
+from pathlib import Path
+
+TOOLS = Path(__file__).resolve().parent
+PYTHON = os.environ.get("PYTHON", sys.executable)
+
+def sha1_file(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def load_tiers(run_dir):
+    p = Path(run_dir) / "preview" / "tiers.json"
+    if not p.exists():
+        return {}
+    with open(p, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_tiers(run_dir, tiers):
+    p = Path(run_dir) / "preview" / "tiers.json"
+    p.parent.mkdir(parents=True, exist_ok=True)
+    with open(p.with_suffix(".tmp"), "w", encoding="utf-8") as f:
+        json.dump(tiers, f, ensure_ascii=False, indent=2)
+    os.replace(p.with_suffix(".tmp"), p)
+
+def replace_atomic(src, dst):
+    dst = Path(dst)
+    tmp = dst.with_name(f".{dst.name}.tmp")
+    with open(src, "rb") as f, open(tmp, "wb") as g:
+        g.write(f.read())
+    os.replace(tmp, dst)
+
+def run(args):
+    run_dir = Path(args.run_dir)
+    pv = run_dir / "preview"
+    (pv / "asr").mkdir(parents=True, exist_ok=True)
+    t0 = args.t0 or time.time()
+    env = dict(os.environ, CFG_MODEL=args.model, CFG_BEAM_SIZE="1", CFG_BEAM_MODE="fixed", CFG_ALIGN="none",
+               CFG_LOOP_FIX="0", CFG_ASR_CACHE="0")
+    seg = pv / f"{args.slug}_ja-JP_seg.srt"
+    clean = pv / f"{args.slug}_ja_clean.srt"
+    seg_opts = []
+    if env.get("JA_MORPH_INDEX", "0") == "1":
+        seg_opts.append("--morph-index")
+    if env.get("JA_SEG_PROFILE"):
+        seg_opts += ["--profile", env["JA_SEG_PROFILE"]]
+    steps = [
+        [PYTHON, str(TOOLS / "transcribe_from_wav.py"), "--input", args.input, "--run-dir", str(pv),
+         "--slug", args.slug, *(["--audio", args.audio] if args.audio else [])],
+        [PYTHON, str(TOOLS / "segment_ja.py"), str(pv / "asr" / "aligned.json"), "-o", str(seg), *seg_opts],
+        [PYTHON, str(TOOLS / "srt_repair_fragments_ja.py"), str(seg), "-o", str(seg)],
+        [PYTHON, str(TOOLS / "srt_lint_polish.py"), str(seg), "-o", str(clean), "--energy", str(pv / "asr" / "energy.npz")],
+    ]
+    for cmd in steps:
+        r = subprocess.run(cmd, env=env)
+        if r.returncode != 0:
+            print(f"[preview] failed: {Path(cmd[1]).name} (exit {r.returncode})")
+            return r.returncode
+    dst = run_dir / "final" / f"{args.slug}_ja.srt"
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    replace_atomic(clean, dst)
+    ready = time.time() - t0
+    with open(pv / "asr" / "timing.json", "r", encoding="utf-8") as f:
+        asr_sec = json.load(f).get("asr_sec")
+    save_tiers(run_dir, {"started": t0, "preview": {"model": args.model, "beam_size": 1, "asr_sec": asr_sec,
+                                                    "ready_sec": round(ready, 3), "sha1": sha1_file(dst)}})
+    print(f"[preview] draft ({args.model}, greedy) ready in {ready:.1f}s (asr {asr_sec:.1f}s): {dst}")
+    return 0
+
+def install(args):
+    src, dst = Path(args.src), Path(args.dst)
+    tiers = load_tiers(args.run_dir) if args.run_dir else {}
+    draft = tiers.get("preview", {}).get("sha1")
+    if draft and dst.exists() and sha1_file(dst) != draft:
+        kept = dst.with_name(dst.name.replace(".srt", ".draft-edited.srt"))
+        os.replace(dst, kept)
+        print(f"[preview] 下書きが編集されていたため退避: {kept.name}")
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    replace_atomic(src, dst)
+    if tiers and "final" not in tiers:
+        tiers["preview"].pop("sha1", None)  # 置き換え済み（再実行で本番の出力を退避しない）
+        ready = time.time() - tiers["started"]
+        tiers["final"] = {"model": os.environ.get("CFG_MODEL", "large-v2"),
+                          "beam_size": int(os.environ.get("CFG_BEAM_SIZE", "5")), "ready_sec": round(ready, 3)}
+        save_tiers(args.run_dir, tiers)
+        pv = tiers["preview"]
+        print(f"[preview] final ({tiers['final']['model']}) replaced draft: time-to-output "
+              f"draft {pv['ready_sec']:.1f}s / final {ready:.1f}s (x{ready / max(1e-6, pv['ready_sec']):.1f})")
+    return 0
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="下書きを作って final/ に置く")
+    r.add_argument("--input", required=True)
+    r.add_argument("--run-dir", required=True)
+    r.add_argument("--slug", required=True)
+    r.add_argument("--audio", default=None, help="16k float32 .npy（本番と共有）")
+    r.add_argument("--model", default=os.environ.get("CFG_PREVIEW_MODEL", "base"))
+    r.add_argument("--t0", type=float, default=None, help="time-to-output の起点（epoch 秒。既定: 今）")
+    i = sub.add_parser("install", help="本番の結果で final/ を置き換える")
+    i.add_argument("src")
+    i.add_argument("dst")
+    i.add_argument("--run-dir", default=None, help="preview/tiers.json を読む Run（無ければ置き換えのみ）")
+    args = ap.parse_args()
+    sys.exit(run(args) if args.cmd == "run" else install(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run カタログ（SQLite）。full_pipeline.sh / whx が開始・各段・終了時に登録する。
+
+- runs: slug・Run ディレクトリ・入力と SHA-256（blobs.json にあればそれを使い、再ハッシュしない）・
+  モデル・設定（CFG_* / JA_* の環境変数。API キー類は除く）・状態（running/done/failed）・時刻・出力パス
+- stages: 段ごとの開始・終了・秒数（stage で前の段を閉じて次の段を開く）
+- params: 設定を key=value で展開した索引（by-param 用）
+- total_sec は各段の合計（--stage asr/post の間の待ち時間は含めない）、wall_sec は開始〜終了
+
+使い方:
+  python tools/run_catalog.py latest [-n 10] [--path]          # --path は最新 Run のディレクトリだけ
+  python tools/run_catalog.py failed [--since 30]
+  python tools/run_catalog.py slowest [-n 10] [--since 30]
+  python tools/run_catalog.py by-param CFG_MODEL=large-v2 [--since 30]
+  python tools/run_catalog.py show SLUG|ID
+  python tools/run_catalog.py scan                             # カタログ導入前の Runs/ を取り込む
+  （登録側: begin / stage / finish。bin/full_pipeline.sh を参照）
+"""
+import os, re, sys, json, time, sqlite3, argparse
+from pathlib import Path
+from blob_store import sha256_file, load_manifest
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs(
+  id        INTEGER PRIMARY KEY,
+  slug      TEXT NOT NULL,
+  run_dir   TEXT NOT NULL,
+  tool      TEXT NOT NULL,
+  input     TEXT,
+  input_sha TEXT,
+  model     TEXT,
+  config    TEXT NOT NULL DEFAULT '{}',
+  status    TEXT NOT NULL,
+  stage     TEXT,
+  started   REAL NOT NULL,
+  finished  REAL,
+  wall_sec  REAL,
+  total_sec REAL,
+  outputs   TEXT NOT NULL DEFAULT '[]',
+  error     TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started);
+CREATE INDEX IF NOT EXISTS runs_status ON runs(status, started);
+CREATE INDEX IF NOT EXISTS runs_total ON runs(total_sec);
+CREATE INDEX IF NOT EXISTS runs_slug ON runs(slug, started);
+CREATE INDEX IF NOT EXISTS runs_sha ON runs(input_sha);
+CREATE TABLE IF NOT EXISTS stages(
+  id       INTEGER PRIMARY KEY,
+  run_id   INTEGER NOT NULL,
+  name     TEXT NOT NULL,
+  started  REAL NOT NULL,
+  finished REAL,
+  sec      REAL
+);
+CREATE INDEX IF NOT EXISTS stages_run ON stages(run_id, started);
+CREATE TABLE IF NOT EXISTS params(
+  key    TEXT NOT NULL,
+  value  TEXT NOT NULL,
+  run_id INTEGER NOT NULL,
+  PRIMARY KEY(key, value, run_id)
+) WITHOUT ROWID;
+"""
+
+SECRET = re.compile(r"KEY|TOKEN|SECRET|PASSWORD", re.I)
+
+def workspace():
+    return Path(os.environ.get("WORKSPACE_ROOT", Path(__file__).resolve().parents[1] / "Workspace"))
+
+def default_db():
+    return os.environ.get("CFG_RUN_DB") or str(workspace() / "runs.sqlite")
+
+def open_catalog(path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(path, timeout=30)  # Inbox の並列後処理から同時に書く
+    con.executescript(SCHEMA)
+    return con
+
+def env_config():
+    return {k: v for k, v in sorted(os.environ.items())
+            if k.startswith(("CFG_", "JA_")) and not SECRET.search(k)}
+
+def input_sha(run_dir, inp):
+    """blob_store の manifest にあればそのハッシュ、無ければ入力をハッシュ"""
+    if not inp:
+        return None
+    digest = load_manifest(run_dir).get(f"input/{Path(inp).name}")
+    if digest:
+        return digest
+    return sha256_file(inp) if os.path.isfile(inp) else None
+
+# ---------------- 登録 ----------------
+
+def begin(con, slug, run_dir, tool, inp=None, model=None, extra=None, attach=False):
+    """run_id を返す。attach なら同じ Run の running 行を引き継ぐ（--stage post 用）"""
+    run_dir = str(Path(run_dir).resolve())
+    if attach:
+        row = con.execute("SELECT id FROM runs WHERE run_dir=? AND status='running' ORDER BY started DESC LIMIT 1",
+                          (run_dir,)).fetchone()
+        if row:
+            return row[0]
+    cfg = env_config()
+    cfg.update(extra or {})
+    model = model or cfg.get("CFG_MODEL")
+    with con:
+        rid = con.execute("INSERT INTO runs(slug, run_dir, tool, input, input_sha, model, config, status, started) "
+                          "VALUES(?,?,?,?,?,?,?,?,?)",
+                          (slug, run_dir, tool, inp, input_sha(run_dir, inp), model,
+                           json.dumps(cfg, ensure_ascii=False), "running", time.time())).lastrowid
+        con.executemany("INSERT OR IGNORE INTO params(key, value, run_id) VALUES(?,?,?)",
+                        [(k, str(v), rid) for k, v in cfg.items()] + ([("model", model, rid)] if model else []))
+    return rid
+
+def _close_stage(con, rid, now):
+    con.execute("UPDATE stages SET finished=?, sec=?-started WHERE run_id=? AND finished IS NULL", (now, now, rid))
+
+def stage(con, rid, name):
+    """開いている段を閉じて name を開く（name が "-" なら閉じるだけ）"""
+    now = time.time()
+    with con:
+        _close_stage(con, rid, now)
+        if name != "-":
+            con.execute("INSERT INTO stages(run_id, name, started) VALUES(?,?,?)", (rid, name, now))
+        con.execute("UPDATE runs SET stage=? WHERE id=?", (None if name == "-" else name, rid))
+
+def finish(con, rid, status, outputs=None, error=None):
+    now = time.time()
+    row = con.execute("SELECT run_dir, started FROM runs WHERE id=?", (rid,)).fetchone()
+    if row is None:
+        raise SystemExit(f"[catalog] no such run: {rid}")
+    run_dir, started = row
+    if not outputs:
+        outputs = sorted(str(p) for p in (Path(run_dir) / "final").glob("*") if not p.name.startswith("."))
+    with con:
+        _close_stage(con, rid, now)
+        total = con.execute("SELECT COALESCE(SUM(sec), 0) FROM stages WHERE run_id=?", (rid,)).fetchone()[0]
+        con.execute("UPDATE runs SET status=?, finished=?, wall_sec=?, total_sec=?, outputs=?, error=? WHERE id=?",
+                    (status, now, round(now - started, 3), round(total, 3),
+                     json.dumps(outputs, ensure_ascii=False), error, rid))
+
+def scan(con, runs_root):
+    """カタログに無い Run ディレクトリを登録（状態は final/ の有無で done / unknown）"""
+    known = {r[0] for r in con.execute("SELECT run_dir FROM runs")}
+    n = 0
+    with con:
+        for d in sorted(p for p in runs_root.iterdir() if p.is_dir()) if runs_root.exists() else []:
+            rd = str(d.resolve())
+            if rd in known:
+                continue
+            outs = sorted(str(p) for p in (d / "final").glob("*.srt") if not p.name.startswith("."))
+            inp = next((str(p) for p in sorted((d / "input").glob("*"))), None)
+            t = d.stat().st_mtime
+            con.execute("INSERT INTO runs(slug, run_dir, tool, input, input_sha, status, started, finished, outputs) "
+                        "VALUES(?,?,?,?,?,?,?,?,?)",
+                        (d.name, rd, "scan", inp, load_manifest(d).get(f"input/{Path(inp).name}") if inp else None,
+                         "done" if outs else "unknown", t, t, json.dumps(outs, ensure_ascii=False)))
+            n += 1
+    print(f"[catalog] scan: added={n}")
+
+# ---------------- 検索 ----------------
+
+COLS = "id, slug, tool, model, status, stage, started, wall_sec, total_sec, run_dir, outputs, error"
+
+def _rows(cur):
+    names = [c.strip() for c in COLS.split(",")]
+    out = []
+    for r in cur:
+        d = dict(zip(names, r))
+        d["outputs"] = json.loads(d["outputs"] or "[]")
+        out.append(d)
+    return out
+
+def _since(days):
+    return time.time() - days * 86400 if days else 0.0
+
+def latest(con, n=10, status=None):
+    if status:
+        return _rows(con.execute(f"SELECT {COLS} FROM runs WHERE status=? ORDER BY started DESC LIMIT ?", (status, n)))
+    return _rows(con.execute(f"SELECT {COLS} FROM runs ORDER BY started DESC LIMIT ?", (n,)))
+
+def failed(con, since_days=0, n=50):
+    return _rows(con.execute(f"SELECT {COLS} FROM runs WHERE status='failed' AND started>=? "
+                             "ORDER BY started DESC LIMIT ?", (_since(since_days), n)))
+
+def slowest(con, since_days=0, n=10):
+    return _rows(con.execute(f"SELECT {COLS} FROM runs WHERE total_sec IS NOT NULL AND started>=? "
+                             "ORDER BY total_sec DESC LIMIT ?", (_since(since_days), n)))
+
+def by_param(con, pairs, since_days=0, n=100):
+    """pairs: [(key, value)] を全て満たす Run"""
+    sql = f"SELECT {COLS} FROM runs r WHERE started>=?"
+    params = [_since(since_days)]
+    for k, v in pairs:
+        sql += " AND EXISTS(SELECT 1 FROM params p WHERE p.key=? AND p.value=? AND p.run_id=r.id)"
+        params += [k, v]
+    return _rows(con.execute(sql + " ORDER BY started DESC LIMIT ?", params + [n]))
+
+def show(con, ref):
+    row = con.execute("SELECT id FROM runs WHERE id=? OR slug=? ORDER BY started DESC LIMIT 1",
+                      (int(ref) if ref.isdigit() else -1, ref)).fetchone()
+    if row is None:
+        raise SystemExit(f"[catalog] no such run: {ref}")
+    run = _rows(con.execute(f"SELECT {COLS} FROM runs WHERE id=?", (row[0],)))[0]
+    cfg, sha, inp = con.execute("SELECT config, input_sha, input FROM runs WHERE id=?", (row[0],)).fetchone()
+    run.update(input=inp, input_sha=sha, config=json.loads(cfg))
+    run["stages"] = [{"name": a, "started": b, "sec": c} for a, b, c in
+                     con.execute("SELECT name, started, sec FROM stages WHERE run_id=? ORDER BY started", (row[0],))]
+    return run
+
+def fmt_row(r):
+    ts = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["started"]))
+    sec = f"{r['total_sec']:.0f}s" if r["total_sec"] is not None else "-"
+    st = r["status"] + (f"@{r['stage']}" if r["status"] == "running" and r["stage"] else "")
+    return f"{r['id']}\t{ts}\t{st}\t{sec}\t{r['model'] or '-'}\t{r['slug']}"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=default_db())
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("begin", help="Run を登録して run_id を表示")
+    b.add_argument("--slug", required=True)
+    b.add_argument("--run-dir", required=True)
+    b.add_argument("--tool", required=True)
+    b.add_argument("--input", default=None)
+    b.add_argument("--model", default=None)
+    b.add_argument("--param", action="append", default=[], help="追加の設定 KEY=VALUE")
+    b.add_argument("--attach", action="store_true", help="同じ Run の running 行があれば引き継ぐ")
+    s = sub.add_parser("stage")
+    s.add_argument("run_id", type=int)
+    s.add_argument("name", help='"-" は開いている段を閉じるだけ')
+    f = sub.add_parser("finish")
+    f.add_argument("run_id", type=int)
+    f.add_argument("--status", choices=("done", "failed"), default="done")
+    f.add_argument("--output", action="append", default=[], help="既定: RUN_DIR/final/*")
+    f.add_argument("--error", default=None)
+    for name in ("latest", "failed", "slowest", "by-param"):
+        q = sub.add_parser(name)
+        if name == "by-param":
+            q.add_argument("pairs", nargs="+", metavar="KEY=VALUE")
+        if name == "latest":
+            q.add_argument("--status", default=None)
+            q.add_argument("--path", action="store_true", help="最新 Run のディレクトリだけ表示")
+        else:
+            q.add_argument("--since", type=float, default=0, help="直近 N 日（0=全期間）")
+        q.add_argument("-n", type=int, default=None)
+        q.add_argument("--json", action="store_true")
+    sh = sub.add_parser("show")
+    sh.add_argument("ref")
+    sub.add_parser("scan")
+    args = ap.parse_args()
+
+    con = open_catalog(args.db)
+    if args.cmd == "begin":
+        extra = dict(p.split("=", 1) for p in args.param)
+        print(begin(con, args.slug, args.run_dir, args.tool, args.input, args.model, extra, args.attach))
+    elif args.cmd == "stage":
+        stage(con, args.run_id, args.name)
+    elif args.cmd == "finish":
+        finish(con, args.run_id, args.status, args.output, args.error)
+    elif args.cmd == "show":
+        json.dump(show(con, args.ref), sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    elif args.cmd == "scan":
+        scan(con, workspace() / "Runs")
+    else:
+        if args.cmd == "latest":
+            rows = latest(con, args.n or (1 if args.path else 10), args.status)
+            if args.path:
+                if not rows:
+                    sys.exit(1)
+                print(rows[0]["run_dir"])
+                return
+        elif args.cmd == "failed":
+            rows = failed(con, args.since, args.n or 50)
+        elif args.cmd == "slowest":
+            rows = slowest(con, args.since, args.n or 10)
+        else:
+            pairs = [tuple(p.split("=", 1)) for p in args.pairs]
+            if any(len(p) != 2 for p in pairs):
+                raise SystemExit("[catalog] by-param は KEY=VALUE で指定してください")
+            rows = by_param(con, pairs, args.since, args.n or 100)
+        if args.json:
+            json.dump(rows, sys.stdout, ensure_ascii=False, indent=2)
+            print()
+        else:
+            for r in rows:
+                print(fmt_row(r))
+
+if __name__ == "__main__":
+    main()
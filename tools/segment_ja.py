@@ -1,7 +1,9 @@
 # /Users/sato/Scripts/Whisper/tools/segment_ja.py
 # v2.2: 禁則カット（ます/です/でした/になります等、数詞+単位）を導入。
 #       min_dur未満しか作れないときは切らずに窓を伸ばす（フェイルセーフ）。
-import json, re, sys, argparse
+# v2.3: --morph-index（Sudachi 形態素境界を WhisperX トークン境界へ写像した索引、aligned.json 隣にキャッシュ）
+# v2.4: --profile（segment_sweep.py の最良設定を既定値として読む。morph_index も含む）
+import os, json, re, sys, hashlib, argparse
 from dataclasses import dataclass
 
 SENT_PUNCTS = "。！？"
@@ -48,6 +50,14 @@ def join_txt(toks, i, j):
 
 def cps_len(txt): return len(txt.replace("\n",""))
 
+def prefix_index(toks):
+    """連結テキストと累積の文字位置・改行数（toks[i:j] の文字列・cps_len を O(1) で引く）"""
+    text = "".join(t.t for t in toks)
+    off=[0]; nl=[0]
+    for t in toks:
+        off.append(off[-1] + len(t.t)); nl.append(nl[-1] + t.t.count("\n"))
+    return text, off, nl
+
 def forbidden_boundary(left_txt: str, right_txt: str) -> bool:
     """
     左の末尾と右の先頭で、禁則（語尾/数詞+単位 等）に該当するかを判定
@@ -73,19 +83,118 @@ def forbidden_boundary(left_txt: str, right_txt: str) -> bool:
 
     return False
 
-def segment(toks, min_dur, max_dur, pause_strong, pause_weak, target_cps, max_chars):
+# ---------------- 形態素境界インデックス（任意: Sudachi） ----------------
+# legal[k] … toks[k-1] と toks[k] の間で切ってよいか（k=0 は未使用）
+# pos[k]   … toks[k] の先頭文字を含む形態素の品詞大分類（境界でなければ ""）
+
+MORPH_INDEX_VERSION = 1
+# 右側がこの品詞で始まる境界は「語尾・付属」なので切らない（ます|です・数詞|単位 など）
+NO_CUT_BEFORE_POS = ("助動詞", "接尾辞")
+# 左側がこの品詞で終わる境界も切らない（第|2 など）
+NO_CUT_AFTER_POS = ("接頭辞",)
+SUDACHI_MAX_BYTES = 40000  # Sudachi の入力長上限（約 49KB）に余裕を持たせる
+
+def _sudachi_tokenizer():
+    try:
+        from sudachipy import dictionary, tokenizer as sudachi_tokenizer
+    except Exception:
+        return None, None
+    try:
+        tk = dictionary.Dictionary(config_path=os.environ.get("SUDACHI_CONFIG_PATH")).create()
+    except Exception as e:
+        print(f"[segment_ja] sudachi init failed: {e}")
+        return None, None
+    return tk, sudachi_tokenizer.Tokenizer.SplitMode.C
+
+def _text_batches(text):
+    """Sudachi の入力上限を超えないよう、句点で区切った (開始offset, 部分文字列) を返す"""
+    out = []; start = 0
+    while start < len(text):
+        end = len(text)
+        if len(text[start:].encode("utf-8")) > SUDACHI_MAX_BYTES:
+            # 文字数で概算し、直前の句点まで戻す
+            end = start + SUDACHI_MAX_BYTES // 3
+            cut = max(text.rfind(p, start, end) for p in SENT_PUNCTS)
+            if cut > start:
+                end = cut + 1
+        out.append((start, text[start:end]))
+        start = end
+    return out
+
+def build_morph_index(toks):
+    """全トークンを連結して Sudachi で一括解析し、形態素境界と品詞をトークン index に写像する。
+    Sudachi が無ければ None。"""
+    tk, mode = _sudachi_tokenizer()
+    if tk is None:
+        return None
+    text = "".join(t.t for t in toks)
+    # 文字 offset → 形態素の品詞（境界の位置にだけ入れる）
+    head_pos = {}; tail_pos = {}
+    for base, part in _text_batches(text):
+        for m in tk.tokenize(part, mode):
+            b, e = base + m.begin(), base + m.end()
+            head_pos[b] = m.part_of_speech()[0]
+            tail_pos[e] = m.part_of_speech()[0]
+    N = len(toks)
+    legal = [False] * N; pos = [""] * N
+    off = 0
+    for k, t in enumerate(toks):
+        if off in head_pos:
+            pos[k] = head_pos[off]
+            if k > 0:
+                legal[k] = (head_pos[off] not in NO_CUT_BEFORE_POS
+                            and tail_pos.get(off) not in NO_CUT_AFTER_POS)
+        off += len(t.t)
+    return {"legal": legal, "pos": pos}
+
+def _index_key(toks):
+    h = hashlib.sha1()
+    for t in toks:
+        h.update(t.t.encode("utf-8")); h.update(b"\0")
+    return f"v{MORPH_INDEX_VERSION}:{len(toks)}:{h.hexdigest()}"
+
+def morph_index_path(aligned_json):
+    base = aligned_json[:-5] if aligned_json.endswith(".json") else aligned_json
+    return base + ".morph.json"
+
+def load_or_build_morph_index(aligned_json, toks):
+    """aligned.json 隣のキャッシュ（トークン列のハッシュで照合）を使い、無ければ作る"""
+    path = morph_index_path(aligned_json)
+    key = _index_key(toks)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                js = json.load(f)
+            if js.get("key") == key:
+                return {"legal": [c == "1" for c in js["legal"]], "pos": js["pos"]}
+        except Exception as e:
+            print(f"[segment_ja] morph index cache ignored: {e}")
+    idx = build_morph_index(toks)
+    if idx is None:
+        return None
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "legal": "".join("1" if x else "0" for x in idx["legal"]),
+                   "pos": idx["pos"]}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return idx
+
+def segment(toks, min_dur, max_dur, pause_strong, pause_weak, target_cps, max_chars, legal=None):
+    """legal を渡すと禁則判定を形態素境界インデックスの O(1) 参照に置き換える"""
     N=len(toks); out=[]
+    text, off, nl = prefix_index(toks)
+    span = lambda a, b: (off[b]-off[a]) - (nl[b]-nl[a])  # cps_len(join_txt(toks, a, b))
     i=0
     while i < N:
         j=i+1
         while j <= N:
-            txt = join_txt(toks, i, j)
+            n_chars = span(i, j)
             dur = toks[j-1].en - toks[i].st
             need_cut = False
             if dur >= max_dur: need_cut = True
-            if cps_len(txt) > max_chars: need_cut = True
+            if n_chars > max_chars: need_cut = True
             # 強ポーズ（ある程度の長さがあるときのみ）
-            if dur >= min_dur and gap_after(toks, j-1) >= pause_strong and cps_len(txt) >= max(10, max_chars//3):
+            if dur >= min_dur and gap_after(toks, j-1) >= pause_strong and n_chars >= max(10, max_chars//3):
                 need_cut = True
 
             if not need_cut and j < N:
@@ -96,11 +205,12 @@ def segment(toks, min_dur, max_dur, pause_strong, pause_weak, target_cps, max_ch
             k0, k1 = i+1, j  # 先頭直後の極端な早切りは抑制（i+1から）
             for k in range(k0, k1):
                 prev = toks[k-1]; cur = toks[k]
-                left_txt  = join_txt(toks, i, k)
-                right_txt = join_txt(toks, k, j)
-
                 # 禁則：ここでは絶対に切らない
-                if forbidden_boundary(left_txt, right_txt):
+                if legal is not None:
+                    if not legal[k]:
+                        continue
+                # 禁則は境界の前後数文字しか見ないので、その分だけ切り出す
+                elif forbidden_boundary(text[max(off[i], off[k]-2):off[k]], text[off[k]:min(off[j], off[k]+1)]):
                     continue
 
                 g = max(0.0, cur.st - prev.en)
@@ -108,15 +218,17 @@ def segment(toks, min_dur, max_dur, pause_strong, pause_weak, target_cps, max_ch
                 if d < min_dur - 1e-6:
                     continue  # min_dur未満は候補外
 
+                last = text[off[k]-1] if off[k] > off[i] else ""
                 bonus = 0.0
-                if len(left_txt)>0 and (left_txt[-1] in SENT_PUNCTS): bonus -= 0.6
-                elif len(left_txt)>0 and (left_txt[-1] in WEAK_PUNCTS): bonus -= 0.3
+                if last and (last in SENT_PUNCTS): bonus -= 0.6
+                elif last and (last in WEAK_PUNCTS): bonus -= 0.3
                 if g >= pause_strong: bonus -= 0.5
                 elif g >= pause_weak: bonus -= 0.2
 
-                cps = cps_len(left_txt) / max(1e-6, d)
+                n_left = span(i, k)
+                cps = n_left / max(1e-6, d)
                 cps_cost = abs(cps - target_cps)*0.02
-                len_cost = abs(cps_len(left_txt) - max_chars*0.6)*0.005
+                len_cost = abs(n_left - max_chars*0.6)*0.005
                 score = cps_cost + len_cost + bonus
                 if score < best_score:
                     best_score = score; best_pos = k
@@ -128,7 +240,7 @@ def segment(toks, min_dur, max_dur, pause_strong, pause_weak, target_cps, max_ch
                 else:
                     best_pos = j  # 末端
 
-            out.append((toks[i].st, toks[best_pos-1].en, join_txt(toks, i, best_pos)))
+            out.append((toks[i].st, toks[best_pos-1].en, text[off[i]:off[best_pos]]))
             i = best_pos
             break
     return out
@@ -156,12 +268,32 @@ def main():
     ap.add_argument("--pause-weak",   type=float, default=0.25)
     ap.add_argument("--target-cps",   type=float, default=15.0)
     ap.add_argument("--max-chars",    type=int,   default=40)
+    ap.add_argument("--morph-index", action="store_true",
+                    help="Sudachi の形態素境界で禁則判定（aligned.morph.json にキャッシュ）")
+    ap.add_argument("--no-morph-index", dest="morph_index", action="store_false",
+                    help="プロファイルの morph_index を使わない")
+    ap.add_argument("--profile", default=None,
+                    help="segment_sweep.py が書いたプロファイル JSON（明示したオプションが優先）")
+    pre, _ = ap.parse_known_args()
+    if pre.profile:
+        with open(pre.profile, "r", encoding="utf-8") as f:
+            prof = json.load(f)
+        # スイープは morph_index の有無で計測しているので、その条件も既定値にする
+        ap.set_defaults(**prof["params"], morph_index=bool(prof.get("morph_index", False)))
     args=ap.parse_args()
 
     toks = load_aligned(args.aligned_json)
+    legal = None
+    if args.morph_index:
+        idx = load_or_build_morph_index(args.aligned_json, toks)
+        if idx is None:
+            print("[segment_ja] sudachi が無いため 2/3-gram 禁則で続行")
+        else:
+            legal = idx["legal"]
+            print(f"[segment_ja] morph index: tokens={len(toks)} legal_cuts={sum(legal)}")
     blocks = segment(toks, args.min_dur, args.max_dur,
                      args.pause_strong, args.pause_weak,
-                     args.target_cps, args.max_chars)
+                     args.target_cps, args.max_chars, legal=legal)
     write_srt(args.output, blocks)
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+segment_ja のパラメータ掃引（並列）。
+
+- aligned.json は最初に1回だけ読み、トークン配列（開始/終了/文字列）をワーカー初期化時に渡す
+  （タスクごとには送らない。タスクはパラメータの組だけ）
+- 格子の各点で segment() を実行し、srt_qc.cue_arrays / violations で採点
+    score = Σ 重み × 違反率（unterminated / cps_cap / min_dur / max_dur / long_line）
+- 順位表を表示し、最良設定をプロファイル JSON に保存（segment_ja.py --profile で読める）
+
+使い方:
+  python tools/segment_sweep.py Workspace/Runs/*/asr/aligned.json \\
+      --pause-strong 0.3,0.35,0.45 --pause-weak 0.2,0.25 --target-cps 13,15,17 \\
+      --max-chars 36,40 --max-dur 5,6,7 [--jobs 8] [--profile config/segment_profiles/default.json]
+"""
+import os, json, time, argparse, itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from segment_ja import Tok, load_aligned, segment, load_or_build_morph_index
+from srt_qc import cue_arrays, violations
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AXES = ("pause_strong", "pause_weak", "target_cps", "max_chars", "max_dur")
+WEIGHTS = {"unterminated": 1.0, "cps_cap": 1.0, "min_dur": 0.5, "max_dur": 0.5, "long_line": 0.2}
+
+# ---------------- ワーカー ----------------
+_FILES = None  # [(toks, legal)]（ワーカーごとに1回だけ構築）
+
+def _init(arrays, min_dur):
+    global _FILES, _MIN_DUR
+    _MIN_DUR = min_dur
+    _FILES = []
+    for st, en, text, off, legal in arrays:
+        toks = [Tok(text[off[k]:off[k+1]], float(st[k]), float(en[k])) for k in range(len(st))]
+        _FILES.append((toks, legal))
+
+def _run(params):
+    t0 = time.perf_counter()
+    st, en, texts, fid = [], [], [], []
+    for f, (toks, legal) in enumerate(_FILES):
+        for a, b, txt in segment(toks, _MIN_DUR, params["max_dur"], params["pause_strong"], params["pause_weak"],
+                                 params["target_cps"], params["max_chars"], legal=legal):
+            st.append(a); en.append(b); texts.append(txt); fid.append(f)
+    a = cue_arrays(np.array(st, dtype=np.float64), np.array(en, dtype=np.float64), texts, fid)
+    v = violations(a, max_cps=params["max_cps"], min_dur=_MIN_DUR, max_dur=params["max_dur"],
+                   max_line=params["max_chars"])
+    n = max(1, len(texts))
+    rates = {k: float(v[k].sum()) / n for k in WEIGHTS}
+    return {"params": params, "cues": len(texts), "rates": rates,
+            "mean_chars": float(a["chars"].mean()) if len(texts) else 0.0,
+            "sec": time.perf_counter() - t0}
+
+# ---------------- 本体 ----------------
+
+def pack(path, use_morph):
+    """1ファイル分のトークンを配列に（プロセス間で送るのは初期化時の1回だけ）"""
+    toks = load_aligned(path)
+    off = np.zeros(len(toks) + 1, dtype=np.int64)
+    off[1:] = np.cumsum([len(t.t) for t in toks])
+    legal = None
+    if use_morph:
+        idx = load_or_build_morph_index(path, toks)
+        legal = idx["legal"] if idx else None
+    return (np.array([t.st for t in toks]), np.array([t.en for t in toks]),
+            "".join(t.t for t in toks), off, legal)
+
+def floats(s): return [float(x) for x in s.split(",") if x.strip()]
+def ints(s): return [int(x) for x in s.split(",") if x.strip()]
+
+def score(r, weights):
+    return sum(w * r["rates"][k] for k, w in weights.items())
+
+def main():
+    env = os.environ.get
+    ap = argparse.ArgumentParser()
+    ap.add_argument("aligned_json", nargs="+")
+    ap.add_argument("--pause-strong", type=floats, default=[float(env("JA_PAUSE_STRONG", "0.35"))])
+    ap.add_argument("--pause-weak", type=floats, default=[float(env("JA_PAUSE_WEAK", "0.25"))])
+    ap.add_argument("--target-cps", type=floats, default=[float(env("JA_TARGET_CPS", "15.0"))])
+    ap.add_argument("--max-chars", type=ints, default=[int(env("JA_MAX_CHARS", "40"))])
+    ap.add_argument("--max-dur", type=floats, default=[float(env("JA_MAX_DUR", "6.0"))])
+    ap.add_argument("--min-dur", type=float, default=float(env("JA_MIN_DUR", "1.0")))
+    ap.add_argument("--max-cps", type=float, default=19.0, help="cps_cap 違反の閾値（srt_qc と同じ既定）")
+    ap.add_argument("--weights", default=None, help="例: unterminated=2,cps_cap=1,min_dur=0.5")
+    ap.add_argument("--morph-index", action="store_true", help="segment_ja --morph-index と同じ禁則判定")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--csv", default=None)
+    ap.add_argument("--profile", default=None, help="最良設定の保存先（既定: config/segment_profiles/best.json）")
+    args = ap.parse_args()
+
+    weights = dict(WEIGHTS)
+    if args.weights:
+        for kv in args.weights.split(","):
+            k, v = kv.split("=")
+            if k not in WEIGHTS:
+                raise SystemExit(f"[sweep] 未知の指標: {k}（{', '.join(WEIGHTS)}）")
+            weights[k] = float(v)
+
+    t0 = time.perf_counter()
+    arrays = [pack(p, args.morph_index) for p in args.aligned_json]
+    n_tok = sum(len(a[0]) for a in arrays)
+    grid = [dict(zip(AXES, vals), max_cps=args.max_cps)
+            for vals in itertools.product(args.pause_strong, args.pause_weak, args.target_cps,
+                                          args.max_chars, args.max_dur)
+            if vals[1] <= vals[0]]  # 弱ポーズ <= 強ポーズ
+    if not grid:
+        raise SystemExit("[sweep] 有効な組み合わせがありません")
+    print(f"[sweep] files={len(arrays)} tokens={n_tok} grid={len(grid)} jobs={args.jobs} "
+          f"(load {time.perf_counter() - t0:.1f}s)")
+
+    t1 = time.perf_counter()
+    if args.jobs <= 1:
+        _init(arrays, args.min_dur)
+        results = [_run(p) for p in grid]
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init, initargs=(arrays, args.min_dur)) as ex:
+            results = list(ex.map(_run, grid, chunksize=max(1, len(grid) // (args.jobs * 4))))
+    for r in results:
+        r["score"] = score(r, weights)
+    results.sort(key=lambda r: (r["score"], r["cues"]))
+    print(f"[sweep] {len(grid)} configs in {time.perf_counter() - t1:.1f}s")
+
+    hdr = f"{'rank':>4} {'score':>7} {'cues':>6} {'chars':>5}  " + " ".join(f"{a:>12}" for a in AXES) + \
+          "  " + " ".join(f"{k:>12}" for k in WEIGHTS)
+    print(hdr)
+    for i, r in enumerate(results[:args.top], 1):
+        p = r["params"]
+        print(f"{i:4d} {r['score']:7.4f} {r['cues']:6d} {r['mean_chars']:5.1f}  " +
+              " ".join(f"{p[a]:12g}" for a in AXES) + "  " +
+              " ".join(f"{r['rates'][k]:12.2%}" for k in WEIGHTS))
+    if args.csv:
+        with open(args.csv, "w", encoding="utf-8") as f:
+            f.write(",".join(["rank", "score", "cues", "mean_chars", *AXES, *WEIGHTS]) + "\n")
+            for i, r in enumerate(results, 1):
+                f.write(",".join(str(x) for x in [i, round(r["score"], 6), r["cues"], round(r["mean_chars"], 2),
+                                                  *(r["params"][a] for a in AXES),
+                                                  *(round(r["rates"][k], 6) for k in WEIGHTS)]) + "\n")
+
+    best = results[0]
+    out = args.profile or os.path.join(ROOT, "config", "segment_profiles", "best.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"params": {**{a: best["params"][a] for a in AXES}, "min_dur": args.min_dur},
+                   "score": round(best["score"], 6), "cues": best["cues"], "rates": best["rates"],
+                   "weights": weights, "morph_index": args.morph_index, "sources": args.aligned_json,
+                   "created": time.strftime("%Y-%m-%d %H:%M:%S")}, f, ensure_ascii=False, indent=2)
+    print(f"[sweep] best -> {out}")
+
+if __name__ == "__main__":
+    main()
@@ -18,17 +18,30 @@ def main():
     size = max(1, int(args.chunk_size))
     chunks = [subs[i:i+size] for i in range(0, n, size)]
 
+    # 内容が変わった JA チャンクの EN は古い翻訳なので消す（translate / TM / 手動翻訳は EN の有無で済みを判断する）
+    stale = 0
     for ci, chunk in enumerate(chunks, 1):
         out = Path(args.dir) / f"JA_{ci:03d}.srt"
+        text = srt.compose(chunk)
+        old = out.read_text(encoding="utf-8") if out.exists() else None
+        en = Path(args.dir) / f"EN_{ci:03d}.srt"
+        if old != text and en.exists():
+            en.unlink(); stale += 1
         with open(out, "w", encoding="utf-8") as f:
-            f.write(srt.compose(chunk))
+            f.write(text)
+    # チャンク数が減った場合の余り
+    for p in list(Path(args.dir).glob("JA_*.srt")) + list(Path(args.dir).glob("EN_*.srt")):
+        num = p.stem.split("_", 1)[1]
+        if num.isdigit() and int(num) > len(chunks):
+            p.unlink()
+            stale += p.name.startswith("EN_")
     # 翻訳プロンプトもコピー
     root = Path(__file__).resolve().parents[1]
     tpl = root / "templates" / "chatgpt_prompt_translation_ja_to_en.txt"
     if tpl.exists():
         shutil.copy2(tpl, Path(args.dir) / tpl.name)
 
-    print(f"[chunker] wrote {len(chunks)} chunks to {args.dir}")
+    print(f"[chunker] wrote {len(chunks)} chunks to {args.dir}" + (f" (removed {stale} stale EN)" if stale else ""))
 
 if __name__ == "__main__":
     main()
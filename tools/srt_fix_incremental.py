@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+手修正した SRT の差分だけを再整形する（whx fix の増分版）。
+
+- 直前のパイプライン出力（ベース: 隣の .<name>.base）と編集後の SRT を比較し、変わったキュー範囲を求める
+- 各範囲を前後の長いポーズ（--pause 秒以上）まで広げ、その範囲だけ
+  polish → refine → polish（whx fix と同じパラメータ）をプロセス内で実行して差し戻す
+- 範囲外のキューは一切変更しない。再整形したキュー数を表示
+
+使い方:
+  python tools/srt_fix_incremental.py EDITED.srt --base .EDITED.srt.base -o OUT.srt [--no-merge]
+"""
+import os, argparse
+from difflib import SequenceMatcher
+from srt_lint_polish import read_srt, write_srt, polish, Block
+from srt_refine_ja import refine
+import merge_plan
+
+# whx fix の2回の polish と同じ設定
+PASS1 = dict(lead_in=0.12, lead_out=0.18, hysteresis=0.06, min_dur=1.0, max_cps=17.0, max_chars=42)
+PASS2 = dict(lead_in=0.15, lead_out=0.22, hysteresis=0.06, min_dur=1.0, max_cps=17.0, max_chars=42)
+
+def base_path(path):
+    d, n = os.path.split(path)
+    return os.path.join(d, f".{n}.base")
+
+def _key(b):
+    return (round(b.st, 3), round(b.en, 3), b.text)
+
+def dirty_ranges(base, edited):
+    """edited 側の変更キュー範囲 [(a, b)]。削除だけの箇所は前後1キューを対象にする"""
+    sm = SequenceMatcher(None, [_key(b) for b in base], [_key(b) for b in edited], autojunk=False)
+    out = []
+    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+        if tag == "equal":
+            continue
+        a, b = (j1, j2) if j2 > j1 else (max(0, j1 - 1), min(len(edited), j1 + 1))
+        if b > a:
+            out.append((a, b))
+    return out
+
+def expand(ranges, blocks, pause):
+    """前後の長いポーズ（次キュー開始 - 前キュー終了 >= pause）まで広げ、重なる範囲を結合"""
+    N = len(blocks)
+    out = []
+    for a, b in ranges:
+        while a > 0 and blocks[a].st - blocks[a-1].en < pause:
+            a -= 1
+        while b < N and blocks[b].st - blocks[b-1].en < pause:
+            b += 1
+        if out and a <= out[-1][1]:
+            out[-1] = (out[-1][0], max(out[-1][1], b))
+        else:
+            out.append((a, b))
+    return out
+
+def reprocess(blocks, merge=True, merge_pause=0.35, merge_max=2):
+    """whx fix の連鎖（ステージ間はファイル経由と同じくミリ秒に丸める）"""
+    p1 = polish(blocks, **PASS1)
+    subs = merge_plan.to_subs(merge_plan.as_timedelta(merge_plan.spans_from_blocks(p1)), keep_proprietary=False)
+    subs, _ = refine(subs, merge=merge, merge_pause=merge_pause, merge_max=merge_max)
+    mid = merge_plan.to_blocks(merge_plan.as_seconds(merge_plan.spans_from_subs(subs)), Block)
+    for b in mid:
+        b.text = b.text.strip()
+    return polish(mid, **PASS2)
+
+def fix(base, edited, pause=1.0, merge=True):
+    """(出力ブロック, 再整形した範囲 [(a, b)])"""
+    ranges = expand(dirty_ranges(base, edited), edited, pause)
+    out = []; pos = 0
+    hyst = PASS2["hysteresis"]
+    for a, b in ranges:
+        out.extend(edited[pos:a])
+        part = reprocess(edited[a:b], merge=merge)
+        # リードイン/アウトで範囲外の隣接キューに重ならないように
+        if part and a > 0:
+            part[0].st = max(part[0].st, edited[a-1].en + hyst)
+        if part and b < len(edited):
+            part[-1].en = min(part[-1].en, edited[b].st - hyst)
+        out.extend(part)
+        pos = b
+    out.extend(edited[pos:])
+    return out, ranges
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("input", help="手修正後の SRT")
+    ap.add_argument("--base", default=None, help="直前のパイプライン出力（既定: 隣の .<name>.base）")
+    ap.add_argument("-o", "--output", required=True)
+    ap.add_argument("--pause", type=float, default=1.0, help="範囲を区切る長いポーズ (sec)")
+    ap.add_argument("--no-merge", action="store_true", help="refine の結合を行わない")
+    args = ap.parse_args()
+
+    bp = args.base or base_path(args.input)
+    if not os.path.exists(bp):
+        raise SystemExit(f"[fix] ベースがありません: {bp}")
+    base = read_srt(bp); edited = read_srt(args.input)
+    out, ranges = fix(base, edited, pause=args.pause, merge=not args.no_merge)
+    write_srt(args.output, out)
+    n = sum(b - a for a, b in ranges)
+    print(f"[fix] reprocessed {n}/{len(edited)} cues in {len(ranges)} ranges -> {len(out)} cues: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ def main():
     ap.add_argument("--en-dir", required=True, help="chunks_ja dir (expects EN_*.srt)")
     ap.add_argument("--report", required=True)
     ap.add_argument("--out", required=True)
+    ap.add_argument("--tm", default=None, help="翻訳メモリ DB（指定時は JA/EN ペアを登録）")
     args = ap.parse_args()
 
     ja = read_srt(args.ja)
@@ -57,6 +58,17 @@ def main():
         for p in en_paths:
             f.write(f" - {os.path.basename(p)}\n")
 
+    # 翻訳メモリへ登録（行数一致時のみ。欠け/余剰があると対応がずれるため）
+    if args.tm and en_paths:
+        import srt_tm
+        con = srt_tm.open_tm(args.tm)
+        if len(en) == len(ja):
+            n = srt_tm.add_subs(con, ja, en, source=os.path.basename(args.ja))
+            print(f"[join_and_check] tm: added/updated {n} pairs -> {args.tm}")
+        else:
+            print(f"[join_and_check] tm: skip (JA={len(ja)} EN={len(en)})")
+        con.close()
+
     print(f"[join_and_check] wrote: {args.out}")
 
 if __name__ == "__main__":
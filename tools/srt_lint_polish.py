@@ -1,6 +1,7 @@
 # /Users/sato/Scripts/Whisper/tools/srt_lint_polish.py
 # v2.2: v2.1の最小尺再保証に加え、2行折返しの安全整形（禁則に配慮）を実装。
-import re, sys, argparse
+# v2.3: --energy（asr/energy.npz）で開始/終了を近傍の低エネルギーの谷へスナップ。
+import os, re, sys, argparse
 from dataclasses import dataclass
 
 TIMECODE = re.compile(r"(\d\d):(\d\d):(\d\d),(\d\d\d)\s*-->\s*(\d\d):(\d\d):(\d\d),(\d\d\d)")
@@ -56,121 +57,152 @@ def write_srt(path, blocks):
         for i,b in enumerate(blocks,1):
             f.write(f"{i}\n{s2t(b.st)} --> {s2t(b.en)}\n{b.text}\n\n")
 
+PUNCT_RE = re.compile(f"[{re.escape(SENT_PUNCTS + WEAK_PUNCTS)}]")
+KIND_W = {0:0.0, 1:0.5, 2:1.0}
+
+def _bad_break(raw: str, pos: int) -> bool:
+    """禁則：直前直後の2-gramをチェック（break は pos の前で改行）"""
+    a = raw[pos-1]; b = raw[pos]
+    if (a+b) in FORBIDDEN_SPLIT_2: return True
+    if a.isdigit() and b in NUM_UNITS_HEAD: return True
+    if a == "第" and b.isdigit(): return True
+    if a == "翌" and b == "日":   return True
+    return False
+
 def wrap_ja(text: str, max_chars:int=40) -> str:
     """
     2行までの安全折返し。句読点優先・禁則回避。
     既存改行は無視して一旦結合→安全な位置で再分割。
+    候補は「句読点位置（正規表現で一括抽出）」と「中央から外側へ探索した最初の安全位置」のみを評価する。
+    （全文字位置を列挙していた旧実装と同じ位置を選ぶ：同点は句読点→左側の順で優先）
     """
     raw = text.replace("\n","").strip()
-    if len(raw) <= max_chars: return raw  # 1行でOK
-
-    # 候補点を列挙（句読点を強く優先）
-    candidates = []
-    for i,ch in enumerate(raw):
-        if ch in SENT_PUNCTS: candidates.append((i, 0))   # 強
-        elif ch in WEAK_PUNCTS: candidates.append((i, 1)) # 弱
-    # バックアップ候補：空白や中立文字
-    for i in range(1, len(raw)-1):
-        candidates.append((i, 2))
-
-    # 禁則：直前直後の2-gramをチェック
-    def bad_break(pos:int) -> bool:
-        a = raw[pos-1]; b = raw[pos]  # break は pos の前で改行
-        if (a+b) in FORBIDDEN_SPLIT_2: return True
-        if a.isdigit() and b in NUM_UNITS_HEAD: return True
-        if a == "第" and b.isdigit(): return True
-        if a == "翌" and b == "日":   return True
-        return False
-
-    # 目標は中央付近
-    target = len(raw)//2
-    # 距離優先で最良の候補を探す（句読点に重み）
+    L = len(raw)
+    if L <= max_chars: return raw  # 1行でOK
+
+    target = L//2
+    lo = max(6, max_chars//5)          # 片側が極端に短いのは避ける
+    half = max_chars//2
     best = None
     best_score = 1e18
-    for i, kind in candidates:
-        if i<=0 or i>=len(raw): continue
-        if bad_break(i): continue
-        # 行長の偏差 + 種別の重み
-        left_len = i
-        right_len = len(raw) - i
-        # 片側が極端に短いのは避ける
-        if min(left_len, right_len) < max(6, max_chars//5):
-            continue
-        base = abs(i - target)
-        kind_w = {0:0.0, 1:0.5, 2:1.0}[kind]
-        score = base + kind_w * (max_chars//2)
+
+    # 句読点候補（強=0 / 弱=1）。インデックス順に評価
+    for m in PUNCT_RE.finditer(raw):
+        i = m.start()
+        if i<=0 or i>=L: continue
+        if _bad_break(raw, i): continue
+        if min(i, L-i) < lo: continue
+        score = abs(i - target) + KIND_W[0 if raw[i] in SENT_PUNCTS else 1] * half
         if score < best_score:
             best_score = score; best = i
 
+    # 中立候補（種別2）：中央から外側へ。最初に見つかった安全位置が最小スコア
+    i_min, i_max = max(1, lo), min(L-2, L-lo)
+    if i_min <= i_max:
+        d = 0
+        while target-d >= i_min or target+d <= i_max:
+            hit = None
+            for i in ((target,) if d == 0 else (target-d, target+d)):
+                if i_min <= i <= i_max and not _bad_break(raw, i):
+                    hit = i; break
+            if hit is not None:
+                score = abs(hit - target) + KIND_W[2] * half
+                if score < best_score:
+                    best_score = score; best = hit
+                break
+            d += 1
+
     if best is None:
         # 苦し紛れの中央割り（禁則衝突時は少しずらす）
         best = target
         shift = 0
-        while (best+shift)<len(raw) and bad_break(best+shift): shift += 1
+        while (best+shift)<L and _bad_break(raw, best+shift): shift += 1
         best += shift
 
     return raw[:best] + "\n" + raw[best:]
 
-def polish(blocks, lead_in, lead_out, hysteresis, min_dur, max_cps, max_chars):
-    # 1) リードイン/アウト
-    N=len(blocks)
-    for i,b in enumerate(blocks):
-        if i==0: b.st = max(0.0, b.st - lead_in)
-        else:    b.st = max(blocks[i-1].en + hysteresis, b.st - lead_in)
-        if i==N-1: b.en = b.en + lead_out
-        else:      b.en = min(blocks[i+1].st - hysteresis, b.en + lead_out)
-        if b.en < b.st:
-            mid = (b.st + b.en)/2
-            b.st = mid - 0.1; b.en = mid + 0.1
-
-    # 2) オーバーラップ解消
-    for i in range(1,N):
-        prev, cur = blocks[i-1], blocks[i]
-        if cur.st < prev.en + hysteresis:
-            cur.st = prev.en + hysteresis
-            if cur.en < cur.st + 0.1:
-                cur.en = cur.st + 0.1
-
-    # 3) 最小尺の再保証（借用→必要なら右マージ）
-    i=0
-    while i < len(blocks):
-        b = blocks[i]
-        if b.dur + 1e-6 >= min_dur:
-            i += 1; continue
-        need = min_dur - b.dur
-        # 右から借用
-        if i+1 < len(blocks):
-            nxt = blocks[i+1]
-            avail_right = max(0.0, (nxt.st - b.en) - hysteresis)
-            take = min(avail_right, need)
-            if take > 0: b.en += take; need -= take
-        # 左から借用
-        if need > 1e-9 and i-1 >= 0:
-            prev = blocks[i-1]
-            avail_left = max(0.0, (b.st - prev.en) - hysteresis)
-            take = min(avail_left, need)
-            if take > 0: b.st -= take; need -= take
-        # 右とマージ
-        if need > 1e-9 and i+1 < len(blocks):
-            nxt = blocks[i+1]
-            merged = Block(b.idx, b.st, nxt.en, (b.text+"\n"+nxt.text).strip())
-            blocks[i] = merged
-            del blocks[i+1]
-            continue
-        i += 1
-
-    # 4) 軽いCPS調整（必要最低限）
-    for i,b in enumerate(blocks):
-        if b.cps > max_cps and i+1 < len(blocks):
-            shift = min(0.2, (blocks[i+1].st - b.en) - hysteresis)
-            if shift > 0: b.en += shift
-
-    # 5) 行折返し（2行、禁則配慮）
-    for b in blocks:
-        b.text = wrap_ja(b.text, max_chars=max_chars)
-
-    for i,b in enumerate(blocks,1): b.idx=i
-    return blocks
+def snap_edges(st, en, energy, tol, hysteresis):
+    """A) の後の開始/終了を音声エネルギーの谷へ一括スナップし、順序とヒステリシスを保つ"""
+    import numpy as np
+    from audio_vad import snap_to_valleys
+    db, hop, frame = energy
+    s = snap_to_valleys(st, db, hop, frame, tol, side="start")
+    e = snap_to_valleys(en, db, hop, frame, tol, side="end")
+    prev_e = np.concatenate(([-np.inf], e[:-1]))
+    s = np.maximum(s, np.maximum(prev_e + hysteresis, 0.0))
+    e = np.maximum(e, s + 0.1)
+    return s.tolist(), e.tolist()
+
+def polish(blocks, lead_in, lead_out, hysteresis, min_dur, max_cps, max_chars, energy=None, snap_tol=0.15):
+    """
+    タイミング整形。st/en/text の配列上で 2 パス:
+      A) リードイン/アウト + オーバーラップ解消（前ブロックの確定値のみ参照）
+         energy=(db, hop, frame) があれば、その結果を低エネルギーの谷へスナップ
+      B) 最小尺の再保証（借用→右マージ）を追記専用の出力バッファで行い、
+         出力確定時に直前ブロックの CPS 調整と行折返しを済ませる
+    （旧実装の5パス・リスト内 del と同一の結果）
+    """
+    N = len(blocks)
+    st = [b.st for b in blocks]; en = [b.en for b in blocks]; tx = [b.text for b in blocks]
+
+    # A) 1) リードイン/アウト  2) オーバーラップ解消
+    prev1 = prev2 = 0.0  # 直前ブロックの en（1) 適用後 / 2) 適用後）
+    for i in range(N):
+        s = st[i]; e = en[i]
+        if i==0: s = max(0.0, s - lead_in)
+        else:    s = max(prev1 + hysteresis, s - lead_in)
+        if i==N-1: e = e + lead_out
+        else:      e = min(st[i+1] - hysteresis, e + lead_out)
+        if e < s:
+            mid = (s + e)/2
+            s = mid - 0.1; e = mid + 0.1
+        prev1 = e
+        if i > 0 and s < prev2 + hysteresis:
+            s = prev2 + hysteresis
+            if e < s + 0.1:
+                e = s + 0.1
+        st[i] = s; en[i] = e; prev2 = e
+
+    if energy is not None and N:
+        st, en = snap_edges(st, en, energy, snap_tol, hysteresis)
+
+    # B) 3) 最小尺の再保証  4) 軽いCPS調整  5) 行折返し
+    o_st, o_en, o_tx = [], [], []
+    def close_last(next_st):
+        # 直前出力の CPS 調整（次ブロックの開始が確定してから）と折返し
+        k = len(o_st) - 1
+        if next_st is not None:
+            n = len(o_tx[k].replace("\n",""))
+            if n / max(1e-6, o_en[k] - o_st[k]) > max_cps:
+                shift = min(0.2, (next_st - o_en[k]) - hysteresis)
+                if shift > 0: o_en[k] += shift
+        o_tx[k] = wrap_ja(o_tx[k], max_chars=max_chars)
+
+    j = 0
+    while j < N:
+        s, e, t = st[j], en[j], tx[j]; j += 1
+        while e - s + 1e-6 < min_dur:
+            need = min_dur - (e - s)
+            # 右から借用
+            if j < N:
+                avail_right = max(0.0, (st[j] - e) - hysteresis)
+                take = min(avail_right, need)
+                if take > 0: e += take; need -= take
+            # 左から借用
+            if need > 1e-9 and o_st:
+                avail_left = max(0.0, (s - o_en[-1]) - hysteresis)
+                take = min(avail_left, need)
+                if take > 0: s -= take; need -= take
+            # 右とマージ
+            if need > 1e-9 and j < N:
+                e = en[j]; t = (t+"\n"+tx[j]).strip(); j += 1
+                continue
+            break
+        if o_st: close_last(s)
+        o_st.append(s); o_en.append(e); o_tx.append(t)
+    if o_st: close_last(None)
+
+    return [Block(i, s, e, t) for i, (s, e, t) in enumerate(zip(o_st, o_en, o_tx), 1)]
 
 def main():
     ap = argparse.ArgumentParser()
@@ -182,10 +214,17 @@ def main():
     ap.add_argument("--min-dur", type=float, default=1.00)
     ap.add_argument("--max-cps", type=float, default=19.0)
     ap.add_argument("--max-chars", type=int, default=40)
+    ap.add_argument("--energy", default=None, help="asr/energy.npz（あれば境界を無音の谷へスナップ）")
+    ap.add_argument("--snap-tol", type=float, default=0.15, help="スナップ探索幅 (±sec)")
     args = ap.parse_args()
 
+    energy = None
+    if args.energy and os.path.exists(args.energy):
+        from audio_vad import load_energy
+        energy = load_energy(args.energy)
     blocks = read_srt(args.input)
-    blocks = polish(blocks, args.lead_in, args.lead_out, args.hysteresis, args.min_dur, args.max_cps, args.max_chars)
+    blocks = polish(blocks, args.lead_in, args.lead_out, args.hysteresis, args.min_dur, args.max_cps, args.max_chars,
+                    energy=energy, snap_tol=args.snap_tol)
     write_srt(args.output, blocks)
 
 if __name__ == "__main__":
@@ -1,22 +1,44 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import re, sys, srt, pathlib
+"""
+SRT 品質チェック。
+  単体:     python tools/srt_qc.py FILE.srt
+  コーパス: python tools/srt_qc.py --corpus [Workspace/Runs] [--json OUT.json] [--csv OUT.csv]
+
+コーパスモードは Runs/*/final/*_ja*.srt を全件 NumPy 配列（尺・ギャップ・CPS・行長・文字数）に
+読み込み、既存3ルール＋オーバーラップ/最小・最大尺/CPS 上限をベクトル演算で判定し、
+ラン別・全体のヒストグラム付きレポートを出す。
+"""
+import os, re, sys, csv, json, glob, time, argparse, pathlib
+import numpy as np
+import srt
 
 EOS = "。！？!?"
 TAILS = ("です","ます","でした","ません","なります","になります")
+MIDWORD = re.compile(r'[一-龥ぁ-んァ-ン]\n[一-龥ぁ-んァ-ン]')
+TIMECODE = re.compile(r"(\d+):(\d\d):(\d\d)[,.](\d{1,3})\s*-->\s*(\d+):(\d\d):(\d\d)[,.](\d{1,3})")
+BLANKS = re.compile(r"\n[ \t]*\n")
+
+MAX_LINE = 42
+# ヒストグラムのビン（ラン間で比較できるよう固定）
+BINS = {
+    "dur":      [0, 0.5, 1, 1.5, 2, 3, 4, 5, 6, 8, 10, 1e9],
+    "gap":      [-1e9, 0, 0.02, 0.1, 0.25, 0.5, 1, 2, 5, 1e9],
+    "cps":      [0, 5, 10, 12, 15, 17, 19, 21, 25, 30, 1e9],
+    "line_len": [0, 10, 20, 30, 36, 40, 42, 50, 60, 1e9],
+    "chars":    [0, 5, 10, 20, 30, 40, 60, 80, 1e9],
+}
 
 def is_end_ok(t: str) -> bool:
     t = t.rstrip()
-    if not t: 
+    if not t:
         return True
-    if t[-1] in EOS: 
+    if t[-1] in EOS:
         return True
     return any(t.endswith(x) for x in TAILS)
 
-def main():
-    if len(sys.argv) < 2:
-        print("usage: srt_qc.py FILE.srt"); sys.exit(1)
-    p = pathlib.Path(sys.argv[1])
+def check_one(path):
+    p = pathlib.Path(path)
     subs = list(srt.parse(p.read_text(encoding="utf-8")))
 
     bad_eos, midword, longline = [], [], []
@@ -24,10 +46,10 @@ def main():
         t = s.content.strip()
         if not is_end_ok(t):
             bad_eos.append((s.index, t.replace("\n"," / ")))
-        if re.search(r'[一-龥ぁ-んァ-ン]\n[一-龥ぁ-んァ-ン]', t):
+        if MIDWORD.search(t):
             midword.append((s.index, t.replace("\n"," ↵ ")))
         for line in t.splitlines():
-            if len(line) > 42:
+            if len(line) > MAX_LINE:
                 longline.append((s.index, line))
 
     print(f"[QC] 未終端: {len(bad_eos)} / 語中改行疑い: {len(midword)} / 1行>42字: {len(longline)}")
@@ -40,5 +62,179 @@ def main():
     dump("語中改行?", midword)
     dump("長行(>42)", longline)
 
+# ---------------- コーパスモード ----------------
+
+def load_cues(path):
+    """SRT を (st[], en[], texts) に。srt.parse より軽量な一括正規表現パース"""
+    raw = pathlib.Path(path).read_text(encoding="utf-8").replace("\r\n", "\n")
+    st, en, texts = [], [], []
+    for blk in BLANKS.split(raw.strip()):
+        lines = blk.split("\n")
+        k = 1 if len(lines) > 1 and TIMECODE.match(lines[1]) else 0
+        m = TIMECODE.match(lines[k])
+        if not m:
+            continue
+        g = m.groups()
+        st.append(int(g[0])*3600 + int(g[1])*60 + int(g[2]) + int(g[3].ljust(3, "0"))/1000.0)
+        en.append(int(g[4])*3600 + int(g[5])*60 + int(g[6]) + int(g[7].ljust(3, "0"))/1000.0)
+        texts.append("\n".join(lines[k+1:]).strip())
+    return np.asarray(st, dtype=np.float64), np.asarray(en, dtype=np.float64), texts
+
+def cue_arrays(st, en, texts, fid=None):
+    """キュー単位・行単位の特徴量配列を作る（fid はファイル番号。ギャップはファイル内のみ）"""
+    n = len(texts)
+    fid = np.zeros(n, dtype=np.int32) if fid is None else np.asarray(fid, dtype=np.int32)
+    dur = en - st
+    gap = np.full(n, np.nan)
+    if n > 1:
+        same = fid[1:] == fid[:-1]
+        gap[1:] = np.where(same, st[1:] - en[:-1], np.nan)  # 直前キューとの間隔
+    chars = np.fromiter((len(t) - t.count("\n") for t in texts), dtype=np.int32, count=n)
+    cps = chars / np.maximum(dur, 1e-6)
+    lines = [t.split("\n") for t in texts]
+    line_cue = np.repeat(np.arange(n, dtype=np.int64),
+                         np.fromiter((len(x) for x in lines), dtype=np.int64, count=n))
+    line_len = np.fromiter((len(l) for x in lines for l in x), dtype=np.int32, count=len(line_cue))
+    # 未終端：末尾文字 ∈ EOS または TAILS で終わる
+    tt = np.array([t.rstrip() for t in texts], dtype=str)
+    last = np.array([t[-1:] for t in tt], dtype="<U1")
+    ok = (last == "") | np.isin(last, list(EOS))
+    for tail in TAILS:
+        ok |= np.char.endswith(tt, tail)
+    has_nl = np.fromiter(("\n" in t for t in texts), dtype=bool, count=n)
+    midword = np.zeros(n, dtype=bool)
+    for i in np.flatnonzero(has_nl):
+        midword[i] = MIDWORD.search(texts[i]) is not None
+    return {"fid": fid, "dur": dur, "gap": gap, "chars": chars, "cps": cps,
+            "line_cue": line_cue, "line_len": line_len, "unterminated": ~ok, "midword": midword}
+
+def violations(a, max_cps=19.0, min_dur=1.0, max_dur=6.0, max_line=MAX_LINE):
+    """ルール別のキュー単位ブール配列"""
+    longline = np.zeros(len(a["dur"]), dtype=bool)
+    longline[a["line_cue"][a["line_len"] > max_line]] = True
+    gap = a["gap"]
+    return {
+        "unterminated": a["unterminated"],
+        "midword_newline": a["midword"],
+        "long_line": longline,
+        "overlap": np.nan_to_num(gap, nan=0.0) < 0,
+        "min_dur": a["dur"] < min_dur - 1e-6,
+        "max_dur": a["dur"] > max_dur + 1e-6,
+        "cps_cap": a["cps"] > max_cps,
+    }
+
+def _hist(vals, grp, n_grp, bins):
+    """グループ別ヒストグラムを一括計算（digitize + bincount）"""
+    nb = len(bins) - 1
+    idx = np.clip(np.searchsorted(bins, vals, side="right") - 1, 0, nb - 1)
+    return np.bincount(grp * nb + idx, minlength=n_grp * nb).reshape(n_grp, nb)
+
+def summarize(a, v, cue_grp, n_grp):
+    """グループ（ラン）別の集計。全体は cue_grp=0, n_grp=1"""
+    line_grp = cue_grp[a["line_cue"]]
+    cues = np.bincount(cue_grp, minlength=n_grp)
+    dur = np.bincount(cue_grp, weights=a["dur"], minlength=n_grp)
+    chars = np.bincount(cue_grp, weights=a["chars"], minlength=n_grp)
+    viol = {k: np.bincount(cue_grp, weights=x, minlength=n_grp) for k, x in v.items()}
+    has_gap = ~np.isnan(a["gap"])
+    hist = {
+        "dur":      _hist(a["dur"], cue_grp, n_grp, BINS["dur"]),
+        "gap":      _hist(a["gap"][has_gap], cue_grp[has_gap], n_grp, BINS["gap"]),
+        "cps":      _hist(a["cps"], cue_grp, n_grp, BINS["cps"]),
+        "line_len": _hist(a["line_len"], line_grp, n_grp, BINS["line_len"]),
+        "chars":    _hist(a["chars"], cue_grp, n_grp, BINS["chars"]),
+    }
+    out = []
+    for g in range(n_grp):
+        n = int(cues[g])
+        out.append({
+            "cues": n,
+            "duration_sec": round(float(dur[g]), 3),
+            "chars": int(chars[g]),
+            "violations": {k: int(x[g]) for k, x in viol.items()},
+            "rates": {k: (round(float(x[g]) / n, 4) if n else 0.0) for k, x in viol.items()},
+            "hist": {k: h[g].tolist() for k, h in hist.items()},
+        })
+    return out
+
+def corpus(root, pattern, max_cps, min_dur, max_dur):
+    t0 = time.time()
+    paths = sorted(glob.glob(os.path.join(root, pattern)))
+    sts, ens, texts, fids = [], [], [], []
+    for i, p in enumerate(paths):
+        s, e, t = load_cues(p)
+        sts.append(s); ens.append(e); texts.extend(t)
+        fids.append(np.full(len(t), i, dtype=np.int32))
+    st = np.concatenate(sts) if sts else np.zeros(0)
+    en = np.concatenate(ens) if ens else np.zeros(0)
+    fid = np.concatenate(fids) if fids else np.zeros(0, dtype=np.int32)
+    t_load = time.time() - t0
+
+    a = cue_arrays(st, en, texts, fid)
+    v = violations(a, max_cps=max_cps, min_dur=min_dur, max_dur=max_dur)
+
+    # ラン = Runs 直下のディレクトリ名
+    run_of_file = [os.path.relpath(p, root).split(os.sep)[0] for p in paths]
+    run_names, file_run = np.unique(np.array(run_of_file, dtype=str), return_inverse=True)
+    cue_run = file_run[fid] if len(paths) else np.zeros(0, dtype=np.int64)
+    per_run = summarize(a, v, cue_run, len(run_names))
+    for p, k in zip(paths, file_run):
+        per_run[k].setdefault("files", []).append(os.path.relpath(p, root))
+    runs = {str(name): rs for name, rs in zip(run_names, per_run)}
+    report = {
+        "root": os.path.abspath(root),
+        "pattern": pattern,
+        "files": len(paths),
+        "params": {"max_cps": max_cps, "min_dur": min_dur, "max_dur": max_dur, "max_line": MAX_LINE},
+        "bins": BINS,
+        "global": summarize(a, v, np.zeros(len(texts), dtype=np.int64), 1)[0],
+        "runs": runs,
+        "elapsed_sec": {"load": round(t_load, 3), "total": round(time.time() - t0, 3)},
+    }
+    return report
+
+def write_csv(path, report):
+    keys = list(report["global"]["violations"].keys())
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["run", "cues", "duration_sec", "chars"] + keys + [f"{k}_rate" for k in keys])
+        for name, r in list(report["runs"].items()) + [("__global__", report["global"])]:
+            w.writerow([name, r["cues"], r["duration_sec"], r["chars"]]
+                       + [r["violations"][k] for k in keys] + [r["rates"][k] for k in keys])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("file", nargs="?", help="単体チェックする SRT")
+    ap.add_argument("--corpus", nargs="?", const="", default=None, metavar="RUNS_DIR",
+                    help="コーパスモード（既定: $WORKSPACE_ROOT/Runs）")
+    ap.add_argument("--glob", default=os.path.join("*", "final", "*_ja*.srt"))
+    ap.add_argument("--json", default=None, help="JSON レポート出力先")
+    ap.add_argument("--csv", default=None, help="ラン別 CSV 出力先")
+    ap.add_argument("--max-cps", type=float, default=19.0)
+    ap.add_argument("--min-dur", type=float, default=float(os.environ.get("JA_MIN_DUR", "1.0")))
+    ap.add_argument("--max-dur", type=float, default=float(os.environ.get("JA_MAX_DUR", "6.0")))
+    args = ap.parse_args()
+
+    if args.corpus is None:
+        if not args.file:
+            print("usage: srt_qc.py FILE.srt | srt_qc.py --corpus [RUNS_DIR]"); sys.exit(1)
+        check_one(args.file)
+        return
+
+    root = args.corpus or os.path.join(os.environ.get("WORKSPACE_ROOT", "Workspace"), "Runs")
+    report = corpus(root, args.glob, args.max_cps, args.min_dur, args.max_dur)
+    g = report["global"]
+    print(f"[QC corpus] files={report['files']} runs={len(report['runs'])} cues={g['cues']} "
+          f"({report['elapsed_sec']['total']:.2f}s)")
+    for k, n in g["violations"].items():
+        print(f"  {k:16s} {n:7d}  ({g['rates'][k]:.2%})")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[QC corpus] json: {args.json}")
+    if args.csv:
+        write_csv(args.csv, report)
+        print(f"[QC corpus] csv: {args.csv}")
+
 if __name__ == "__main__":
     main()
@@ -19,6 +19,7 @@ import os
 import srt
 import argparse
 from datetime import timedelta
+import merge_plan
 
 # --------- 設定（安全サイド） ---------
 EOS_PUNCT = "。！？!?"
@@ -146,43 +147,14 @@ def merge_nonfinal_blocks(subs, merge_pause=0.35, merge_max=2):
       - 次ブロック開始が現ブロック終了＋merge_pause 以内
       - 最大 merge_max ブロックまで
       - 次が接続詞始まり or 現・次どちらかが非終端なら結合
+    判定は merge_plan の refine ルールセット（1パス・出力は最後に1回だけ生成）。
     """
-    out = []
-    i = 0
-    while i < len(subs):
-        cur = subs[i]
-        cur_text = cur.content.strip()
-        merged = 0
-        while (merged < merge_max) and (i + 1 < len(subs)) and not is_eos(cur_text):
-            nxt = subs[i+1]
-            gap = (nxt.start - cur.end).total_seconds()
-            if gap > merge_pause:
-                break
-            if begins_with_connective(nxt.content) or not is_eos(nxt.content):
-                # 結合
-                cur_text = (cur_text + "\n" + nxt.content.strip()).strip()
-                cur = srt.Subtitle(index=cur.index, start=cur.start, end=nxt.end, content=cur_text)
-                i += 1
-                merged += 1
-            else:
-                break
-        out.append(srt.Subtitle(index=len(out)+1, start=cur.start, end=cur.end, content=cur_text))
-        i += 1
-    return out
-
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("input", help="入力SRT")
-    ap.add_argument("-o", "--output", required=True, help="出力SRT")
-    ap.add_argument("--no-merge", action="store_true", help="文境界の結合を行わない")
-    ap.add_argument("--merge-pause", type=float, default=0.35, help="連結を許す最大ポーズ秒")
-    ap.add_argument("--merge-max", type=int, default=2, help="連結上限ブロック数")
-    ap.add_argument("--dry", action="store_true", help="変更件数のみ表示して書き出さない")
-    args = ap.parse_args()
-
-    raw = open(args.input, encoding="utf-8").read()
-    subs = list(srt.parse(raw))
+    groups = merge_plan.plan(merge_plan.spans_from_subs(subs),
+                             [("refine", {"merge_pause": merge_pause, "merge_max": merge_max})])
+    return merge_plan.to_subs(groups, keep_proprietary=False)
 
+def refine(subs, merge=True, merge_pause=0.35, merge_max=2):
+    """フィラー除去 → 非終端の結合。(結果, 編集したブロック数)"""
     # 1) フィラー除去（安全）
     fixed = []
     n_drop = 0
@@ -194,10 +166,25 @@ def main():
         fixed.append(srt.Subtitle(index=s.index, start=s.start, end=s.end, content=after))
 
     # 2) 非終端の結合（保守的条件）
-    if not args.no_merge:
-        fixed2 = merge_nonfinal_blocks(fixed, merge_pause=args.merge_pause, merge_max=args.merge_max)
+    if merge:
+        fixed2 = merge_nonfinal_blocks(fixed, merge_pause=merge_pause, merge_max=merge_max)
     else:
         fixed2 = [srt.Subtitle(index=i+1, start=x.start, end=x.end, content=x.content.strip()) for i, x in enumerate(fixed)]
+    return fixed2, n_drop
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("input", help="入力SRT")
+    ap.add_argument("-o", "--output", required=True, help="出力SRT")
+    ap.add_argument("--no-merge", action="store_true", help="文境界の結合を行わない")
+    ap.add_argument("--merge-pause", type=float, default=0.35, help="連結を許す最大ポーズ秒")
+    ap.add_argument("--merge-max", type=int, default=2, help="連結上限ブロック数")
+    ap.add_argument("--dry", action="store_true", help="変更件数のみ表示して書き出さない")
+    args = ap.parse_args()
+
+    raw = open(args.input, encoding="utf-8").read()
+    subs = list(srt.parse(raw))
+    fixed2, n_drop = refine(subs, merge=not args.no_merge, merge_pause=args.merge_pause, merge_max=args.merge_max)
 
     if args.dry:
         print(f"[refine_ja] sudachi={'on' if HAVE_SUDACHI else 'off'} drop_or_edit_blocks={n_drop} merged={len(subs)-len(fixed2)}")
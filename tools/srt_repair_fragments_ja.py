@@ -3,6 +3,7 @@
 #       マージ後に最小尺やCPSも軽くケア。
 import re, sys, argparse
 from dataclasses import dataclass
+import merge_plan
 
 TIMECODE = re.compile(r"(\d\d):(\d\d):(\d\d),(\d\d\d)\s*-->\s*(\d\d):(\d\d):(\d\d),(\d\d\d)")
 TAILERS = tuple("すねよがとでもにはをの")
@@ -63,45 +64,11 @@ def looks_fragment(b: Block, low_chars:int):
     return False
 
 def repair(blocks, min_dur, max_dur, low_chars=6, max_cps=19.0):
-    i=0
-    while i < len(blocks):
-        b = blocks[i]
-        if not looks_fragment(b, low_chars):
-            i += 1; continue
-
-        # 右優先でマージ（文末句読点の尊重）
-        if i+1 < len(blocks):
-            nxt = blocks[i+1]
-            merged = Block(b.idx, b.st, nxt.en, (b.text+"\n"+nxt.text).strip())
-            # 最大尺やCPSが過大なら、左借用だけに留める
-            if merged.dur <= max_dur and merged.cps <= max_cps:
-                blocks[i] = merged
-                del blocks[i+1]
-                continue
-        # 右が無理なら左と
-        if i-1 >= 0:
-            prv = blocks[i-1]
-            merged = Block(prv.idx, prv.st, b.en, (prv.text+"\n"+b.text).strip())
-            if merged.dur <= max_dur and merged.cps <= max_cps:
-                blocks[i-1] = merged
-                del blocks[i]
-                i -= 1
-                continue
-
-        # どちらも無理 → 可能なら僅かに拡張
-        if i+1 < len(blocks):
-            gap = max(0.0, blocks[i+1].st - b.en)
-            take = min(gap*0.5, max(0.0, min_dur - b.dur))
-            if take>0: b.en += take
-        if i-1 >= 0:
-            gap = max(0.0, b.st - blocks[i-1].en)
-            take = min(gap*0.5, max(0.0, min_dur - b.dur))
-            if take>0: b.st -= take
-
-        i += 1
-
-    for i,b in enumerate(blocks,1): b.idx=i
-    return blocks
+    # 結合判定は merge_plan の repair ルールセット（1パス・出力は最後に1回だけ生成）
+    groups = merge_plan.plan(merge_plan.spans_from_blocks(blocks),
+                             [("repair", {"min_dur": min_dur, "max_dur": max_dur,
+                                          "low_chars": low_chars, "max_cps": max_cps})])
+    return merge_plan.to_blocks(groups, Block)
 
 def main():
     ap = argparse.ArgumentParser()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+長い SRT の後処理（polish / refine）をファイル内で分割して並列実行する。
+
+- 継ぎ目は「文末（srt_refine_ja.is_eos）のキューの後の、十分なポーズ」だけ。
+  必要なポーズ長は継ぎ目ごとに、両側のキューの長さから seam_pause() で計算する（--seam-pause で固定値に上書き可）
+- 各シャードは前後に1キューずつの「のりしろ」を付けて処理し、のりしろの出力は捨てる。
+  継ぎ目側の境界規則（オーバーラップ解消・ヒステリシス・最小尺の右借用・CPS 調整・結合判定）は
+  のりしろを相手にシャード内で再実行されるので、逐次実行と同じ結果になる
+- --verify で逐次実行と一致を確認、--bench でコア数ごとの速度向上を計測
+- パイプラインからは CFG_SHARD_POST=1 で使う（full_pipeline.sh の整形、whx fresh の polish → refine → polish）
+
+チェーン:
+  whx     … polish → refine → polish（whx fix と同じ設定。srt_fix_incremental.reprocess）
+  polish  … polish のみ（パイプライン手順 3 と同じ既定値）
+
+使い方:
+  python tools/srt_shard_post.py IN.srt -o OUT.srt [--chain whx] [--jobs 8] [--energy asr/energy.npz] [--verify] [--bench]
+"""
+import os, time, argparse
+from concurrent.futures import ProcessPoolExecutor
+from srt_lint_polish import read_srt, write_srt, polish, s2t
+from srt_refine_ja import is_eos
+import srt_fix_incremental as fixinc
+
+POLISH_DEFAULT = dict(lead_in=0.20, lead_out=0.20, hysteresis=0.02, min_dur=1.0, max_cps=19.0, max_chars=40)
+CPS_SHIFT = 0.2      # polish の CPS 調整で終了が延びる上限
+MERGE_PAUSE = 0.35   # whx の refine の結合ポーズ（srt_fix_incremental.reprocess の既定）
+
+def chain_stages(name):
+    """チェーン名 → polish 段のパラメータ列（継ぎ目ポーズの計算用）"""
+    return [fixinc.PASS1, fixinc.PASS2] if name == "whx" else [POLISH_DEFAULT]
+
+_ENERGY = {}
+
+def _energy(path):
+    if path and path not in _ENERGY:
+        from audio_vad import load_energy
+        _ENERGY[path] = load_energy(path)
+    return _ENERGY.get(path)
+
+def run_chain(name, blocks, merge=True, energy=None, snap_tol=0.15):
+    if not blocks:
+        return []
+    if name == "whx":
+        return fixinc.reprocess(blocks, merge=merge)
+    return polish(blocks, **POLISH_DEFAULT, energy=_energy(energy), snap_tol=snap_tol)
+
+def seam_pause(stages, dur_l, dur_r, snap_tol=0.0, merge_pause=0.0):
+    """
+    文末キュー L と次のキュー R の間で切ってよいポーズ長の下限。polish 1段で隙間が縮むのは
+      A) L のリードアウト + R のリードイン、エネルギースナップ（各端 ±snap_tol）
+      B) 最小尺に足りない分の借用（L は右へ min_dur - dur_l、R は左へ min_dur - dur_r）と L の CPS 調整
+    まで。これにヒステリシス2つ分を残せば、R の処理は L の状態によらず（左借用が隙間で頭打ちにならない）、
+    L は右借用だけで最小尺を満たす（のりしろの L が左借用できなくても右と結合しない）。
+    その段の後、L・R は最小尺以上。whx は段の間の refine が継ぎ目を結合しないよう merge_pause も残す
+    """
+    need = merge_pause
+    for p in stages:
+        md = p["min_dur"]
+        need += (p["lead_in"] + p["lead_out"] + 2 * snap_tol + 2 * p["hysteresis"] + CPS_SHIFT
+                 + max(0.0, md - (dur_l - 2 * snap_tol)) + max(0.0, md - (dur_r - 2 * snap_tol)))
+        dur_l = max(dur_l, md); dur_r = max(dur_r, md)
+    return need + 0.05
+
+def find_seams(blocks, need, target):
+    """継ぎ目（キュー i の後で切る）の i を返す。1シャードはおよそ target キュー。need(L, R) が必要なポーズ長"""
+    seams = []; last = 0
+    for i in range(len(blocks) - 1):
+        if i + 1 - last < target:
+            continue
+        L, R = blocks[i], blocks[i+1]
+        if is_eos(L.text) and R.st - L.en >= need(L, R):
+            seams.append(i); last = i + 1
+    return seams
+
+def seam_rule(name, snap_tol=0.0, fixed=None):
+    """(need(L, R), 両側が最小尺以上のときの下限)。fixed があれば一律その値"""
+    if fixed is not None:
+        return (lambda L, R: fixed), fixed
+    stages = chain_stages(name)
+    mp = MERGE_PAUSE if name == "whx" else 0.0
+    md = max(p["min_dur"] for p in stages) + 2 * snap_tol
+    return (lambda L, R: seam_pause(stages, L.en - L.st, R.en - R.st, snap_tol, mp)), seam_pause(stages, md, md, snap_tol, mp)
+
+def _work(job):
+    name, merge, blocks, has_left, has_right, energy, snap_tol = job
+    out = run_chain(name, blocks, merge, energy, snap_tol)
+    # のりしろ（前後1キュー）の出力を捨てる。継ぎ目を越える結合は起きないので先頭/末尾に1つずつ
+    return out[1 if has_left else 0: len(out) - (1 if has_right else 0)]
+
+def sharded(blocks, name, jobs, need, merge=True, target=None, energy=None, snap_tol=0.15):
+    N = len(blocks)
+    target = target or max(50, N // max(1, jobs * 4))
+    seams = find_seams(blocks, need, target)
+    bounds = [0] + [i + 1 for i in seams] + [N]
+    tasks = []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        lo = max(0, a - 1); hi = min(N, b + 1)
+        tasks.append((name, merge, blocks[lo:hi], a > 0, b < N, energy, snap_tol))
+    if jobs <= 1 or len(tasks) == 1:
+        parts = [_work(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            parts = list(ex.map(_work, tasks))
+    out = [b for p in parts for b in p]
+    for i, b in enumerate(out, 1):
+        b.idx = i
+    return out, len(tasks)
+
+def _fingerprint(blocks):
+    return [(s2t(b.st), s2t(b.en), b.text) for b in blocks]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("input")
+    ap.add_argument("-o", "--output", default=None)
+    ap.add_argument("--chain", choices=("whx", "polish"), default="whx")
+    ap.add_argument("--no-merge", action="store_true", help="refine の結合を行わない（whx チェーン）")
+    ap.add_argument("--jobs", type=int, default=int(os.environ.get("CFG_SHARD_JOBS", "0")) or os.cpu_count() or 2)
+    ap.add_argument("--energy", default=None, help="asr/energy.npz（polish チェーンのみ。境界を無音の谷へスナップ）")
+    ap.add_argument("--snap-tol", type=float, default=0.15, help="スナップ探索幅 (±sec)")
+    ap.add_argument("--seam-pause", type=float, default=None, help="継ぎ目に使う最小ポーズ (sec)。既定は継ぎ目ごとに計算")
+    ap.add_argument("--verify", action="store_true", help="逐次実行と一致するか確認")
+    ap.add_argument("--bench", action="store_true", help="1..jobs コアでの速度向上を表示")
+    args = ap.parse_args()
+
+    blocks = read_srt(args.input)
+    energy = args.energy if args.chain == "polish" and args.energy and os.path.exists(args.energy) else None
+    need, floor = seam_rule(args.chain, args.snap_tol if energy else 0.0, args.seam_pause)
+    merge = not args.no_merge
+
+    t0 = time.perf_counter()
+    out, n_shards = sharded(blocks, args.chain, args.jobs, need, merge, energy=energy, snap_tol=args.snap_tol)
+    t_par = time.perf_counter() - t0
+    print(f"[shard] cues={len(blocks)} -> {len(out)} shards={n_shards} seam_pause>={floor:.2f}s "
+          f"jobs={args.jobs} {t_par:.2f}s")
+    if args.output:
+        write_srt(args.output, out)
+
+    if args.verify or args.bench:
+        t0 = time.perf_counter()
+        ref = run_chain(args.chain, read_srt(args.input), merge, energy, args.snap_tol)
+        t_ser = time.perf_counter() - t0
+        if args.verify:
+            a, b = _fingerprint(ref), _fingerprint(out)
+            if a != b:
+                k = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+                raise SystemExit(f"[shard] verify NG: serial={len(a)} sharded={len(b)} first diff at cue {k+1}")
+            print(f"[shard] verify OK (serial {t_ser:.2f}s)")
+        if args.bench:
+            print(f"[shard] bench serial {t_ser:.2f}s")
+            n = 1
+            while n <= args.jobs:
+                t0 = time.perf_counter()
+                sharded(read_srt(args.input), args.chain, n, need, merge, energy=energy, snap_tol=args.snap_tol)
+                t = time.perf_counter() - t0
+                print(f"[shard] bench jobs={n:2d} {t:6.2f}s speedup x{t_ser / max(1e-9, t):.2f} "
+                      f"efficiency {t_ser / max(1e-9, t) / n:.0%}")
+                n *= 2
+
+if __name__ == "__main__":
+    main()
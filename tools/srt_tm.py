@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JA→EN 翻訳メモリ（SQLite）。
+- add:          完成済み JA/EN ペアを登録（srt_join_and_check.py --tm からも呼ばれる）
+- pretranslate: chunks_ja/JA_*.srt を TM で事前充填（完全一致 / 正規化一致）
+                あいまい一致は文字 n-gram 索引で候補検索し、report に提示のみ
+- lookup:       1行を検索（確認用）
+
+使い方:
+  python tools/srt_tm.py pretranslate --dir Runs/<slug>/chunks_ja [--db tm.sqlite]
+  python tools/srt_tm.py add --ja final/<slug>_ja.srt --en final/<slug>_en.srt
+  python tools/srt_tm.py lookup "納付期限は翌日です。"
+
+出力（pretranslate）:
+  TM_NNN.srt     ヒットは EN、未ヒットは JA のまま（翻訳者の下訳）
+  EN_NNN.srt     全行ヒットしたチャンクのみ（翻訳不要）
+  tm_report.txt  チャンク別ヒット数・あいまい候補・ヒット率
+"""
+
+import os, re, glob, time, sqlite3, argparse, unicodedata
+import srt
+from pathlib import Path
+
+NGRAM = 2
+FUZZY_MIN = 0.75       # Dice 係数の下限
+FUZZY_CANDS = 20       # n-gram 共有数の上位から精査する件数
+TRAIL_PUNCTS = "、。，．！？!?…・ 　"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tm(
+  id      INTEGER PRIMARY KEY,
+  ja      TEXT NOT NULL UNIQUE,
+  ja_norm TEXT NOT NULL,
+  en      TEXT NOT NULL,
+  ngrams  INTEGER NOT NULL,
+  uses    INTEGER NOT NULL DEFAULT 1,
+  source  TEXT,
+  updated REAL
+);
+CREATE INDEX IF NOT EXISTS tm_norm ON tm(ja_norm);
+CREATE TABLE IF NOT EXISTS grams(
+  gram  TEXT NOT NULL,
+  tm_id INTEGER NOT NULL,
+  PRIMARY KEY(gram, tm_id)
+) WITHOUT ROWID;
+"""
+
+def default_db():
+    db = os.environ.get("CFG_TM_DB")
+    if db:
+        return db
+    root = os.environ.get("WORKSPACE_ROOT", str(Path(__file__).resolve().parents[1] / "Workspace"))
+    return os.path.join(root, "tm.sqlite")
+
+def open_tm(path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(path, timeout=30)  # 並列の後処理が同じ TM に書く
+    con.executescript(SCHEMA)
+    return con
+
+def clean(text: str) -> str:
+    """完全一致キー：改行を除いた原文"""
+    return text.replace("\n", "").strip()
+
+def normalize(text: str) -> str:
+    """正規化キー：NFKC・空白除去・末尾の句読点除去"""
+    t = unicodedata.normalize("NFKC", text)
+    t = re.sub(r"\s+", "", t)
+    return t.rstrip(TRAIL_PUNCTS)
+
+def ngrams(norm: str):
+    if len(norm) < NGRAM:
+        return {norm} if norm else set()
+    return {norm[i:i+NGRAM] for i in range(len(norm) - NGRAM + 1)}
+
+def add_pair(con, ja: str, en: str, source: str = ""):
+    """1ペア登録。同じ JA は最新の EN で上書き（uses を加算）"""
+    ja_c = clean(ja); en_c = en.strip()
+    if not ja_c or not en_c or clean(en_c) == ja_c:
+        return False  # 空 or 未翻訳（JA 転記）は登録しない
+    norm = normalize(ja_c)
+    grams = ngrams(norm)
+    row = con.execute("SELECT id FROM tm WHERE ja=?", (ja_c,)).fetchone()
+    if row:
+        con.execute("UPDATE tm SET en=?, uses=uses+1, source=?, updated=? WHERE id=?",
+                    (en_c, source, time.time(), row[0]))
+        return True
+    cur = con.execute(
+        "INSERT INTO tm(ja, ja_norm, en, ngrams, source, updated) VALUES(?,?,?,?,?,?)",
+        (ja_c, norm, en_c, len(grams), source, time.time()))
+    con.executemany("INSERT OR IGNORE INTO grams(gram, tm_id) VALUES(?,?)",
+                    [(g, cur.lastrowid) for g in grams])
+    return True
+
+def add_subs(con, ja_subs, en_subs, source=""):
+    """行対応の取れた JA/EN 字幕列を登録。件数が合わなければ登録しない"""
+    if len(ja_subs) != len(en_subs):
+        return 0
+    n = 0
+    with con:
+        for a, b in zip(ja_subs, en_subs):
+            if add_pair(con, a.content, b.content, source):
+                n += 1
+    return n
+
+def lookup(con, ja: str, fuzzy=True):
+    """
+    (kind, en, score, ja_tm) を返す。kind = exact / norm / fuzzy / None
+    fuzzy は候補提示用で、自動充填には使わない。
+    """
+    ja_c = clean(ja)
+    if not ja_c:
+        return (None, None, 0.0, None)
+    row = con.execute("SELECT en FROM tm WHERE ja=?", (ja_c,)).fetchone()
+    if row:
+        return ("exact", row[0], 1.0, ja_c)
+    norm = normalize(ja_c)
+    row = con.execute("SELECT en, ja FROM tm WHERE ja_norm=? ORDER BY uses DESC LIMIT 1", (norm,)).fetchone()
+    if row:
+        return ("norm", row[0], 1.0, row[1])
+    if not fuzzy:
+        return (None, None, 0.0, None)
+    grams = ngrams(norm)
+    if not grams:
+        return (None, None, 0.0, None)
+    qs = ",".join("?" * len(grams))
+    cands = con.execute(
+        f"SELECT tm_id, COUNT(*) AS c FROM grams WHERE gram IN ({qs}) "
+        f"GROUP BY tm_id ORDER BY c DESC LIMIT {FUZZY_CANDS}", tuple(grams)).fetchall()
+    best = (None, None, 0.0, None)
+    for tm_id, shared in cands:
+        en, ja_tm, n = con.execute("SELECT en, ja, ngrams FROM tm WHERE id=?", (tm_id,)).fetchone()
+        score = 2.0 * shared / max(1, len(grams) + n)
+        if score >= FUZZY_MIN and score > best[2]:
+            best = ("fuzzy", en, score, ja_tm)
+    return best
+
+def read_srt(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return list(srt.parse(f.read()))
+
+def pretranslate(con, chunk_dir):
+    """JA_*.srt を TM で充填。戻り値は (total, exact, norm, fuzzy, report_lines)"""
+    total = n_exact = n_norm = n_fuzzy = 0
+    lines = []
+    for p in sorted(glob.glob(os.path.join(chunk_dir, "JA_*.srt"))):
+        num = Path(p).stem.split("_", 1)[1]
+        subs = read_srt(p)
+        out, hits, fz = [], 0, []
+        for s in subs:
+            kind, en, score, ja_tm = lookup(con, s.content)
+            if kind in ("exact", "norm"):
+                hits += 1
+                n_exact += kind == "exact"; n_norm += kind == "norm"
+                out.append(srt.Subtitle(index=s.index, start=s.start, end=s.end, content=en))
+            else:
+                if kind == "fuzzy":
+                    n_fuzzy += 1
+                    fz.append((s.index, score, clean(s.content), ja_tm, en))
+                out.append(s)
+        total += len(subs)
+        with open(os.path.join(chunk_dir, f"TM_{num}.srt"), "w", encoding="utf-8") as f:
+            f.write(srt.compose(out, reindex=False))
+        en_path = os.path.join(chunk_dir, f"EN_{num}.srt")
+        if subs and hits == len(subs) and not os.path.exists(en_path):
+            with open(en_path, "w", encoding="utf-8") as f:
+                f.write(srt.compose(out, reindex=False))
+            lines.append(f"JA_{num}: {hits}/{len(subs)} hit -> EN_{num}.srt (翻訳不要)")
+        else:
+            lines.append(f"JA_{num}: {hits}/{len(subs)} hit, fuzzy={len(fz)}")
+        for idx, score, ja, ja_tm, en in fz:
+            lines.append(f"  #{idx} ({score:.2f}) {ja}\n      TM: {ja_tm}\n      EN: {en}")
+    return total, n_exact, n_norm, n_fuzzy, lines
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=default_db())
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("add", help="JA/EN SRT ペアを登録")
+    a.add_argument("--ja", required=True)
+    a.add_argument("--en", required=True)
+    p = sub.add_parser("pretranslate", help="JA_*.srt を TM で事前充填")
+    p.add_argument("--dir", required=True, help="chunks_ja dir")
+    p.add_argument("--report", default=None, help="既定: <dir>/tm_report.txt")
+    q = sub.add_parser("lookup", help="1行検索")
+    q.add_argument("text")
+    sub.add_parser("stats")
+    args = ap.parse_args()
+
+    con = open_tm(args.db)
+    if args.cmd == "add":
+        n = add_subs(con, read_srt(args.ja), read_srt(args.en), source=os.path.basename(args.ja))
+        print(f"[tm] added/updated {n} pairs -> {args.db}")
+    elif args.cmd == "pretranslate":
+        total, n_exact, n_norm, n_fuzzy, lines = pretranslate(con, args.dir)
+        rate = (n_exact + n_norm) / total if total else 0.0
+        head = (f"[tm] cues={total} exact={n_exact} norm={n_norm} fuzzy(候補)={n_fuzzy} "
+                f"hit_rate={rate:.1%}")
+        report = args.report or os.path.join(args.dir, "tm_report.txt")
+        with open(report, "w", encoding="utf-8") as f:
+            f.write(head + "\n" + "\n".join(lines) + "\n")
+        print(head)
+        print(f"[tm] report: {report}")
+    elif args.cmd == "lookup":
+        kind, en, score, ja_tm = lookup(con, args.text)
+        print(f"{kind or 'miss'}\t{score:.2f}\t{ja_tm or ''}\t{en or ''}")
+    else:
+        n = con.execute("SELECT COUNT(*) FROM tm").fetchone()[0]
+        g = con.execute("SELECT COUNT(*) FROM grams").fetchone()[0]
+        print(f"[tm] entries={n} grams={g} db={args.db}")
+
+if __name__ == "__main__":
+    main()
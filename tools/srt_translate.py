@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JA_*.srt → EN_*.srt 自動翻訳ステージ（asyncio 並列・レート制限・リトライ・チャンク単位チェックポイント）。
+
+- プロンプト: templates/chatgpt_prompt_translation_ja_to_en.txt（chunks_ja にコピー済みならそれを優先）
+- バックエンド（差し替え可）:
+    http  … chat-completion 形式の HTTP エンドポイント（OpenAI 互換 JSON）
+    echo  … 入力をそのまま返す（配線確認用）
+    module:Class … 任意実装（async translate(system, user) -> str を持つクラス）
+- チェックポイント: 検証済みの EN_NNN.srt を原子的に書き出し、既存の EN_NNN.srt はスキップ
+  （JA が変わったチャンクの EN は srt_chunker.py が作り直す時に消す）
+  （TM で全行ヒットしたチャンクもここで自然にスキップされる）
+- 検証: 返答のキュー数・番号が送信分と一致しなければ失敗扱い（リトライ）。時刻は JA を正とする。
+- レート制限はプロセス内なので、--lock（CFG_TRANSLATE_LOCK）のファイルロックでプロセス間を直列化する
+  （Inbox の後処理を並列にしても合計が --rpm を超えない）
+
+使い方:
+  python tools/srt_translate.py run --dir Runs/<slug>/chunks_ja [--backend http] [--tm tm.sqlite]
+  python tools/srt_translate.py mock-server --port 8765   # ローカル検証用モック
+"""
+
+import os, re, sys, json, glob, time, fcntl, random, asyncio, argparse, importlib
+import contextlib
+import urllib.request
+import srt
+from pathlib import Path
+
+TEMPLATE_NAME = "chatgpt_prompt_translation_ja_to_en.txt"
+FENCE = re.compile(r"^```[a-zA-Z]*\s*\n|\n?```\s*$")
+
+# ---------------- バックエンド ----------------
+
+class EchoBackend:
+    """入力 SRT をそのまま返す（配線確認用）"""
+    def __init__(self, **_):
+        pass
+    async def translate(self, system: str, user: str) -> str:
+        return user
+
+class HttpBackend:
+    """chat-completion 形式（POST {model, messages}）→ choices[0].message.content"""
+    def __init__(self, endpoint, model="", api_key="", timeout=120.0, **_):
+        self.endpoint = endpoint
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def _post(self, system, user):
+        body = {
+            "model": self.model,
+            "temperature": 0,
+            "messages": [{"role": "system", "content": system},
+                         {"role": "user", "content": user}],
+        }
+        req = urllib.request.Request(self.endpoint, data=json.dumps(body).encode("utf-8"), method="POST")
+        req.add_header("Content-Type", "application/json")
+        if self.api_key:
+            req.add_header("Authorization", f"Bearer {self.api_key}")
+        with urllib.request.urlopen(req, timeout=self.timeout) as r:
+            js = json.loads(r.read().decode("utf-8"))
+        return js["choices"][0]["message"]["content"]
+
+    async def translate(self, system: str, user: str) -> str:
+        # urllib はブロッキングなのでスレッドへ逃がす
+        return await asyncio.to_thread(self._post, system, user)
+
+BACKENDS = {"echo": EchoBackend, "http": HttpBackend}
+
+def make_backend(name, **kw):
+    if name in BACKENDS:
+        return BACKENDS[name](**kw)
+    if ":" in name:
+        mod, attr = name.split(":", 1)
+        return getattr(importlib.import_module(mod), attr)(**kw)
+    raise SystemExit(f"[translate] unknown backend: {name}")
+
+# ---------------- レート制限 ----------------
+
+class RateLimiter:
+    """最小間隔方式（rpm<=0 で無効）"""
+    def __init__(self, rpm: float):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if self.interval <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+@contextlib.contextmanager
+def run_lock(path):
+    """翻訳プロセスを1本ずつに（path が空なら何もしない）"""
+    if not path:
+        yield
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print(f"[translate] waiting for lock: {path}")
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# ---------------- 検証・書き出し ----------------
+
+def parse_reply(text: str):
+    return list(srt.parse(FENCE.sub("", text.strip()) + "\n"))
+
+def validate(sent, got):
+    """キュー数・番号の一致を確認。問題があれば理由文字列を返す"""
+    if len(got) != len(sent):
+        return f"cue count mismatch: sent={len(sent)} got={len(got)}"
+    for a, b in zip(sent, got):
+        if a.index != b.index:
+            return f"index mismatch: sent=#{a.index} got=#{b.index}"
+        if not b.content.strip():
+            return f"empty text at #{a.index}"
+    return None
+
+def write_atomic(path, text):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def load_prompt(chunk_dir):
+    p = Path(chunk_dir) / TEMPLATE_NAME
+    if not p.exists():
+        p = Path(__file__).resolve().parents[1] / "templates" / TEMPLATE_NAME
+    return p.read_text(encoding="utf-8")
+
+# ---------------- 本体 ----------------
+
+async def translate_chunk(ja_path, backend, limiter, sem, prompt, retries, tm=None):
+    num = Path(ja_path).stem.split("_", 1)[1]
+    en_path = os.path.join(os.path.dirname(ja_path), f"EN_{num}.srt")
+    if os.path.exists(en_path):
+        return (num, "skip", 0, "")
+    with open(ja_path, "r", encoding="utf-8") as f:
+        subs = list(srt.parse(f.read()))
+
+    # TM の完全一致/正規化一致は送らない
+    filled, todo = {}, subs
+    if tm is not None:
+        import srt_tm
+        todo = []
+        for s in subs:
+            kind, en, _, _ = srt_tm.lookup(tm, s.content, fuzzy=False)
+            if kind:
+                filled[s.index] = en
+            else:
+                todo.append(s)
+
+    if todo:
+        user = srt.compose(todo, reindex=False)
+        err = ""
+        for attempt in range(retries + 1):
+            async with sem:
+                await limiter.wait()
+                try:
+                    got = parse_reply(await backend.translate(prompt, user))
+                    err = validate(todo, got)
+                except Exception as e:
+                    err = f"{type(e).__name__}: {e}"
+            if not err:
+                for b in got:
+                    filled[b.index] = b.content.strip()
+                break
+            if attempt < retries:
+                await asyncio.sleep(min(30.0, 2.0 ** attempt) + random.random())
+        else:
+            return (num, "fail", len(todo), err)
+
+    out = [srt.Subtitle(index=s.index, start=s.start, end=s.end, content=filled[s.index]) for s in subs]
+    write_atomic(en_path, srt.compose(out, reindex=False))
+    return (num, "ok", len(todo), "")
+
+async def run(chunk_dir, backend, concurrency, rpm, retries, tm=None):
+    prompt = load_prompt(chunk_dir)
+    sem = asyncio.Semaphore(max(1, concurrency))
+    limiter = RateLimiter(rpm)
+    paths = sorted(glob.glob(os.path.join(chunk_dir, "JA_*.srt")))
+    tasks = [translate_chunk(p, backend, limiter, sem, prompt, retries, tm) for p in paths]
+    return await asyncio.gather(*tasks)
+
+def serve_mock(port, prefix):
+    """chat-completion 互換のモック。user メッセージの SRT を（prefix 付きで）返す"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class H(BaseHTTPRequestHandler):
+        def do_POST(self):
+            js = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+            user = js["messages"][-1]["content"]
+            subs = list(srt.parse(user))
+            for s in subs:
+                s.content = prefix + s.content
+            body = json.dumps({"choices": [{"message": {"role": "assistant",
+                                                        "content": srt.compose(subs, reindex=False)}}]})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+        def log_message(self, *a):
+            pass
+
+    print(f"[translate] mock server on http://127.0.0.1:{port}/v1/chat/completions")
+    ThreadingHTTPServer(("127.0.0.1", port), H).serve_forever()
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run")
+    r.add_argument("--dir", required=True, help="chunks_ja dir (JA_*.srt)")
+    r.add_argument("--backend", default=os.environ.get("CFG_TRANSLATE_BACKEND", "http"))
+    r.add_argument("--endpoint", default=os.environ.get("CFG_TRANSLATE_ENDPOINT", ""))
+    r.add_argument("--model", default=os.environ.get("CFG_TRANSLATE_MODEL", ""))
+    r.add_argument("--concurrency", type=int, default=int(os.environ.get("CFG_TRANSLATE_CONCURRENCY", "4")))
+    r.add_argument("--rpm", type=float, default=float(os.environ.get("CFG_TRANSLATE_RPM", "60")))
+    r.add_argument("--retries", type=int, default=int(os.environ.get("CFG_TRANSLATE_RETRIES", "3")))
+    r.add_argument("--tm", default=os.environ.get("CFG_TM_DB") or None, help="翻訳メモリ DB（ヒット行は送らない）")
+    r.add_argument("--lock", default=os.environ.get("CFG_TRANSLATE_LOCK", ""),
+                   help="プロセス間で翻訳を直列化するロックファイル（空で無効。--rpm 0 でも無効）")
+    m = sub.add_parser("mock-server")
+    m.add_argument("--port", type=int, default=8765)
+    m.add_argument("--prefix", default="[EN] ")
+    args = ap.parse_args()
+
+    if args.cmd == "mock-server":
+        serve_mock(args.port, args.prefix)
+        return
+
+    backend = make_backend(args.backend, endpoint=args.endpoint, model=args.model,
+                           api_key=os.environ.get("CFG_TRANSLATE_API_KEY", ""))
+    tm = None
+    if args.tm and os.path.exists(args.tm):
+        import srt_tm
+        tm = srt_tm.open_tm(args.tm)
+
+    with run_lock(args.lock if args.rpm > 0 else ""):
+        t0 = time.time()
+        results = asyncio.run(run(args.dir, backend, args.concurrency, args.rpm, args.retries, tm))
+    n_ok = sum(1 for _, st, _, _ in results if st == "ok")
+    n_skip = sum(1 for _, st, _, _ in results if st == "skip")
+    fails = [(num, err) for num, st, _, err in results if st == "fail"]
+    sent = sum(n for _, st, n, _ in results if st == "ok")
+    for num, err in fails:
+        print(f"[translate] FAIL JA_{num}: {err}")
+    print(f"[translate] chunks ok={n_ok} skip={n_skip} fail={len(fails)} sent_cues={sent} "
+          f"elapsed={time.time()-t0:.1f}s backend={args.backend}")
+    sys.exit(1 if fails else 0)
+
+if __name__ == "__main__":
+    main()
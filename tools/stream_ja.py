@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ライブ入力（stdin / FIFO の PCM）からローリング字幕を出す。
+
+- 固定ブロックで PCM を読み、未確定区間（最後に確定した語の終わり以降、最大 --window 秒）を
+  faster-whisper で繰り返しデコード（word_timestamps=True, greedy）
+- 仮説の扱い: 連続する2回の仮説で一致した先頭語列だけを「確定」(LocalAgreement-2)、残りは「仮」
+- 確定語は segment_ja.segment で区切り、最後の1キュー以外（または強ポーズ後）を確定キューとして
+  srt_lint_polish.wrap_ja で折返して SRT / WebVTT に追記出力
+- 遅延: キュー終了の音声時刻 → 出力した実時刻の差（audio-to-cue delay）を集計
+
+入力: s16le / mono / --rate Hz（既定 16000）。先頭が RIFF なら WAV ヘッダを読み飛ばす。
+
+使い方:
+  python tools/stream_ja.py feed input.wav | python tools/stream_ja.py run -o live.srt
+  mkfifo /tmp/live.pcm; python tools/stream_ja.py run --input /tmp/live.pcm -o live.vtt
+"""
+import os, sys, json, time, struct, argparse
+import numpy as np
+from segment_ja import Tok, segment
+from srt_lint_polish import wrap_ja, s2t
+
+SR = 16000
+
+# ---------------- 入力 ----------------
+
+def open_pcm(path):
+    """(ファイルオブジェクト, sample_rate, channels)。WAV ヘッダがあれば解釈する"""
+    f = sys.stdin.buffer if path in (None, "-") else open(path, "rb")
+    head = f.read(12)
+    if head[:4] != b"RIFF":
+        return f, None, None, head
+    rate, ch = SR, 1
+    while True:
+        hdr = f.read(8)
+        if len(hdr) < 8:
+            raise SystemExit("[stream] WAV に data チャンクがありません")
+        cid, size = hdr[:4], struct.unpack("<I", hdr[4:])[0]
+        if cid == b"fmt ":
+            fmt = f.read(size)
+            ch, rate = struct.unpack("<HI", fmt[2:8])
+            bits = struct.unpack("<H", fmt[14:16])[0]
+            if bits != 16:
+                raise SystemExit("[stream] 16bit PCM のみ対応")
+        elif cid == b"data":
+            return f, rate, ch, b""
+        else:
+            f.read(size + (size & 1))
+
+def pcm_blocks(f, rate, ch, block_sec, pre=b""):
+    """float32 mono 16k のブロックを yield"""
+    nbytes = int(block_sec * rate) * 2 * ch
+    buf = pre
+    eof = False
+    while not eof:
+        while len(buf) < nbytes:
+            chunk = f.read(nbytes - len(buf))
+            if not chunk:
+                eof = True; break
+            buf += chunk
+        n = len(buf) // (2 * ch) * (2 * ch)
+        if n == 0:
+            break
+        x = np.frombuffer(buf[:n], dtype="<i2").astype(np.float32) / 32768.0
+        buf = buf[n:]
+        if ch > 1:
+            x = x.reshape(-1, ch).mean(axis=1)
+        if rate != SR:
+            # ライブ用の軽量線形補間（高品質リサンプルはバッチ側で実施）
+            m = int(round(len(x) * SR / rate))
+            x = np.interp(np.linspace(0, len(x) - 1, m), np.arange(len(x)), x).astype(np.float32)
+        yield x
+
+# ---------------- 出力 ----------------
+
+class CueWriter:
+    def __init__(self, path):
+        self.path = path
+        self.vtt = bool(path) and path.lower().endswith(".vtt")
+        self.n = 0
+        self.f = open(path, "w", encoding="utf-8") if path else None
+        if self.f and self.vtt:
+            self.f.write("WEBVTT\n\n"); self.f.flush()
+
+    def emit(self, st, en, text):
+        self.n += 1
+        a, b = s2t(st), s2t(en)
+        if self.vtt:
+            a, b = a.replace(",", "."), b.replace(",", ".")
+        blk = f"{self.n}\n{a} --> {b}\n{text}\n\n"
+        if self.f:
+            self.f.write(blk); self.f.flush()
+        sys.stdout.write(blk); sys.stdout.flush()
+
+# ---------------- ストリーミング本体 ----------------
+
+class Streamer:
+    def __init__(self, model, args, writer):
+        self.model = model
+        self.a = args
+        self.w = writer
+        self.audio = np.zeros(0, dtype=np.float32)  # 未確定区間の音声
+        self.offset = 0.0        # self.audio[0] の絶対時刻
+        self.now = 0.0           # 受信済み音声の終端（絶対時刻）
+        self.prev_hyp = []       # 前回仮説（確定点以降）
+        self.pending = []        # 確定済みだがキュー未出力の Tok
+        self.committed_text = ""
+        self.t0 = None
+        self.delays = []
+
+    def feed(self, x):
+        if self.t0 is None:
+            self.t0 = time.monotonic()
+        self.audio = np.concatenate((self.audio, x))
+        self.now += len(x) / SR
+
+    def decode(self):
+        segs, _ = self.model.transcribe(
+            self.audio, language="ja", beam_size=1, word_timestamps=True,
+            condition_on_previous_text=False, vad_filter=False,
+            initial_prompt=self.committed_text[-100:] or None)
+        hyp = []
+        for s in segs:
+            for w in (s.words or []):
+                hyp.append(Tok(w.word.strip(), self.offset + float(w.start), self.offset + float(w.end)))
+        return [t for t in hyp if t.t]
+
+    def commit(self, toks):
+        if not toks:
+            return
+        self.pending.extend(toks)
+        self.committed_text += "".join(t.t for t in toks)
+        # 確定点まで音声を捨てる
+        cut = toks[-1].en
+        k = max(0, int((cut - self.offset) * SR))
+        self.audio = self.audio[k:]
+        self.offset += k / SR
+
+    def step(self):
+        hyp = self.decode()
+        # LocalAgreement-2: 前回仮説と一致する先頭語列を確定
+        n = 0
+        while n < len(hyp) and n < len(self.prev_hyp) and hyp[n].t == self.prev_hyp[n].t:
+            n += 1
+        self.commit(hyp[:n])
+        self.prev_hyp = hyp[n:]
+        # 窓が長すぎる場合は末尾 2 秒を残して強制確定
+        if self.now - self.offset > self.a.window:
+            force = [t for t in self.prev_hyp if t.en <= self.now - 2.0]
+            self.commit(force)
+            self.prev_hyp = self.prev_hyp[len(force):]
+            if self.now - self.offset > self.a.window:  # 語が無い（無音）区間
+                k = int((self.now - self.offset - 2.0) * SR)
+                self.audio = self.audio[k:]; self.offset += k / SR
+        self.flush_cues(final=False)
+
+    def flush_cues(self, final):
+        if not self.pending:
+            return
+        a = self.a
+        cues = segment(self.pending, a.min_dur, a.max_dur, a.pause_strong, a.pause_weak, a.target_cps, a.max_chars)
+        # 最後のキューは伸びる可能性がある → 強ポーズ後 or 終端のみ確定
+        tail_gap = self.now - self.pending[-1].en
+        keep_last = not final and (tail_gap < a.pause_strong or bool(self.prev_hyp))
+        done = cues[:-1] if keep_last else cues
+        used = 0
+        for st, en, txt in done:
+            self.w.emit(st, en, wrap_ja(txt, max_chars=a.max_chars))
+            self.delays.append((time.monotonic() - self.t0) - en)
+            used += len(txt)
+        # 出力済みの Tok を pending から除く
+        n_chars = 0; k = 0
+        while k < len(self.pending) and n_chars < used:
+            n_chars += len(self.pending[k].t); k += 1
+        self.pending = self.pending[k:]
+
+    def finish(self):
+        if len(self.audio) > SR * 0.2:
+            hyp = self.decode()
+            self.commit(hyp)
+            self.prev_hyp = []
+        self.flush_cues(final=True)
+
+    def metrics(self):
+        d = np.array(self.delays) if self.delays else np.zeros(1)
+        return {"cues": len(self.delays), "audio_sec": round(self.now, 2),
+                "delay_mean": round(float(d.mean()), 3), "delay_p50": round(float(np.percentile(d, 50)), 3),
+                "delay_p95": round(float(np.percentile(d, 95)), 3), "delay_max": round(float(d.max()), 3)}
+
+def run(args):
+    from faster_whisper import WhisperModel
+    model = WhisperModel(args.model, device=os.environ.get("CFG_DEVICE_ASR", "cpu"),
+                         compute_type=os.environ.get("CFG_CT2_COMPUTE") or "int8")
+    f, rate, ch, pre = open_pcm(args.input)
+    rate = rate or args.rate; ch = ch or 1
+    writer = CueWriter(args.output)
+    st = Streamer(model, args, writer)
+    since = 0.0
+    for x in pcm_blocks(f, rate, ch, args.block, pre):
+        st.feed(x)
+        since += len(x) / SR
+        if since >= args.step:
+            since = 0.0
+            st.step()
+    st.finish()
+    m = st.metrics()
+    print(f"[stream] cues={m['cues']} audio={m['audio_sec']}s delay mean={m['delay_mean']}s "
+          f"p95={m['delay_p95']}s max={m['delay_max']}s", file=sys.stderr)
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as fo:
+            json.dump(m, fo, ensure_ascii=False, indent=2)
+
+def feed(args):
+    """WAV を 16k/s16le/mono に変換し、実時間レートで stdout へ流す（テスト用）"""
+    from transcribe_from_wav import read_and_normalize
+    x = read_and_normalize(args.wav)
+    pcm = (np.clip(x, -1, 1) * 32767).astype("<i2").tobytes()
+    step = int(args.block * SR) * 2
+    out = sys.stdout.buffer
+    t0 = time.monotonic()
+    for i in range(0, len(pcm), step):
+        out.write(pcm[i:i+step]); out.flush()
+        lag = t0 + (i + step) / 2 / SR / args.speed - time.monotonic()
+        if lag > 0:
+            time.sleep(lag)
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run")
+    r.add_argument("--input", default="-", help="PCM 入力（- = stdin、FIFO 可）")
+    r.add_argument("-o", "--output", default=None, help=".srt / .vtt（ローリング追記）")
+    r.add_argument("--rate", type=int, default=SR)
+    r.add_argument("--model", default=os.environ.get("CFG_STREAM_MODEL", "small"))
+    r.add_argument("--block", type=float, default=0.5, help="読み込みブロック (sec)")
+    r.add_argument("--step", type=float, default=1.0, help="再デコード間隔 (sec)")
+    r.add_argument("--window", type=float, default=15.0, help="未確定窓の上限 (sec)")
+    r.add_argument("--metrics", default=None, help="遅延メトリクス JSON 出力先")
+    r.add_argument("--min-dur", type=float, default=float(os.environ.get("JA_MIN_DUR", "1.0")))
+    r.add_argument("--max-dur", type=float, default=float(os.environ.get("JA_MAX_DUR", "6.0")))
+    r.add_argument("--pause-strong", type=float, default=float(os.environ.get("JA_PAUSE_STRONG", "0.35")))
+    r.add_argument("--pause-weak", type=float, default=float(os.environ.get("JA_PAUSE_WEAK", "0.25")))
+    r.add_argument("--target-cps", type=float, default=float(os.environ.get("JA_TARGET_CPS", "15.0")))
+    r.add_argument("--max-chars", type=int, default=int(os.environ.get("JA_MAX_CHARS", "40")))
+    fd = sub.add_parser("feed")
+    fd.add_argument("wav")
+    fd.add_argument("--block", type=float, default=0.1)
+    fd.add_argument("--speed", type=float, default=1.0, help="1.0 = 実時間")
+    args = ap.parse_args()
+    run(args) if args.cmd == "run" else feed(args)
+
+if __name__ == "__main__":
+    main()
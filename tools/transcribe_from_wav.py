@@ -1,15 +1,18 @@
 # /Users/sato/Scripts/Whisper/tools/transcribe_from_wav.py
 #!/usr/bin/env python3
-import os, sys, json, argparse, math
+import os, sys, json, time, argparse, math, hashlib
 import numpy as np
 import soundfile as sf
-import torch
-import torchaudio
-from faster_whisper import WhisperModel
-import whisperx
 import srt
 from datetime import timedelta
 from pathlib import Path
+from audio_vad import KeepMap, speech_regions, save_energy
+from asr_repeat import repair_loops
+import asr_adaptive
+from asr_chunk_cache import ChunkCache, transcribe_chunks, default_db as asr_cache_db
+from autotune_asr import load_host_profile
+from asr_backends import load_backend
+import ctc_align
 
 def read_and_normalize(wav_path: str) -> np.ndarray:
     data, sr = sf.read(wav_path, dtype="float32", always_2d=False)
@@ -17,6 +20,7 @@ def read_and_normalize(wav_path: str) -> np.ndarray:
         data = data.mean(axis=1)
     if sr != 16000:
         # resample to 16k (cpu)
+        import torch, torchaudio
         x = torch.from_numpy(data).unsqueeze(0)
         y = torchaudio.functional.resample(x, orig_freq=sr, new_freq=16000)
         data = y.squeeze(0).numpy()
@@ -39,34 +43,251 @@ def save_srt(segments, out_path: str):
     with open(out_path, "w", encoding="utf-8") as f:
         f.write(srt.compose(items))
 
+# ---------------- チェックポイント（長尺の中断・再開） ----------------
+# asr/segments.jsonl … 1行目 meta（入力・設定のキー）、以降は確定セグメント（ASR 時間軸）を1行ずつ追記、
+#                      最後まで終わると done 行。再起動時はキー一致なら最後の end から少し戻って再開する。
+# asr/align_ckpt/    … アラインの窓ごとの結果（窓内セグメントのハッシュで照合）
+
+def run_key(*parts):
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(json.dumps(p, ensure_ascii=False, sort_keys=True).encode("utf-8")); h.update(b"\0")
+    return h.hexdigest()
+
+def load_journal(path, key):
+    """(segments, done)。キー不一致・破損時は ([], False)"""
+    if not path.exists():
+        return [], False
+    segs, done = [], False
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f):
+            try:
+                js = json.loads(line)
+            except ValueError:
+                break  # 書きかけの最終行
+            if n == 0:
+                if js.get("type") != "meta" or js.get("key") != key:
+                    print("[transcribe] journal は別設定のもの → 最初から")
+                    return [], False
+                continue
+            if js.get("type") == "done":
+                done = True; break
+            segs.append(js["seg"])
+    return segs, done
+
+class Journal:
+    def __init__(self, path, key, segs):
+        # 破損行を捨てるため、読めた分で書き直してから追記する
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "meta", "key": key}) + "\n")
+            for sg in segs:
+                f.write(json.dumps({"type": "seg", "seg": sg}, ensure_ascii=False) + "\n")
+        os.replace(tmp, path)
+        self.f = open(path, "a", encoding="utf-8")
+
+    def append(self, seg):
+        self.f.write(json.dumps({"type": "seg", "seg": seg}, ensure_ascii=False) + "\n")
+        self.f.flush(); os.fsync(self.f.fileno())
+
+    def done(self):
+        self.f.write(json.dumps({"type": "done"}) + "\n")
+        self.f.close()
+
+def dedup_resumed(new_segs, resume_t, last_text):
+    """重なり区間の再デコード結果から、確定済みと重複するセグメントを落とす"""
+    out = []
+    for sg in new_segs:
+        if (sg["start"] + sg["end"]) / 2 <= resume_t or (not out and sg["text"] == last_text):
+            continue
+        if not out and sg["start"] < resume_t:
+            # 継ぎ目を跨ぐセグメントは確定済みの終端から始める
+            sg["start"] = resume_t
+            if sg.get("words"):
+                sg["words"] = [w for w in sg["words"] if w["end"] > resume_t]
+        out.append(sg)
+    return out
+
+def shifted(d, base):
+    """バックエンドの segment（部分音声先頭からの秒）を ASR 時間軸へ"""
+    if base:
+        d = dict(d, start=base + d["start"], end=base + d["end"])
+        if d.get("words"):
+            d["words"] = [dict(w, start=base + w["start"], end=base + w["end"]) for w in d["words"]]
+    return d
+
+def align_windows(segments, window_sec):
+    """セグメントを約 window_sec 秒ごとの窓（index 範囲）に分ける"""
+    wins, lo = [], 0
+    for k in range(1, len(segments) + 1):
+        if k == len(segments) or segments[k]["start"] - segments[lo]["start"] >= window_sec:
+            wins.append((lo, k)); lo = k
+    return wins
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", required=True)
     ap.add_argument("--run-dir", required=True)
     ap.add_argument("--slug", required=True)
+    ap.add_argument("--audio", default=None, help="先読み済みの 16k float32 .npy（tools/audio_prefetch.py）")
     args = ap.parse_args()
 
     run_dir = Path(args.run_dir)
     asr_dir = run_dir / "asr"
     asr_dir.mkdir(parents=True, exist_ok=True)
 
+    backend_name = os.environ.get("CFG_ASR_BACKEND", "faster-whisper")  # fake = モデル無しのベンチ用（tools/asr_backends.py）
     model_name = os.environ.get("CFG_MODEL", "large-v2")
-    compute_type = os.environ.get("CFG_CT2_COMPUTE", "int8")
+    compute_type = os.environ.get("CFG_CT2_COMPUTE", "")  # 空 = ホストプロファイル → int8
     device_asr = os.environ.get("CFG_DEVICE_ASR", "cpu")
     device_align = os.environ.get("CFG_DEVICE_ALIGN", "cpu")
+    beam_size = int(os.environ.get("CFG_BEAM_SIZE", "5"))
+    # adaptive = greedy で全体 → 低信頼の窓だけ beam_size で再デコード（tools/asr_adaptive.py）
+    beam_mode = os.environ.get("CFG_BEAM_MODE", "fixed")
+    if beam_mode not in ("fixed", "adaptive"):
+        raise SystemExit(f"[transcribe] CFG_BEAM_MODE={beam_mode} は未対応（fixed|adaptive）")
+    decode_beam = 1 if beam_mode == "adaptive" else beam_size
+
+    # ホストプロファイル（bin/autotune.sh の計測結果）のうち、このモデルで計測したスレッド設定を使う。
+    # compute は CFG_CT2_COMPUTE を明示していればそちら
+    prof = load_host_profile(model_name) if device_asr == "cpu" else {}
+    ct_explicit = compute_type
+    compute_type = compute_type or prof.get("compute_type", "int8")
+    cpu_threads = int(prof.get("cpu_threads", 0))      # 0 = faster-whisper 既定
+    if prof.get("torch_threads"):
+        import torch
+        torch.set_num_threads(int(prof["torch_threads"]))
+    if prof:
+        print(f"[transcribe] host profile ({model_name}): {prof}"
+              + (f" / compute は CFG_CT2_COMPUTE={ct_explicit}" if ct_explicit and "compute_type" in prof else ""))
+
+    vad_trim = os.environ.get("CFG_VAD_TRIM", "1") == "1"
+    # none = faster-whisper の word_timestamps をそのまま aligned.json に（wav2vec2 アラインを省略）
+    # ctc  = whisperx と同じモデルの emission をキャッシュして自前で強制アライン（修正後の再アライン用、tools/ctc_align.py）
+    align_mode = os.environ.get("CFG_ALIGN", "whisperx")
+    if align_mode not in ("none", "whisperx", "ctc"):
+        raise SystemExit(f"[transcribe] CFG_ALIGN={align_mode} は未対応（none|whisperx|ctc）")
+
+    print(f"[transcribe] backend={backend_name} model={model_name} compute={compute_type} asr_device={device_asr} "
+          f"align={align_mode} align_device={device_align}")
+    if args.audio and os.path.exists(args.audio):
+        audio = np.load(args.audio)  # Inbox のパイプライン実行で前段がデコード・リサンプル済み
+    else:
+        audio = read_and_normalize(args.input)
+    # 字幕境界のスナップ用エネルギー包絡（元の時間軸、srt_lint_polish.py --energy が使う）。
+    # 窓・刻みは VAD と同じなので、下の speech_regions にもこの1回分を渡す
+    energy_db = save_energy(asr_dir / "energy.npz", audio)
 
-    print(f"[transcribe] model={model_name} compute={compute_type} asr_device={device_asr} align_device={device_align}")
-    audio = read_and_normalize(args.input)
+    # --- 無音スキップ（keep-map。ASR/アラインは連結音声で実行し、最後に元の時間軸へ戻す）---
+    if vad_trim:
+        min_sil = float(os.environ.get("CFG_VAD_MIN_SILENCE", "1.0"))
+        regions = speech_regions(audio, min_silence=min_sil, db=energy_db)
+        keep = KeepMap(regions, len(audio)) if regions else KeepMap.identity(len(audio))
+    else:
+        keep = KeepMap.identity(len(audio))
+    # 無効時も恒等写像を書く（前回の keep-map が残ると ctc_align realign が古い時間対応を使う）
+    with open(asr_dir / "keepmap.json", "w", encoding="utf-8") as f:
+        json.dump(keep.to_json(), f)
+    asr_audio = keep.apply(audio)
+    print(f"[vad] kept {keep.kept_sec:.1f}s / {keep.total_sec:.1f}s "
+          f"(skipped {keep.skipped_sec:.1f}s, {keep.skipped_sec/max(1e-6, keep.total_sec):.1%}) "
+          f"regions={len(keep.regions)}")
 
     # --- ASR (faster-whisper) ---
-    model = WhisperModel(model_name, device=device_asr, compute_type=compute_type)
-    segments_iter, info = model.transcribe(audio, language="ja", task="transcribe", beam_size=5)
-    segments = []
-    for seg in segments_iter:
-        segments.append({"start": float(seg.start), "end": float(seg.end), "text": seg.text.strip()})
+    backend = load_backend(backend_name, model=model_name, device=device_asr, compute_type=compute_type,
+                           cpu_threads=cpu_threads, align_device=device_align)
+    t0 = time.time()
+    st_in = os.stat(args.input)
+    # テイク間のチャンク再利用（tools/asr_chunk_cache.py）。チャンク単位でデコードするので journal も別物
+    use_cache = os.environ.get("CFG_ASR_CACHE", "0") == "1"
+    key = run_key(os.path.abspath(args.input), st_in.st_size, int(st_in.st_mtime), model_name, compute_type,
+                  beam_size, align_mode, keep.to_json(), *(["asr-cache"] if use_cache else []),
+                  *([backend_name] if backend_name != "faster-whisper" else []),
+                  *(["beam-adaptive"] if beam_mode == "adaptive" else []))
+    cache_stats = None
+    journal_path = asr_dir / "segments.jsonl"
+    segments, asr_done = load_journal(journal_path, key)
+    if asr_done:
+        print(f"[transcribe] journal 完了済み: {len(segments)} segments（ASR をスキップ）")
+    else:
+        journal = Journal(journal_path, key, segments)
+        overlap = float(os.environ.get("CFG_RESUME_OVERLAP", "2.0"))
+        resume_t = segments[-1]["end"] if segments else 0.0
+        base = max(0.0, resume_t - overlap) if segments else 0.0
+        if segments:
+            print(f"[transcribe] resume from {resume_t:.1f}s ({len(segments)} segments in journal, overlap {overlap:.1f}s)")
+    if not asr_done and use_cache:
+        cache = ChunkCache(asr_cache_db())
+        ckey = run_key(backend_name, model_name, compute_type, decode_beam, align_mode == "none")
+
+        def decode(part):
+            return list(backend.transcribe(part, beam_size=decode_beam, word_timestamps=(align_mode == "none")))
+
+        def emit(segs):
+            for d in segs:
+                if d["text"]:
+                    segments.append(d); journal.append(d)
+        # チャンクは journal へまとめて書くので、resume_t より前に始まるチャンクは完了済み
+        cache_stats = transcribe_chunks(asr_audio, decode, cache, ckey, emit, resume_t=resume_t)
+        journal.done()
+        print(f"[transcribe] asr cache: reused {cache_stats['reused']}/{cache_stats['chunks']} chunks, "
+              f"reuse ratio {cache_stats['reuse_ratio']:.1%} ({cache_stats['reused_sec']:.1f}s reused, "
+              f"{cache_stats['decoded_sec']:.1f}s decoded)")
+        with open(asr_dir / "asr_cache.json", "w", encoding="utf-8") as f:
+            json.dump(cache_stats, f, indent=2)
+    elif not asr_done:
+        k0 = int(base * 16000)
+        segments_iter = backend.transcribe(asr_audio[k0:], beam_size=decode_beam, word_timestamps=(align_mode == "none"),
+                                         initial_prompt=(segments[-1]["text"] if segments else None))
+        def decoded():
+            for d in segments_iter:
+                yield shifted(d, base)
+        pending_dedup = bool(segments)
+        last_text = segments[-1]["text"] if segments else ""
+        for d in decoded():
+            if pending_dedup:
+                kept = dedup_resumed([d], resume_t, last_text)
+                if not kept:
+                    continue
+                d = kept[0]; pending_dedup = False
+            segments.append(d)
+            journal.append(d)
+        journal.done()
+    t_asr = time.time() - t0
+    adaptive_stats = None
+    if beam_mode == "adaptive" and segments:
+        segments, adaptive_stats = asr_adaptive.refine(backend, asr_audio, segments, beam_size,
+                                                       word_timestamps=(align_mode == "none"))
+        asr_adaptive.summarize(adaptive_stats, t_asr)
+        t_asr += adaptive_stats["beam_sec"]
+        with open(asr_dir / "adaptive.json", "w", encoding="utf-8") as f:
+            json.dump(adaptive_stats, f, indent=2)
+        gain = adaptive_stats["speedup_vs_beam"]
+        print(f"[transcribe] adaptive beam: {adaptive_stats['low_conf']}/{adaptive_stats['segments']} low-confidence "
+              f"segments, re-decoded {adaptive_stats['redecoded_sec']:.1f}s ({adaptive_stats['redecoded_ratio']:.1%}) "
+              f"with beam={beam_size}" + (f", est. x{gain:.2f} vs always-beam" if gain else ""))
+    if keep.total_sec > 0 and keep.kept_sec > 0:
+        rtf = t_asr / keep.total_sec
+        print(f"[transcribe] asr {t_asr:.1f}s rtf={rtf:.3f} "
+              f"(full-audio est rtf={t_asr / keep.kept_sec:.3f}, gain x{keep.total_sec / keep.kept_sec:.2f})")
+
+    # --- 反復ループ（無音・音楽上の幻覚）の窓だけ再デコード（tools/asr_repeat.py）---
+    t_loop = 0.0
+    if os.environ.get("CFG_LOOP_FIX", "1") == "1" and segments:
+        t2 = time.time()
+        segments, ls = repair_loops(backend, asr_audio, segments, beam_size=beam_size,
+                                    word_timestamps=(align_mode == "none"))
+        t_loop = time.time() - t2
+        ls["regions"] = keep.map_segments(ls["regions"])  # ログは元の時間軸で
+        with open(asr_dir / "loops.json", "w", encoding="utf-8") as f:
+            json.dump(ls, f, ensure_ascii=False, indent=2)
+        if ls["regions"]:
+            print(f"[transcribe] loop fix: {len(ls['regions'])} windows, re-decoded {ls['redecoded_sec']:.1f}s "
+                  f"({ls['redecoded_ratio']:.2%} of asr audio), replaced {ls['replaced']} segments, "
+                  f"dropped {ls['dropped']} ({t_loop:.1f}s)")
 
     raw_srt = asr_dir / f"{args.slug}_ja-JP_raw.srt"
-    save_srt(segments, str(raw_srt))
+    save_srt(keep.map_segments([{k: v for k, v in s.items() if k != "words"} for s in segments]), str(raw_srt))
     # 固定名リンク
     try:
         p = asr_dir / "ja-JP_raw.srt"
@@ -77,14 +298,64 @@ def main():
         print(f"[warn] symlink ja-JP_raw.srt: {e}")
 
     # --- Alignment (WhisperX, CPU 固定) ---
-    print("[transcribe] load align model (ja, cpu)")
-    align_model, metadata = whisperx.load_align_model(language_code="ja", device=device_align)
-    aligned_result = whisperx.align(segments, align_model, metadata, audio, device=device_align, return_char_alignments=False)
+    t1 = time.time()
+    if align_mode in ("whisperx", "ctc"):
+        # 窓ごとにアラインして asr/align_ckpt/ へ保存（再開時は一致する窓を読み込むだけ）
+        ckpt_dir = asr_dir / "align_ckpt"
+        ckpt_dir.mkdir(exist_ok=True)
+        emis_dir = asr_dir / "emissions"  # ctc: 窓ごとの emission（win_NNNN.npz）
+        if align_mode == "ctc":
+            emis_dir.mkdir(exist_ok=True)
+        window_sec = float(os.environ.get("CFG_ALIGN_WINDOW", "300"))
+        aligned_segments = []
+        wins = align_windows(segments, window_sec)
+        n_reused = 0
+        for w, (lo, hi) in enumerate(wins):
+            part = [{k: v for k, v in sg.items() if k != "words"} for sg in segments[lo:hi]]
+            wkey = run_key(key, part, *(["ctc"] if align_mode == "ctc" else []))
+            cp = ckpt_dir / f"win_{w:04d}.json"
+            ep = emis_dir / f"win_{w:04d}.npz"
+            if cp.exists() and (align_mode != "ctc" or ep.exists()):
+                try:
+                    with open(cp, "r", encoding="utf-8") as f:
+                        js = json.load(f)
+                    if js.get("key") == wkey:
+                        aligned_segments.extend(js["segments"]); n_reused += 1
+                        continue
+                except ValueError:
+                    pass
+            if align_mode == "ctc":
+                segs_w = ctc_align.align_window(backend, part, asr_audio, ep)
+            else:
+                segs_w = backend.align(part, asr_audio)
+            with open(cp.with_suffix(".tmp"), "w", encoding="utf-8") as f:
+                json.dump({"key": wkey, "segments": segs_w}, f, ensure_ascii=False)
+            os.replace(cp.with_suffix(".tmp"), cp)
+            aligned_segments.extend(segs_w)
+        if n_reused:
+            print(f"[transcribe] align checkpoints reused: {n_reused}/{len(wins)} windows")
+        if align_mode == "ctc":
+            ctc_align.write_index(emis_dir, backend, segments, wins, keep)
+    else:
+        print("[transcribe] align skipped (CFG_ALIGN=none, faster-whisper word timestamps)")
+        aligned_segments = segments
+    t_align = time.time() - t1
 
     aligned_json = {
         "language": "ja",
-        "segments": aligned_result.get("segments", [])
+        "align": align_mode,
+        "segments": keep.map_segments(aligned_segments)
     }
+    # 所要時間（tools/align_compare.py が none/whisperx の比較に使う）
+    with open(asr_dir / "timing.json", "w", encoding="utf-8") as f:
+        json.dump({"backend": backend_name, "align": align_mode, "model": model_name, "beam_size": beam_size, "beam_mode": beam_mode,
+                   "audio_sec": round(keep.total_sec, 3), "asr_input_sec": round(keep.kept_sec, 3),
+                   "asr_sec": round(t_asr, 3),
+                   "asr_reuse_ratio": cache_stats["reuse_ratio"] if cache_stats else None,
+                   "beam_redecoded_ratio": adaptive_stats["redecoded_ratio"] if adaptive_stats else None,
+                   "beam_speedup_est": adaptive_stats["speedup_vs_beam"] if adaptive_stats else None, "loop_fix_sec": round(t_loop, 3), "align_sec": round(t_align, 3),
+                   "total_sec": round(t_asr + t_loop + t_align, 3)}, f, indent=2)
+    print(f"[transcribe] asr {t_asr:.1f}s + align {t_align:.1f}s ({align_mode})")
 
     out_json = asr_dir / f"{args.slug}_aligned.json"
     with open(out_json, "w", encoding="utf-8") as f:
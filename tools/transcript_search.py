@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全 Run の字幕・ASR 結果の全文検索（SQLite の転置索引、時刻付きヒット）。
+
+- 対象: Workspace/Runs/<slug>/final/*.srt と asr/aligned.json（セグメント）
+- 索引: 正規化テキスト（NFKC・小文字化・空白除去）の文字 2-gram → キュー。
+  Sudachi があれば形態素の正規化形（"m:" 接頭辞）も登録し、--lemma で活用違いも引ける
+- update は (サイズ, mtime) が変わったファイルだけ入れ替え、消えたファイルは索引から外す
+- フレーズ検索は最も稀な 2-gram で候補を引いて残りの 2-gram で絞り、正規化テキストの部分一致で確認する
+
+使い方:
+  python tools/transcript_search.py update [--morph]
+  python tools/transcript_search.py query "納付期限" [--run SLUG] [--source final|asr] [--limit 50] [--json]
+  python tools/transcript_search.py query "払う" --lemma
+  python tools/transcript_search.py stats
+"""
+import os, re, sys, json, time, sqlite3, argparse, unicodedata
+from pathlib import Path
+import srt
+
+NGRAM = 2
+RARE_CAP = 10000   # 候補キー選びで数える posting の上限
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files(
+  id    INTEGER PRIMARY KEY,
+  path  TEXT NOT NULL UNIQUE,
+  run   TEXT NOT NULL,
+  src   TEXT NOT NULL,
+  sig   TEXT NOT NULL,
+  morph INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cues(
+  id      INTEGER PRIMARY KEY,
+  file_id INTEGER NOT NULL,
+  cue     INTEGER NOT NULL,
+  start   REAL NOT NULL,
+  end     REAL NOT NULL,
+  text    TEXT NOT NULL,
+  norm    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cues_file ON cues(file_id);
+CREATE TABLE IF NOT EXISTS postings(
+  gram   TEXT NOT NULL,
+  cue_id INTEGER NOT NULL,
+  PRIMARY KEY(gram, cue_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_cue ON postings(cue_id);
+"""
+
+def workspace():
+    return Path(os.environ.get("WORKSPACE_ROOT", Path(__file__).resolve().parents[1] / "Workspace"))
+
+def default_db():
+    return os.environ.get("CFG_SEARCH_DB") or str(workspace() / "search.sqlite")
+
+def open_index(path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(path)
+    con.executescript(SCHEMA)
+    return con
+
+def normalize(text):
+    t = unicodedata.normalize("NFKC", text).casefold()
+    return re.sub(r"\s+", "", t)
+
+def grams(norm):
+    if len(norm) < NGRAM:
+        return {norm} if norm else set()
+    return {norm[i:i+NGRAM] for i in range(len(norm) - NGRAM + 1)}
+
+def morph_keys(tk, mode, text):
+    if tk is None or not text:
+        return set()
+    return {"m:" + m.normalized_form() for m in tk.tokenize(text, mode) if m.part_of_speech()[0] not in ("補助記号", "空白")}
+
+def _sudachi():
+    from segment_ja import _sudachi_tokenizer
+    return _sudachi_tokenizer()
+
+# ---------------- 収集 ----------------
+
+def sources(runs_root):
+    """(path, run, src) の列。src は final の SRT ファイル名 or "asr" """
+    for run in sorted(p for p in runs_root.iterdir() if p.is_dir()) if runs_root.exists() else []:
+        for p in sorted((run / "final").glob("*.srt")):
+            if not p.is_symlink():
+                yield p, run.name, p.name
+        a = run / "asr" / "aligned.json"
+        if a.exists():
+            yield a, run.name, "asr"
+
+def signature(path):
+    st = path.stat()  # aligned.json はリンク先
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+def read_cues(path, src):
+    """[(start, end, text)]"""
+    if src == "asr":
+        with open(path, "r", encoding="utf-8") as f:
+            segs = json.load(f).get("segments", [])
+        return [(float(s["start"]), float(s["end"]), s.get("text", "").strip()) for s in segs
+                if isinstance(s.get("start"), (int, float)) and isinstance(s.get("end"), (int, float))]
+    with open(path, "r", encoding="utf-8") as f:
+        return [(s.start.total_seconds(), s.end.total_seconds(), s.content.strip()) for s in srt.parse(f.read())]
+
+def drop_file(con, file_id):
+    con.execute("DELETE FROM postings WHERE cue_id IN (SELECT id FROM cues WHERE file_id=?)", (file_id,))
+    con.execute("DELETE FROM cues WHERE file_id=?", (file_id,))
+    con.execute("DELETE FROM files WHERE id=?", (file_id,))
+
+def update(con, runs_root, morph=False):
+    tk, mode = _sudachi() if morph else (None, None)
+    if morph and tk is None:
+        print("[search] sudachi が使えないため 2-gram のみで索引します")
+    known = {row[1]: (row[0], row[2], row[3]) for row in con.execute("SELECT id, path, sig, morph FROM files")}
+    seen = set()
+    n_new = n_upd = n_cues = 0
+    t0 = time.perf_counter()
+    for path, run, src in sources(runs_root):
+        key = str(path)
+        seen.add(key)
+        sig = signature(path)
+        old = known.get(key)
+        if old and old[1] == sig and old[2] >= (tk is not None):
+            continue
+        try:
+            cues = read_cues(path, src)
+        except (ValueError, KeyError, srt.SRTParseError) as e:
+            print(f"[search] skip {path}: {e}")
+            continue
+        with con:
+            if old:
+                drop_file(con, old[0]); n_upd += 1
+            else:
+                n_new += 1
+            fid = con.execute("INSERT INTO files(path, run, src, sig, morph) VALUES(?,?,?,?,?)",
+                              (key, run, src, sig, int(tk is not None))).lastrowid
+            for k, (st, en, text) in enumerate(cues, 1):
+                norm = normalize(text)
+                if not norm:
+                    continue
+                cid = con.execute("INSERT INTO cues(file_id, cue, start, end, text, norm) VALUES(?,?,?,?,?,?)",
+                                  (fid, k, st, en, text, norm)).lastrowid
+                keys = grams(norm) | morph_keys(tk, mode, text)
+                con.executemany("INSERT OR IGNORE INTO postings(gram, cue_id) VALUES(?,?)", [(g, cid) for g in keys])
+                n_cues += 1
+    gone = [v[0] for k, v in known.items() if k not in seen]
+    with con:
+        for fid in gone:
+            drop_file(con, fid)
+    print(f"[search] update: new={n_new} changed={n_upd} removed={len(gone)} cues={n_cues} "
+          f"({time.perf_counter() - t0:.1f}s)")
+
+# ---------------- 検索 ----------------
+
+def query(con, q, run=None, src=None, limit=50, lemma=False):
+    """[{run, source, cue, start, end, text}]（run・時刻順）"""
+    if lemma:
+        tk, mode = _sudachi()
+        if tk is None:
+            raise SystemExit("[search] --lemma には sudachipy が必要です")
+        keys = morph_keys(tk, mode, q)
+        norm = None
+    else:
+        norm = normalize(q)
+        keys = grams(norm)
+    if not keys:
+        return []
+    sql = "SELECT c.id, f.run, f.src, c.cue, c.start, c.end, c.text, c.norm FROM cues c JOIN files f ON f.id=c.file_id "
+    if norm is not None and len(norm) < NGRAM:
+        # 1文字の検索語は 2-gram で引けないので走査
+        sql += "WHERE instr(c.norm, ?) > 0"
+        params = [norm]
+    else:
+        # 最も出現の少ないキーで候補を引き、残りのキーは主キーの存在確認だけ
+        rare = min(sorted(keys), key=lambda g: con.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM postings WHERE gram=? LIMIT ?)", (g, RARE_CAP)).fetchone()[0])
+        others = sorted(keys - {rare})
+        sql += "WHERE c.id IN (SELECT cue_id FROM postings WHERE gram=?)"
+        sql += "".join(" AND EXISTS(SELECT 1 FROM postings p WHERE p.gram=? AND p.cue_id=c.id)" for _ in others)
+        params = [rare, *others]
+    if run:
+        sql += " AND f.run=?"; params.append(run)
+    if src:
+        sql += " AND f.src" + (" = 'asr'" if src == "asr" else " != 'asr'")
+    sql += " ORDER BY f.run, f.src, c.start"
+    hits = []
+    for _, r, s, cue, st, en, text, cn in con.execute(sql, params):
+        if norm is not None and norm not in cn:  # 2-gram の共起だけでは並びを保証しない
+            continue
+        hits.append({"run": r, "source": s, "cue": cue, "start": round(st, 3), "end": round(en, 3), "text": text})
+        if len(hits) >= limit:
+            break
+    return hits
+
+def fmt_time(t):
+    h, r = divmod(int(t), 3600)
+    return f"{h:02d}:{r // 60:02d}:{r % 60:02d}.{int(round((t - int(t)) * 1000)) % 1000:03d}"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=default_db())
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    u = sub.add_parser("update", help="新規・変更のあった Run だけ索引を更新")
+    u.add_argument("--runs", default=None, help="既定: $WORKSPACE_ROOT/Runs")
+    u.add_argument("--morph", action="store_true", help="Sudachi の形態素も索引（--lemma 用）")
+    q = sub.add_parser("query", help="フレーズ検索")
+    q.add_argument("text")
+    q.add_argument("--run", default=None)
+    q.add_argument("--source", choices=("final", "asr"), default=None)
+    q.add_argument("--limit", type=int, default=50)
+    q.add_argument("--lemma", action="store_true", help="形態素の正規化形で検索（update --morph が必要）")
+    q.add_argument("--json", action="store_true")
+    sub.add_parser("stats")
+    args = ap.parse_args()
+
+    con = open_index(args.db)
+    if args.cmd == "update":
+        update(con, Path(args.runs) if args.runs else workspace() / "Runs", morph=args.morph)
+    elif args.cmd == "query":
+        t0 = time.perf_counter()
+        hits = query(con, args.text, args.run, args.source, args.limit, args.lemma)
+        ms = (time.perf_counter() - t0) * 1000
+        if args.json:
+            json.dump({"query": args.text, "hits": hits, "ms": round(ms, 2)}, sys.stdout, ensure_ascii=False, indent=2)
+            print()
+        else:
+            for h in hits:
+                print(f"{h['run']}\t{h['source']}\t#{h['cue']}\t{fmt_time(h['start'])}\t{h['text'].replace(chr(10), ' ')}")
+            print(f"[search] {len(hits)} hits ({ms:.1f}ms)", file=sys.stderr)
+    else:
+        nf = con.execute("SELECT COUNT(*), COUNT(DISTINCT run) FROM files").fetchone()
+        nc = con.execute("SELECT COUNT(*) FROM cues").fetchone()[0]
+        ng = con.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+        print(f"[search] runs={nf[1]} files={nf[0]} cues={nc} postings={ng} db={args.db}")
+
+if __name__ == "__main__":
+    main()